@@ -1,13 +1,27 @@
 import streamlit as st
 import pandas as pd
 import os
+import weakref
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
 from core.transcriber import Transcriber
 from core.llm_engine import LLMEngine
-from core.excel_ops import ExcelExecutor
+from core.excel_ops import ExcelExecutor, enable_copy_on_write
 from core.audio_listener import AudioListener
+from core.code_cache import CodeCache
+from core.intent_parser import IntentParser
+from core.code_analyzer import CodeAnalyzer
+from core.command_solver import CommandSolver
+from core.api_client import get_client
+from core.persistence import PersistenceService
+from core.workbook_registry import WorkbookRegistry
+from core.pipeline import CommandPipeline
+from core.tracing import configure_tracer
+from core.grid_view import GridView, ROW_ID, diff_page
+from utils.code_executor import SandboxExecutor
 
 # --- 1. Config ---
+enable_copy_on_write()  # Undo history and snapshots share column buffers instead of deep-copying
+QUERY_ENGINE = None  # "duckdb" or "polars": multi-threaded engine for large sheets (see ExcelExecutor)
 st.set_page_config(
     layout="wide", 
     page_title="Xcelord AI", 
@@ -22,8 +36,19 @@ if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 if "file_path" not in st.session_state:
     st.session_state.file_path = "dummy_data.xlsx"
+    st.session_state.sheet = None  # None = the workbook's first sheet
+if "loading" not in st.session_state:
+    st.session_state.loading = False  # A load is queued in the pipeline
 if "theme_mode" not in st.session_state:
     st.session_state.theme_mode = "Dark"
+if "grid_view" not in st.session_state:
+    # Server-side paging/sorting/filtering; only the visible page is sent to the browser
+    st.session_state.grid_view = GridView()
+    st.session_state.grid_page = 0
+    st.session_state.grid_nonce = 0
+    st.session_state.grid_base = None
+    st.session_state.grid_settings = None
+    st.session_state.grid_sent = []  # Edits of the mounted grid already handed to the pipeline
 
 # CSS Styles
 dark_css = """
@@ -49,6 +74,13 @@ light_css = """
 st.markdown(dark_css if st.session_state.theme_mode == "Dark" else light_css, unsafe_allow_html=True)
 
 # --- 3. Initialize Engines ---
+@st.cache_resource
+def get_tracer():
+    # Configured before the engines so calibration and the first load are traced too
+    return configure_tracer(jsonl_path=".xcelord_cache/traces.jsonl")
+
+tracer = get_tracer()
+
 @st.cache_resource
 def get_engines():
     listener = AudioListener() 
@@ -56,19 +88,109 @@ def get_engines():
         listener.calibrate_noise()
     except:
         pass 
-    return listener, Transcriber(), LLMEngine(), ExcelExecutor()
+    llm = LLMEngine(cache=CodeCache(disk_path=".xcelord_cache/llm_code.sqlite"))
+    get_client().warm_up()  # Open the pooled connection before the first command
+    return listener, Transcriber(), llm, ExcelExecutor(sandbox=SandboxExecutor(), query_engine=QUERY_ENGINE)
 
 listener, transcriber, llm_engine, executor = get_engines()
 
+@st.cache_resource
+def get_registry():
+    # Sessions on the same workbook share one base frame; saves take turns behind a file lock
+    return WorkbookRegistry(executor)
+
+registry = get_registry()
+
+@st.cache_resource
+def get_persistence():
+    # One background writer for the whole server; it coalesces bursts of edits
+    return PersistenceService(registry)
+
+persistence = get_persistence()
+intent_parser = IntentParser()
+
+@st.cache_resource
+def get_solver():
+    # Shared so every session benefits from the compiled-code cache
+    return CommandSolver(llm_engine, executor, CodeAnalyzer())
+
+solver = get_solver()
+
+class SessionToken:
+    """
+    Held only by one session's state, so it is collected when the session ends.
+    """
+
+def get_pipeline():
+    # One pipeline (frame, history, profile cache) per browser session; engines and the save thread are shared
+    if "pipeline" not in st.session_state:
+        pipeline = CommandPipeline(executor, solver, intent_parser, persistence,
+                                   transcriber=transcriber, listener=listener)
+        pipeline.start()
+        st.session_state.pipeline = pipeline
+        # The pipeline's own thread keeps it alive, so the session's end is noticed through the token
+        st.session_state.pipeline_token = SessionToken()
+        weakref.finalize(st.session_state.pipeline_token, pipeline.stop, wait=False)
+    return st.session_state.pipeline
+
+pipeline = get_pipeline()
+
+def sync_pipeline():
+    """
+    Pulls finished work from the pipeline into the chat and the grid.
+    Loads, grid edits and undo/redo are queued like commands, so their
+    outcome arrives here too instead of blocking the script.
+    """
+    for event in pipeline.poll_events():
+        if event.kind == "transcript":
+            st.session_state.chat_history.append({"role": "user", "content": event.text})
+        elif event.kind == "load":
+            st.session_state.loading = False
+        elif event.kind == "edit":
+            st.toast(event.message, icon="💾" if event.success else "⚠️")
+        else:
+            st.session_state.chat_history.append({"role": "assistant", "content": event.render()})
+    st.session_state.df = pipeline.df
+
+def handle_command(text):
+    """
+    Queues one typed command. The pipeline runs it in the background
+    (local fast-path first, LLM candidates otherwise); the outcome shows
+    up in the chat on a later rerun. A request still streaming for an
+    earlier command is stale by now and gets cancelled.
+    """
+    st.session_state.chat_history.append({"role": "user", "content": text})
+    if pipeline.df is None:
+        return
+    pipeline.submit_text(text, supersede=True)
+
+def open_workbook(file_path, sheet=None):
+    """
+    Loads one sheet into the pipeline. The other sheets are only listed;
+    they load when a command reads them. The load is queued behind any
+    running command and shows in the grid on a later rerun.
+    """
+    # Opened as this session, so a save over someone else's newer revision is caught
+    success, new_df, msg = registry.open(file_path, sheet, session=pipeline)
+    if success:
+        other_sheets = registry.other_sheets(file_path, sheet) if file_path.endswith((".xlsx", ".xlsm")) else None
+        pipeline.load(new_df, file_path, sheet, other_sheets)
+        st.session_state.loading = True
+        st.session_state.sheet = sheet
+    return success, msg
+
+@st.cache_data(max_entries=32)
+def sheet_names(file_path, mtime_ns):
+    # Keyed on mtime so a save that adds a sheet shows up
+    return [info.name for info in executor.list_sheets(file_path)]
+
+sync_pipeline()
+
 # --- 4. Auto-Load on Startup ---
 # This ensures the default file is processed immediately
-if st.session_state.df is None and os.path.exists(st.session_state.file_path):
-    success, initial_df, msg = executor.load_sheet(st.session_state.file_path)
-    if success:
-        st.session_state.df = initial_df
-    else:
-        # If loading fails, we just don't have data yet
-        pass 
+if pipeline.df is None and not st.session_state.loading and os.path.exists(st.session_state.file_path):
+    # If loading fails, we just don't have data yet
+    open_workbook(st.session_state.file_path, st.session_state.sheet)
 
 # ==========================================
 #              TOP BAR
@@ -103,51 +225,151 @@ with st.sidebar:
             st.session_state.file_path = file_path
             
             # Call the Robust Loader
-            success, new_df, msg = executor.load_sheet(file_path)
+            success, msg = open_workbook(file_path)
             if success:
-                st.session_state.df = new_df
                 st.success(f"✅ {msg}")
             else:
                 st.error(f"❌ {msg}")
         
     if st.button("🔄 Reload Data Source"):
+        persistence.flush()
         if os.path.exists(st.session_state.file_path):
-            success, new_df, msg = executor.load_sheet(st.session_state.file_path)
+            # Picks up what other sessions saved since this one opened the file
+            success, msg = open_workbook(st.session_state.file_path, st.session_state.sheet)
             if success:
-                st.session_state.df = new_df
                 st.success(f"✅ {msg}")
             else:
                 st.error(f"❌ {msg}")
         else:
             st.error("File not found.")
 
+    # --- Sheet picker ---
+    file_path = st.session_state.file_path
+    if file_path.endswith((".xlsx", ".xlsm")) and os.path.exists(file_path):
+        names = sheet_names(file_path, os.stat(file_path).st_mtime_ns)
+        if len(names) > 1:
+            current = st.session_state.sheet if st.session_state.sheet in names else names[0]
+            chosen = st.selectbox("Sheet", names, index=names.index(current))
+            if chosen != current:
+                persistence.flush()  # The open sheet's pending edits land before switching
+                success, msg = open_workbook(file_path, chosen)
+                if success:
+                    st.session_state.grid_page = 0
+                    st.rerun()
+                st.error(f"❌ {msg}")
+
+    # --- Undo / Redo ---
+    st.markdown("### ↩️ History")
+    versions = pipeline.versions
+    col_undo, col_redo = st.columns(2)
+    with col_undo:
+        if st.button("↩️ Undo", disabled=not versions.can_undo(), help=versions.undo_label):
+            # Queued behind any running command, so history stays in order; the outcome arrives as an event
+            pipeline.undo()
+            st.rerun()
+    with col_redo:
+        if st.button("↪️ Redo", disabled=not versions.can_redo(), help=versions.redo_label):
+            pipeline.redo()
+            st.rerun()
+    st.caption(f"History memory: {versions.memory_usage() / (1024 * 1024):.1f} MB")
+    if os.path.exists(st.session_state.file_path):
+        st.caption(f"🔗 Shared workbook, revision {registry.revision(st.session_state.file_path)}")
+
+    # --- Latency ---
+    st.markdown("### ⏱️ Latency")
+    latency = tracer.stats()
+    if latency:
+        stats_df = pd.DataFrame.from_dict(latency, orient="index")
+        st.dataframe(stats_df[["count", "p50_ms", "p90_ms", "p99_ms"]].round(1), width="stretch")
+        stage = st.selectbox("Stage", list(latency))
+        counts, edges = tracer.histogram(stage, bins=12)
+        st.bar_chart(pd.DataFrame({"spans": counts}, index=[f"{e:.0f}" for e in edges[:-1]]))
+        st.download_button("⬇️ Export traces (JSONL)", tracer.export_jsonl(),
+                           file_name="traces.jsonl", mime="application/json")
+    else:
+        st.caption("No spans recorded yet.")
+
 # ==========================================
 #            MAIN LAYOUT
 # ==========================================
 col_grid, col_chat = st.columns([3, 1]) 
 
+def reset_grid_page():
+    st.session_state.grid_page = 0
+
 # 1. Grid View
 with col_grid:
     if st.session_state.df is not None:
-        gb = GridOptionsBuilder.from_dataframe(st.session_state.df)
-        gb.configure_pagination(paginationAutoPageSize=False, paginationPageSize=20)
-        gb.configure_default_column(editable=True, groupable=True, minWidth=100)
+        df = st.session_state.df
+        columns = [str(c) for c in df.columns]
+
+        # --- Server-side view controls ---
+        col_sort, col_order, col_filter_col, col_filter_text, col_size = st.columns([2, 1, 2, 2, 1])
+        with col_sort:
+            sort_by = st.selectbox("Sort by", ["(none)"] + columns, key="grid_sort", on_change=reset_grid_page)
+        with col_order:
+            ascending = st.radio("Order", ["Asc", "Desc"], key="grid_order", horizontal=True,
+                                 on_change=reset_grid_page) == "Asc"
+        with col_filter_col:
+            filter_column = st.selectbox("Filter column", columns, key="grid_filter_col", on_change=reset_grid_page)
+        with col_filter_text:
+            filter_text = st.text_input("Contains", key="grid_filter_text", on_change=reset_grid_page)
+        with col_size:
+            page_size = st.selectbox("Rows", [20, 50, 100, 200], index=1, key="grid_page_size",
+                                     on_change=reset_grid_page)
+
+        view = st.session_state.grid_view.page(
+            df, st.session_state.grid_page, page_size,
+            sort_by=None if sort_by == "(none)" else sort_by, ascending=ascending,
+            filter_column=filter_column, filter_text=filter_text.strip())
+        st.session_state.grid_page = view.page
+
+        # A new frame or page remounts the grid, so its last reported data is never diffed against other rows
+        settings = (view.page, page_size, sort_by, ascending, filter_column, filter_text)
+        if st.session_state.grid_base is not df or st.session_state.grid_settings != settings:
+            st.session_state.grid_nonce += 1
+            st.session_state.grid_base = df
+            st.session_state.grid_settings = settings
+            st.session_state.grid_sent = []
+
+        gb = GridOptionsBuilder.from_dataframe(view.frame)
+        # Sorting and filtering happen on the server over the whole sheet, not just this page
+        gb.configure_default_column(editable=True, sortable=False, filter=False, minWidth=100)
+        gb.configure_column(ROW_ID, hide=True, editable=False)
         gb.configure_selection('single')
         gridOptions = gb.build()
 
         grid_response = AgGrid(
-            st.session_state.df,
+            view.frame,
             gridOptions=gridOptions,
             update_mode=GridUpdateMode.VALUE_CHANGED,
             height=650,
             theme="streamlit" if st.session_state.theme_mode == "Dark" else "balham",
+            key=f"grid_{st.session_state.grid_nonce}",
         )
 
-        updated_df = grid_response['data']
-        if not updated_df.equals(st.session_state.df):
-            st.session_state.df = updated_df
-            updated_df.to_excel(st.session_state.file_path, index=False)
-            st.toast("Changes saved!", icon="💾")
+        # Only the cells that changed go back to the pipeline; the grid keeps reporting
+        # them until the saved frame remounts it, so each edit is sent once
+        edits = [edit for edit in diff_page(view.frame, grid_response['data'])
+                 if edit not in st.session_state.grid_sent]
+        if edits:
+            pipeline.edit_cells(df, edits)
+            st.session_state.grid_sent.extend(edits)
+
+        # --- Pager ---
+        col_prev, col_info, col_next = st.columns([1, 3, 1])
+        with col_prev:
+            if st.button("◀ Prev", disabled=view.page == 0):
+                st.session_state.grid_page = view.page - 1
+                st.rerun()
+        with col_info:
+            st.caption(f"Page {view.page + 1} of {view.pages} · {view.total_rows:,} of {len(df):,} rows")
+        with col_next:
+            if st.button("Next ▶", disabled=view.page >= view.pages - 1):
+                st.session_state.grid_page = view.page + 1
+                st.rerun()
+    elif st.session_state.loading:
+        st.info("⏳ Loading workbook...")
     else:
         st.info("👈 Expand the sidebar to upload a file.")
 
@@ -166,43 +388,40 @@ with col_chat:
     st.markdown(chat_html, unsafe_allow_html=True)
     st.write("") 
 
+    # Pipeline status; reruns the app when results arrive, so nothing blocks on a command
+    @st.fragment(run_every=1.0)
+    def pipeline_status():
+        if pipeline.busy:
+            st.caption(f"⚙️ {pipeline.status()}")
+            if st.button("⏹️ Cancel", help="Stop the running command and drop queued ones"):
+                pipeline.cancel()
+        if pipeline.has_events():
+            st.rerun()
+
+        conflict = pipeline.filepath and registry.conflict(pipeline, pipeline.filepath, pipeline.sheet)
+        if conflict:
+            st.error(f"⚠️ {conflict.message}")
+            col_theirs, col_mine = st.columns(2)
+            with col_theirs:
+                if st.button("🔄 Reload theirs"):
+                    persistence.flush()  # This session's pending saves are rejected before the reload
+                    open_workbook(pipeline.filepath, pipeline.sheet)
+                    st.rerun()
+            with col_mine:
+                if st.button("💾 Keep mine"):
+                    registry.overwrite(pipeline, pipeline.filepath, pipeline.sheet)
+                    persistence.mark_dirty(pipeline.df, pipeline.filepath, pipeline.sheet, session=pipeline)
+                    st.rerun()
+
+    pipeline_status()
+
     # Input Controls
     if st.button("🎙️ Record (Auto-Stop)"):
-        with st.spinner("Listening..."):
-            audio_file = listener.listen_and_record("temp_voice.wav")
-            
-            if audio_file:
-                text = transcriber.transcribe(audio_file)
-                if text and "Error" not in text:
-                    st.session_state.chat_history.append({"role": "user", "content": text})
-                    
-                    if st.session_state.df is not None:
-                        columns = list(st.session_state.df.columns)
-                        code = llm_engine.generate_code(text, columns)
-                        success, new_df, msg = executor.execute_code(st.session_state.df, code)
-                        
-                        if success:
-                            st.session_state.df = new_df
-                            executor.save_file(new_df, st.session_state.file_path)
-                            st.session_state.chat_history.append({"role": "assistant", "content": f"✅ {msg}"})
-                        else:
-                            st.session_state.chat_history.append({"role": "assistant", "content": f"❌ {msg}"})
-                        st.rerun()
-                else:
-                    st.error("No speech detected.")
+        # Capture and transcription run in the pipeline; the script returns immediately
+        pipeline.capture()
+        st.toast("Listening...", icon="🎙️")
 
     text_input = st.chat_input("Type command...")
     if text_input:
-        st.session_state.chat_history.append({"role": "user", "content": text_input})
-        if st.session_state.df is not None:
-            columns = list(st.session_state.df.columns)
-            code = llm_engine.generate_code(text_input, columns)
-            success, new_df, msg = executor.execute_code(st.session_state.df, code)
-            
-            if success:
-                st.session_state.df = new_df
-                executor.save_file(new_df, st.session_state.file_path)
-                st.session_state.chat_history.append({"role": "assistant", "content": f"✅ {msg}"})
-            else:
-                 st.session_state.chat_history.append({"role": "assistant", "content": f"❌ {msg}"})
-            st.rerun()
\ No newline at end of file
+        handle_command(text_input)
+        st.rerun()
\ No newline at end of file
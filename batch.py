@@ -0,0 +1,402 @@
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import atexit
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.excel_ops import ExcelExecutor, enable_copy_on_write
+from core.workbook_registry import WorkbookRegistry
+from core.intent_parser import IntentParser
+from core.context_manager import ContextManager
+from core.pipeline import sheets_context
+from utils.code_executor import SandboxExecutor
+
+# --- Configuration ---
+CODE_CACHE_FILE = ".xcelord_cache/llm_code.sqlite"  # Shared with main.py, so nightly runs reuse yesterday's code
+PARALLEL_CANDIDATES = 2
+
+# Module level, so spawned pool workers (which re-import this module) get it too
+enable_copy_on_write()
+
+
+def read_script(path):
+    """
+    Commands of a script file: one per line, blank lines and # comments ignored.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def expand_workbooks(patterns):
+    """
+    Sorted, de-duplicated workbooks matching the glob patterns. Temp files
+    left by Excel (~$name) and by our own atomic saves are skipped.
+    """
+    paths = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            name = os.path.basename(path)
+            if os.path.isfile(path) and not name.startswith(("~$", ".")):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+class BatchStep:
+    def __init__(self, command, code, engine="pandas", source="llm"):
+        self.command = command
+        self.code = code
+        self.engine = engine  # Query engine the code was written for
+        self.source = source  # "intent" (local fast-path) or "llm"
+
+
+class BatchPlan:
+    def __init__(self, steps, schema_key, representative, error=None):
+        self.steps = steps                  # Code for every command, in script order
+        self.schema_key = schema_key        # Schema of the workbook the plan was made on
+        self.representative = representative
+        self.error = error                  # Why planning stopped early (None = complete)
+
+
+class WorkbookReport:
+    def __init__(self, path, status, message="", rows_in=None, rows_out=None, applied=0, elapsed=0.0,
+                 outputs=None, schema_key=None):
+        self.path = path
+        self.status = status          # saved, unchanged, checked (no save), failed
+        self.message = message
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.applied = applied        # Commands that ran successfully
+        self.elapsed = elapsed
+        self.outputs = outputs or []  # [(command, printed answer)]
+        self.schema_key = schema_key  # Schema the workbook was loaded with
+
+    @property
+    def ok(self):
+        return self.status != "failed"
+
+    def to_dict(self):
+        return {
+            "path": self.path, "status": self.status, "message": self.message,
+            "rows_in": self.rows_in, "rows_out": self.rows_out, "applied": self.applied,
+            "elapsed_s": round(self.elapsed, 3),
+            "outputs": [{"command": command, "output": output} for command, output in self.outputs],
+        }
+
+
+# --- Worker process ---
+_worker = {}
+
+
+def _init_worker(query_engine, engine_min_rows, timeout):
+    # Generated code runs in this worker's own sandbox, so a runaway command costs one workbook, not the pool
+    sandbox = SandboxExecutor(workers=1, timeout=timeout)
+    atexit.register(sandbox.close)
+    executor = ExcelExecutor(sandbox=sandbox, query_engine=query_engine, engine_min_rows=engine_min_rows)
+    _worker["executor"] = executor
+    # File locks shared with running UI servers and the CLI
+    _worker["registry"] = WorkbookRegistry(executor)
+
+
+def run_workbook(path, sheet, steps, save=True):
+    """
+    Applies the planned steps to one workbook and saves it once at the end.
+    A workbook is only written when every step succeeded and the frame
+    changed. Runs in a pool worker; returns a WorkbookReport.
+    """
+    start = time.monotonic()
+    executor, registry = _worker["executor"], _worker["registry"]
+    success, df, message = registry.open(path, sheet)
+    if not success:
+        return WorkbookReport(path, "failed", message, elapsed=time.monotonic() - start)
+    rows_in = len(df)
+    schema_key = ContextManager.schema_key(df)
+    sheets = registry.other_sheets(path, sheet) if path.endswith((".xlsx", ".xlsm")) else None
+
+    original, outputs = df, []
+    for applied, step in enumerate(steps):
+        success, new_df, message = executor.execute_code(df, step.code, sheets, step.engine)
+        if not success:
+            return WorkbookReport(path, "failed", f"'{step.command}': {message}", rows_in, len(df), applied,
+                                  time.monotonic() - start, outputs, schema_key)
+        if message != "Execution successful.":
+            outputs.append((step.command, message))
+        df = new_df
+
+    if df is original or df.equals(original):
+        status, message = "unchanged", "No data changes."
+    elif not save:
+        status, message = "checked", "Changes not saved (--dry-run)."
+    else:
+        success, message = registry.save_file(df, path, sheet)
+        status = "saved" if success else "failed"
+    return WorkbookReport(path, status, message, rows_in, len(df), len(steps), time.monotonic() - start,
+                          outputs, schema_key)
+
+
+# --- Planning and dispatch ---
+class BatchRunner:
+    def __init__(self, commands, sheet=None, workers=None, save=True, llm=None, query_engine=None,
+                 engine_min_rows=500_000, candidates=PARALLEL_CANDIDATES, plan_attempts=2, timeout=30.0,
+                 quiet=False):
+        """
+        Applies the same text commands to many workbooks. Code is generated
+        once per command and workbook schema (files with the same header
+        row share a plan, made and validated on the first of them) and the
+        per-file load -> execute -> save runs on a process pool.
+
+        :param commands: Command texts, applied in order
+        :param sheet: Sheet to work on in every workbook (None = the first)
+        :param workers: Pool processes (None = one per CPU)
+        :param save: False runs everything but writes nothing (dry run)
+        :param llm: LLMEngine (default: the shared client with the on-disk code cache, created on first use)
+        :param plan_attempts: Members of a schema group tried as the planning workbook before giving up
+        :param timeout: Wall-clock limit per command on one workbook, in seconds (generated code runs sandboxed)
+        """
+        self.commands = commands
+        self.sheet = sheet
+        self.workers = workers or os.cpu_count() or 1
+        self.save = save
+        self.query_engine = query_engine
+        self.engine_min_rows = engine_min_rows
+        self.candidates = candidates
+        self.plan_attempts = max(1, plan_attempts)
+        self.timeout = timeout
+        self.quiet = quiet
+        # One sandbox worker per candidate, so the solver's candidates still run side by side
+        self.sandbox = SandboxExecutor(workers=candidates, timeout=timeout)
+        self.executor = ExcelExecutor(sandbox=self.sandbox, query_engine=query_engine,
+                                      engine_min_rows=engine_min_rows)
+        self.registry = WorkbookRegistry(self.executor)
+        self.intent_parser = IntentParser()
+        self._llm = llm
+        self._solver = None
+
+    def _log(self, message):
+        if not self.quiet:
+            print(message)
+
+    @property
+    def solver(self):
+        # Created on first use, so scripts the intent parser fully covers need no API key
+        if self._solver is None:
+            from core.llm_engine import LLMEngine
+            from core.code_cache import CodeCache
+            from core.code_analyzer import CodeAnalyzer
+            from core.command_solver import CommandSolver
+
+            llm = self._llm if self._llm is not None else LLMEngine(cache=CodeCache(disk_path=CODE_CACHE_FILE))
+            self._solver = CommandSolver(llm, self.executor, CodeAnalyzer(), candidates=self.candidates)
+        return self._solver
+
+    def header_key(self, path):
+        """
+        Column names of the target sheet, read without parsing any cells.
+        Workbooks with the same header share a plan.
+        """
+        infos = self.executor.list_sheets(path, headers=True)
+        info = infos[0] if self.sheet is None else next((i for i in infos if i.name == self.sheet), None)
+        if info is None:
+            raise KeyError(f"no sheet named '{self.sheet}'")
+        return tuple(str(c) for c in info.columns)
+
+    def plan(self, path):
+        """
+        Generates code for every command on the workbook at path, running
+        each one (in memory, nothing is saved) so the next command is
+        generated against the schema it will really see.
+        """
+        try:
+            return self._plan(path)
+        finally:
+            self.registry.evict(path)  # The pool reloads the file; don't keep a copy per schema here
+
+    def _plan(self, path):
+        success, df, message = self.registry.open(path, self.sheet)
+        if not success:
+            return BatchPlan([], None, path, message)
+        schema_key = ContextManager.schema_key(df)
+        sheets = self.registry.other_sheets(path, self.sheet) if path.endswith((".xlsx", ".xlsm")) else None
+        context_manager = ContextManager()
+        steps = []
+        for command in self.commands:
+            code = self.intent_parser.parse(command, df)
+            if code is not None:
+                success, new_df, message = self.executor.execute_code(df, code, sheets)
+                step = BatchStep(command, code, source="intent")
+            else:
+                summary_text = context_manager.get_spreadsheet_summary(df) + sheets_context(sheets)
+                try:
+                    result = self.solver.solve(command, df, summary_text,
+                                               schema_key=ContextManager.schema_key(df), sheets=sheets)
+                except Exception as e:
+                    return BatchPlan(steps, schema_key, path, f"'{command}': {e}")
+                success, new_df, message, code = result.success, result.df, result.message, result.code
+                step = BatchStep(command, code, result.engine)
+            if not success:
+                return BatchPlan(steps, schema_key, path, f"'{command}': {message}")
+            steps.append(step)
+            context_manager.invalidate(ContextManager.touched_columns(code, df.columns))
+            df = new_df
+        return BatchPlan(steps, schema_key, path)
+
+    def run(self, paths):
+        """
+        Returns [WorkbookReport] in the order of paths.
+        """
+        reports = {}
+        groups = {}
+        for path in paths:
+            try:
+                groups.setdefault(self.header_key(path), []).append(path)
+            except Exception as e:
+                reports[path] = WorkbookReport(path, "failed", f"Error reading workbook: {e}")
+        self._log(f"📚 {len(paths)} workbook(s), {len(groups)} schema(s), {len(self.commands)} command(s).")
+
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(self.query_engine, self.engine_min_rows, self.timeout)) as pool:
+            pending = {}
+            # Planning the next schema overlaps with the pool working through the previous one
+            for members in groups.values():
+                plan, members = self._plan_group(members, reports)
+                for path in members:
+                    pending[pool.submit(run_workbook, path, self.sheet, plan.steps, self.save)] = plan
+            retries = self._collect(pending, reports)
+
+            # Files whose dtypes differ from their group's (e.g. dates stored as text) get their own plan
+            pending = {}
+            for path in retries:
+                plan, members = self._plan_group([path], reports)
+                for path in members:
+                    pending[pool.submit(run_workbook, path, self.sheet, plan.steps, self.save)] = plan
+            self._collect(pending, reports)
+        return [reports[path] for path in paths]
+
+    def _plan_group(self, members, reports):
+        """
+        Plans on the first member; if that fails (an odd file sorted first)
+        the next member gets one try before the whole group is given up.
+        Returns (plan or None, members to run it on).
+        """
+        start = time.monotonic()
+        for attempt, path in enumerate(members[:self.plan_attempts]):
+            plan = self.plan(path)
+            if plan.error is None:
+                break
+            reports[path] = WorkbookReport(path, "failed", f"Planning failed: {plan.error}")
+            self._log(f"❌ Planning failed on {os.path.basename(path)}: {plan.error}")
+        else:
+            # The error is the last member's, so the rest of the group is reported against that file
+            failed_on = os.path.basename(plan.representative)
+            for path in members[self.plan_attempts:]:
+                reports[path] = WorkbookReport(path, "failed", f"Planning failed on {failed_on}: {plan.error}")
+            return None, []
+        members = members[attempt:]  # Members whose planning failed are already reported
+        sources = ", ".join(f"{s.source}" + ("" if s.engine == "pandas" else f"/{s.engine}") for s in plan.steps)
+        self._log(f"🧠 Planned {len(plan.steps)} command(s) for {len(members)} workbook(s) "
+                  f"in {time.monotonic() - start:.2f}s ({sources}).")
+        return plan, members
+
+    def _collect(self, pending, reports):
+        """
+        Waits for the submitted workbooks. Returns the paths worth a retry
+        with their own plan.
+        """
+        retries = []
+        for future in as_completed(pending):
+            plan = pending[future]
+            report = future.result()
+            replan = report.status == "failed" and report.schema_key is not None \
+                and report.schema_key != plan.schema_key and report.path != plan.representative
+            if replan:
+                retries.append(report.path)
+                self._log(f"🔁 {os.path.basename(report.path)}: different column types, planning it separately.")
+                continue
+            reports[report.path] = report
+            icon = "✅" if report.ok else "❌"
+            self._log(f"{icon} {os.path.basename(report.path)}: {report.status} in {report.elapsed:.2f}s. "
+                      f"{report.message}")
+        return retries
+
+    def close(self):
+        if self._solver is not None:
+            self._solver.close()
+        self.sandbox.close()
+
+
+# --- Report ---
+def write_report(reports, path):
+    """
+    JSON (everything, printed answers included) or CSV (one row per file), by extension.
+    """
+    rows = [report.to_dict() for report in reports]
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=[k for k in rows[0] if k != "outputs"] + ["outputs"])
+            writer.writeheader()
+            for row in rows:
+                row["outputs"] = " | ".join(f"{o['command']}: {o['output']}" for o in row["outputs"])
+                writer.writerow(row)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, default=str)
+
+
+def print_summary(reports, elapsed):
+    counts = {}
+    for report in reports:
+        counts[report.status] = counts.get(report.status, 0) + 1
+    print(f"--- Batch finished in {elapsed:.1f}s ---")
+    print(", ".join(f"{status}: {n}" for status, n in sorted(counts.items())))
+    for report in reports:
+        if not report.ok:
+            print(f"❌ {report.path}: {report.message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a script of text commands to many workbooks.")
+    parser.add_argument("script", help="Text file with one command per line (# comments allowed)")
+    parser.add_argument("workbooks", nargs="+", help="Workbook paths or glob patterns (quote them; ** recurses)")
+    parser.add_argument("--sheet", default=None, help="Sheet to work on (default: the first)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--dry-run", action="store_true", help="Run every command but save nothing")
+    parser.add_argument("--report", default=None, help="Write the per-file report to a .json or .csv file")
+    parser.add_argument("--engine", choices=["duckdb", "polars"], default=None,
+                        help="Query engine for large sheets (needs the package installed)")
+    parser.add_argument("--engine-min-rows", type=int, default=500_000)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds a command may run on one workbook")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    commands = read_script(args.script)
+    if not commands:
+        print(f"❌ No commands in {args.script}.")
+        return 2
+    paths = expand_workbooks(args.workbooks)
+    if not paths:
+        print("❌ No workbooks matched.")
+        return 2
+
+    start = time.monotonic()
+    runner = BatchRunner(commands, sheet=args.sheet, workers=args.workers, save=not args.dry_run,
+                         query_engine=args.engine, engine_min_rows=args.engine_min_rows, timeout=args.timeout,
+                         quiet=args.quiet)
+    try:
+        reports = runner.run(paths)
+    finally:
+        runner.close()
+    print_summary(reports, time.monotonic() - start)
+    if args.report:
+        write_report(reports, args.report)
+        print(f"📝 Report written to {args.report}")
+    return 0 if all(report.ok for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import time
+import types
+import threading
+
+import numpy as np
+
+
+class FakeTranscriptionBackend:
+    """
+    Offline stand-in for GroqWhisperBackend. Returns the transcript
+    registered for the uploaded clip's name after a fixed delay, so the
+    measured time is our own work (resampling, encoding) plus a
+    predictable "network" cost.
+    """
+    def __init__(self, transcripts, latency=0.0, default=""):
+        """
+        :param transcripts: {clip name: text}
+        :param latency: Seconds each upload takes
+        :param default: Text for clips that are not registered (e.g. streamed chunks)
+        """
+        self.transcripts = transcripts
+        self.latency = latency
+        self.default = default
+        self.calls = 0
+
+    def transcribe(self, upload):
+        filename, data = upload
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        name = os.path.splitext(filename)[0]
+        return self.transcripts.get(name, self.default)
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, messages, model, temperature, stream=False):
+        owner = self.owner
+        owner.calls += 1
+        reply = f"```python\n{owner.answer(messages[1]['content'])}\n```"
+        if owner.latency:
+            time.sleep(owner.latency)
+        if stream:
+            return owner.stream_reply(reply)
+        usage = types.SimpleNamespace(prompt_tokens=sum(len(m["content"]) for m in messages) // 4,
+                                      completion_tokens=len(reply) // 4)
+        message = types.SimpleNamespace(content=reply)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeLLMClient:
+    """
+    Offline stand-in for APIClient when driving LLMEngine. Answers with the
+    canned snippet of the first registered phrase found in the user
+    prompt, optionally streamed at a fixed token rate.
+    """
+    def __init__(self, answers, default_code="print(df.head())", latency=0.0, tokens_per_second=None,
+                 chars_per_token=4):
+        """
+        :param answers: {phrase: code}; matched case-insensitively against the user prompt
+        :param latency: Seconds before the reply starts (time to first token)
+        :param tokens_per_second: Streaming rate (None = the whole reply at once)
+        """
+        self.answers = {phrase.lower(): code for phrase, code in answers.items()}
+        self.default_code = default_code
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chars_per_token = chars_per_token
+        self.calls = 0
+        self.groq = types.SimpleNamespace(chat=types.SimpleNamespace(completions=_FakeCompletions(self)))
+
+    def call(self, request, deadline=None):
+        return request(self.groq)
+
+    def warm_up(self, background=True):
+        pass
+
+    def answer(self, prompt):
+        prompt = prompt.lower()
+        for phrase, code in self.answers.items():
+            if phrase in prompt:
+                return code
+        return self.default_code
+
+    def stream_reply(self, reply):
+        step = self.chars_per_token
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i in range(0, len(reply), step):
+            if delay:
+                time.sleep(delay)
+            delta = types.SimpleNamespace(content=reply[i:i + step])
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+
+class ReplayStream:
+    """
+    Drop-in for sounddevice.InputStream that plays recorded samples into
+    an AudioListener callback as fast as possible, then keeps feeding room
+    noise until the listener stops. Lets the capture path run without a
+    microphone.
+    """
+    def __init__(self, callback, samples, block_size, stopped, noise=0.003, max_blocks=10_000):
+        """
+        :param stopped: Callable returning True once the listener has made its stop decision
+        """
+        self.callback = callback
+        self.samples = samples.reshape(-1, 1).astype("float32")
+        self.block_size = block_size
+        self.stopped = stopped
+        self.noise = noise
+        self.max_blocks = max_blocks
+        self._thread = None
+
+    def _play(self):
+        rng = np.random.default_rng(0)
+        blocks = 0
+        for start in range(0, len(self.samples), self.block_size):
+            if self.stopped():
+                return
+            block = self.samples[start:start + self.block_size]
+            self.callback(block, len(block), None, None)
+            blocks += 1
+        while not self.stopped() and blocks < self.max_blocks:
+            block = rng.normal(0, self.noise, (self.block_size, 1)).astype("float32")
+            self.callback(block, len(block), None, None)
+            blocks += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._play, daemon=True, name="replay-stream")
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._thread.join()
+        return False
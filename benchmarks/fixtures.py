@@ -0,0 +1,82 @@
+import os
+import json
+import numpy as np
+import scipy.io.wavfile as wav
+
+from core.audio_clip import AudioClip
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+MANIFEST = "manifest.json"
+
+# name -> (transcript, syllables, seconds of leading / trailing room noise)
+UTTERANCES = {
+    "sort_sales": ("Sort by Sales descending", 8, (0.6, 1.2)),
+    "total_sales_by_department": ("What is the total Sales by Department?", 12, (0.8, 1.5)),
+    "filter_high_sales": ("Show rows where Sales is greater than 40000", 14, (0.4, 2.0)),
+}
+
+
+def synthesize_utterance(syllables, lead, tail, sample_rate=16000, seed=0):
+    """
+    Speech-like test signal: voiced "syllables" (a pitch with harmonics
+    under a smooth envelope) separated by short gaps, between stretches of
+    room noise. Loud and long enough to trip the VAD the same way a real
+    command does, so capture and trimming do representative work.
+    """
+    rng = np.random.default_rng(seed)
+    parts = [rng.normal(0, 0.003, int(lead * sample_rate))]
+    for _ in range(syllables):
+        n = int(rng.uniform(0.12, 0.28) * sample_rate)
+        t = np.arange(n) / sample_rate
+        pitch = rng.uniform(110, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+        envelope = np.hanning(n) * rng.uniform(0.15, 0.35)
+        parts.append(voiced * envelope + rng.normal(0, 0.003, n))
+        parts.append(rng.normal(0, 0.003, int(rng.uniform(0.05, 0.15) * sample_rate)))
+    parts.append(rng.normal(0, 0.003, int(tail * sample_rate)))
+    return np.concatenate(parts).astype(np.float32)
+
+
+def write_fixtures(folder=FIXTURE_DIR, sample_rate=16000):
+    """
+    (Re)creates the WAV fixtures and their transcript manifest
+    (python -m benchmarks.fixtures).
+    """
+    os.makedirs(folder, exist_ok=True)
+    manifest = {}
+    for seed, (name, (text, syllables, (lead, tail))) in enumerate(sorted(UTTERANCES.items())):
+        samples = synthesize_utterance(syllables, lead, tail, sample_rate, seed)
+        AudioClip(samples, sample_rate, name).save(os.path.join(folder, f"{name}.wav"))
+        manifest[name] = text
+    with open(os.path.join(folder, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_fixtures(folder=FIXTURE_DIR):
+    """
+    Returns [(AudioClip, transcript)] for every WAV in folder. Real
+    recordings can be dropped in next to the synthetic ones; their
+    transcript comes from manifest.json (empty when not listed).
+    """
+    manifest_path = os.path.join(folder, MANIFEST)
+    if not os.path.exists(manifest_path):
+        write_fixtures(folder)
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    fixtures = []
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith(".wav"):
+            continue
+        name = filename[:-len(".wav")]
+        sample_rate, data = wav.read(os.path.join(folder, filename))
+        if data.dtype == np.int16:
+            data = data.astype(np.float32) / 32768.0
+        fixtures.append((AudioClip(data, sample_rate, name), manifest.get(name, "")))
+    return fixtures
+
+
+if __name__ == "__main__":
+    written = write_fixtures()
+    print(f"✅ Wrote {len(written)} fixtures to {FIXTURE_DIR}")
@@ -0,0 +1,410 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import warnings
+import tempfile
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from dummydata import generate_dataframe, EXCEL_MAX_ROWS
+from core.excel_ops import ExcelExecutor
+from core.frame_cache import FrameCache
+from core.vad import FrameVAD
+from core.transcriber import Transcriber
+from core.llm_engine import LLMEngine
+from core.code_cache import CodeCache
+from core.intent_parser import IntentParser
+from core.command_solver import CommandSolver
+from core.context_manager import ContextManager
+from core.query_engines import ENGINES
+from benchmarks.fakes import FakeTranscriptionBackend, FakeLLMClient, ReplayStream
+from benchmarks.fixtures import load_fixtures
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Snippets run by execute_code / validate_code, one per kind of pandas work
+EXECUTE_SNIPPETS = {
+    "filter": "df = df[df['Sales'] > 25000]",
+    "groupby": "print(df.groupby('Department')['Sales'].sum())",
+    "sort": "df = df.sort_values('Sales', ascending=False)",
+    "derive": "df['Bonus'] = (df['Sales'] * 0.1).where(df['Sales'] > 30000, 0)",
+}
+
+# The groupby snippet as each query engine's prompt variant would write it
+ENGINE_GROUPBY_SNIPPETS = {
+    "duckdb": "print(sql('SELECT \"Department\", SUM(\"Sales\") AS \"Sales\" FROM df GROUP BY 1'))",
+    "polars": "print(lf.group_by('Department').agg(pl.col('Sales').sum()).collect())",
+}
+
+# Voice turn: the spoken command and what the fake model answers when the intent parser passes
+LLM_COMMAND = "Give everyone with Sales above 30000 a bonus of ten percent"
+LLM_ANSWERS = {"bonus": EXECUTE_SNIPPETS["derive"]}
+
+
+class BenchmarkResult:
+    def __init__(self, component, size, timings, work, unit):
+        """
+        :param component: What was measured (load_cold, execute_sort, vad_trim, ...)
+        :param size: Rows in the sheet, or None for components that don't depend on it
+        :param timings: Seconds per repeat
+        :param work: Units processed per repeat (rows, seconds of audio, turns)
+        :param unit: Name of the throughput unit ("rows/s", "x realtime", ...)
+        """
+        self.component = component
+        self.size = size
+        self.timings = timings
+        self.work = work
+        self.unit = unit
+        self.note = ""
+
+    @property
+    def key(self):
+        return f"{self.component}@{self.size}" if self.size is not None else self.component
+
+    @property
+    def median_ms(self):
+        return float(np.median(self.timings)) * 1000
+
+    @property
+    def p90_ms(self):
+        return float(np.percentile(self.timings, 90)) * 1000
+
+    @property
+    def throughput(self):
+        median = float(np.median(self.timings))
+        return self.work / median if median > 0 else float("inf")
+
+    def to_dict(self):
+        return {"median_ms": round(self.median_ms, 3), "p90_ms": round(self.p90_ms, 3),
+                "throughput": round(self.throughput, 3), "unit": self.unit, "repeat": len(self.timings)}
+
+
+class BenchmarkSuite:
+    def __init__(self, sizes=(1_000, 20_000), repeat=3, mixed_types=True, seed=0, transcribe_latency=0.0,
+                 llm_latency=0.0, llm_tokens_per_second=None, sandbox=False, quiet=True):
+        """
+        Times every stage a command goes through, on generated sheets and
+        recorded audio fixtures, with local fakes standing in for the
+        transcription and LLM APIs so nothing touches the network.
+
+        :param sizes: Sheet sizes (rows) to run the sheet benchmarks at
+        :param repeat: Timed runs per component (after one warm-up run)
+        :param mixed_types: Generate the wide sheet (numbers, bools, two date formats, blanks)
+        :param transcribe_latency: Seconds the fake transcription backend takes per upload
+        :param llm_latency: Seconds until the fake model's first token
+        :param llm_tokens_per_second: Streaming rate of the fake model (None = instant)
+        :param sandbox: Execute snippets in the SandboxExecutor worker instead of in-process
+        :param quiet: Swallow the modules' progress prints while timing
+        """
+        self.sizes = sizes
+        self.repeat = repeat
+        self.mixed_types = mixed_types
+        self.seed = seed
+        self.transcribe_latency = transcribe_latency
+        self.llm_latency = llm_latency
+        self.llm_tokens_per_second = llm_tokens_per_second
+        self.quiet = quiet
+        self.sandbox = None
+        if sandbox:
+            from utils.code_executor import SandboxExecutor
+            self.sandbox = SandboxExecutor()
+        self.fixtures = load_fixtures()
+        self.results = []
+        self._workdir = None
+
+    def run(self, only=None):
+        """
+        Runs every component (or those whose name starts with one of only).
+        Returns the list of BenchmarkResult.
+        """
+        self._only = only
+        self._workdir = tempfile.mkdtemp(prefix="xcelord_bench_")
+        try:
+            self._audio_benchmarks()
+            for size in self.sizes:
+                self._sheet_benchmarks(size)
+        finally:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            if self.sandbox is not None:
+                self.sandbox.close()
+        return self.results
+
+    # --- Measurement ---
+    def _wanted(self, component):
+        return not self._only or any(component.startswith(prefix) for prefix in self._only)
+
+    def _measure(self, component, size, fn, work, unit, setup=None, warmup=True):
+        """
+        Times fn() self.repeat times. setup() runs untimed before each call.
+        """
+        if not self._wanted(component):
+            return None
+        timings = []
+        for i in range(self.repeat + (1 if warmup else 0)):
+            if setup is not None:
+                setup()
+            with self._silenced():
+                start = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - start
+            if warmup and i == 0:
+                continue
+            timings.append(elapsed)
+        result = BenchmarkResult(component, size, timings, work, unit)
+        self.results.append(result)
+        return result
+
+    def _skip(self, component, size, reason):
+        if self._wanted(component):
+            result = BenchmarkResult(component, size, [], 0, "")
+            result.note = f"skipped: {reason}"
+            self.results.append(result)
+
+    def _silenced(self):
+        return contextlib.redirect_stdout(io.StringIO()) if self.quiet else contextlib.nullcontext()
+
+    # --- Audio ---
+    def _audio_benchmarks(self):
+        audio_seconds = sum(clip.duration for clip, _ in self.fixtures)
+        vad = FrameVAD()
+        self._measure("vad_trim", None, lambda: [vad.trim(clip.samples) for clip, _ in self.fixtures],
+                      audio_seconds, "x realtime")
+
+        transcripts = {clip.name: text for clip, text in self.fixtures}
+        transcriber = Transcriber(backend=FakeTranscriptionBackend(transcripts, self.transcribe_latency))
+        self._measure("transcribe", None, lambda: [transcriber.transcribe(clip) for clip, _ in self.fixtures],
+                      audio_seconds, "x realtime")
+
+        try:
+            from core.audio_listener import AudioListener
+        except (ImportError, OSError) as e:
+            # sounddevice needs PortAudio even though no device is opened here
+            self._skip("listener_capture", None, f"sounddevice unavailable ({e})")
+            return
+
+        listener = AudioListener()
+
+        def capture():
+            for clip, _ in self.fixtures:
+                listener.threshold = max(listener.vad.calibrate(clip.samples[:clip.sample_rate // 4])
+                                         * listener.threshold_multiplier, 0.001)
+                listener._open_stream = lambda clip=clip: ReplayStream(
+                    listener._callback, clip.samples, listener.block_size,
+                    stopped=lambda: listener._stop_reason is not None)
+                listener.listen_and_record()
+
+        # Includes the trailing silence the listener waits for, replayed faster than real time
+        self._measure("listener_capture", None, capture, audio_seconds, "x realtime")
+
+    # --- Sheets ---
+    def _sheet_benchmarks(self, size):
+        df = None
+
+        def generate():
+            nonlocal df
+            df = generate_dataframe(size, seed=self.seed, mixed_types=self.mixed_types, null_rate=0.02)
+
+        self._measure("generate", size, generate, size, "rows/s", warmup=False)
+        if df is None:
+            generate()
+
+        executor = ExcelExecutor(frame_cache=FrameCache(os.path.join(self._workdir, "cache")),
+                                 sandbox=self.sandbox, dry_run_min_rows=0)
+        path = os.path.join(self._workdir, f"bench_{size}.xlsx")
+
+        if size > EXCEL_MAX_ROWS:
+            for component in ("save", "load_cold", "load_warm", "detect_dates"):
+                self._skip(component, size, "over Excel's row limit")
+        else:
+            self._measure("save", size, lambda: executor.save_file(df, path), size, "rows/s", warmup=False)
+            if not os.path.exists(path):
+                executor.save_file(df, path)
+
+            def cold_start():
+                # No sidecar and no remembered date schema: parse the XLSX and infer dates again
+                shutil.rmtree(os.path.join(self._workdir, "cache"), ignore_errors=True)
+                executor._date_schema_cache.clear()
+
+            self._measure("load_cold", size, lambda: executor.load_sheet(path), size, "rows/s",
+                          setup=cold_start, warmup=False)
+            self._measure("load_warm", size, lambda: executor.load_sheet(path), size, "rows/s")
+            # The generated frame still holds its dates as text, like a freshly read workbook
+            self._measure("detect_dates", size, lambda: executor.detect_date_columns(df), size, "rows/s")
+
+        _, loaded, _ = executor.load_sheet(path) if os.path.exists(path) else (True, df, "")
+        for name, code in EXECUTE_SNIPPETS.items():
+            self._measure(f"execute_{name}", size, lambda code=code: executor.execute_code(loaded, code),
+                          size, "rows/s")
+        for engine, code in ENGINE_GROUPBY_SNIPPETS.items():
+            if not ENGINES[engine].available():
+                self._skip(f"execute_groupby_{engine}", size, f"{engine} not installed")
+                continue
+            self._measure(f"execute_groupby_{engine}", size,
+                          lambda code=code, engine=engine: executor.execute_code(loaded, code, engine=engine),
+                          size, "rows/s")
+        self._measure("dry_run", size, lambda: executor.validate_code(loaded, EXECUTE_SNIPPETS["derive"]),
+                      size, "rows/s")
+        self._voice_turn(size, loaded, executor)
+
+    def _voice_turn(self, size, df, executor):
+        """
+        One spoken command end to end: transcription, intent parsing, an LLM
+        solve with parallel candidates (cache cleared every run), execution.
+        """
+        clip = self.fixtures[0][0]
+        transcriber = Transcriber(backend=FakeTranscriptionBackend({}, self.transcribe_latency,
+                                                                   default=LLM_COMMAND))
+        client = FakeLLMClient(LLM_ANSWERS, latency=self.llm_latency,
+                               tokens_per_second=self.llm_tokens_per_second)
+        llm = LLMEngine(client=client)
+        solver = CommandSolver(llm, executor, candidates=2)
+        intent_parser = IntentParser()
+        context = ContextManager()
+
+        def turn():
+            text = transcriber.transcribe(clip)
+            code = intent_parser.parse(text, df)
+            if code is not None:
+                return executor.execute_code(df, code)
+            return solver.solve(text, df, context.get_spreadsheet_summary(df), schema_key=context.schema_key(df))
+
+        def clear_cache():
+            llm.cache = CodeCache()
+
+        try:
+            self._measure("voice_turn", size, turn, 1, "turns/s", setup=clear_cache)
+        finally:
+            solver.close()
+
+
+# --- Baseline ---
+def results_to_dict(results):
+    return {r.key: r.to_dict() for r in results if r.timings}
+
+
+def save_baseline(results, path=DEFAULT_BASELINE, settings=None):
+    data = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count(),
+                    "pandas": pd.__version__, "numpy": np.__version__},
+        "settings": settings or {},
+        "results": results_to_dict(results),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def load_baseline(path=DEFAULT_BASELINE):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.25, min_delta_ms=1.0):
+    """
+    Returns {key: (status, ratio)}; ratio is median / baseline median and
+    status is "regression", "improved", "ok" or "new". Differences under
+    min_delta_ms are always "ok", so jitter on sub-millisecond stages
+    doesn't fail a run.
+    """
+    stored = (baseline or {}).get("results", {})
+    verdicts = {}
+    for result in results:
+        if not result.timings:
+            continue
+        base = stored.get(result.key)
+        if base is None or not base.get("median_ms"):
+            verdicts[result.key] = ("new", None)
+            continue
+        ratio = result.median_ms / base["median_ms"]
+        if abs(result.median_ms - base["median_ms"]) < min_delta_ms:
+            status = "ok"
+        elif ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 / (1 + tolerance):
+            status = "improved"
+        else:
+            status = "ok"
+        verdicts[result.key] = (status, ratio)
+    return verdicts
+
+
+def print_report(results, verdicts=None):
+    verdicts = verdicts or {}
+    icons = {"regression": "❌", "improved": "🚀", "ok": "✅", "new": "🆕"}
+    print(f"{'component':<28}{'median ms':>12}{'p90 ms':>12}{'throughput':>16}  {'unit':<12}vs baseline")
+    for r in results:
+        if not r.timings:
+            print(f"{r.key:<28}{r.note}")
+            continue
+        status, ratio = verdicts.get(r.key, (None, None))
+        versus = f"{icons[status]} {status}" + (f" ({ratio:.2f}x)" if ratio is not None else "") if status else ""
+        print(f"{r.key:<28}{r.median_ms:>12.2f}{r.p90_ms:>12.2f}{r.throughput:>16,.1f}  {r.unit:<12}{versus}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark load, date inference, execute, save and audio capture.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 20_000], help="Sheet sizes to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Component name prefixes (e.g. load execute vad)")
+    parser.add_argument("--narrow", action="store_true", help="Only the four original demo columns")
+    parser.add_argument("--sandbox", action="store_true", help="Execute snippets in the sandbox worker")
+    parser.add_argument("--transcribe-latency", type=float, default=0.0, help="Fake API seconds per upload")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake API seconds to first token")
+    parser.add_argument("--llm-tps", type=float, default=None, help="Fake API streaming tokens per second")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore smaller slowdowns")
+    parser.add_argument("--json", help="Also write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+    # guess_datetime_format warns on every day-first sample column; the timings are what matter here
+    warnings.filterwarnings("ignore", message="Parsing dates in", category=UserWarning)
+
+    suite = BenchmarkSuite(sizes=args.rows, repeat=args.repeat, mixed_types=not args.narrow,
+                           transcribe_latency=args.transcribe_latency, llm_latency=args.llm_latency,
+                           llm_tokens_per_second=args.llm_tps, sandbox=args.sandbox)
+    print(f"⏱️ Benchmarking sizes {args.rows} with {args.repeat} repeat(s)...")
+    results = suite.run(args.only)
+    settings = {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "json")}
+
+    if args.save_baseline:
+        print_report(results)
+        save_baseline(results, args.baseline, settings)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline to create one.")
+    elif baseline.get("settings", {}).get("narrow") != args.narrow:
+        print("⚠️ Baseline was recorded with a different column set; comparisons may be off.")
+    verdicts = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    print_report(results, verdicts)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results_to_dict(results),
+                       "verdicts": {k: v[0] for k, v in verdicts.items()}}, f, indent=2)
+
+    regressions = [key for key, (status, _) in verdicts.items() if status == "regression"]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("✅ No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import os
+import time
+import random
+import logging
+import threading
+
+import groq
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (once, for every module)
+load_dotenv()
+
+
+# --- Typed Errors ---
+class APIError(Exception):
+    """
+    Base class for every failure of a remote API call.
+    """
+    def __init__(self, message, status_code=None, attempts=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.attempts = attempts
+
+
+class ConfigurationError(APIError):
+    """Missing or rejected API key."""
+
+
+class RateLimitError(APIError):
+    """HTTP 429 after all retries."""
+
+
+class ServerError(APIError):
+    """HTTP 5xx or connection failure after all retries."""
+
+
+class DeadlineExceededError(APIError):
+    """The per-call deadline ran out (including time spent backing off)."""
+
+
+class RequestError(APIError):
+    """The request itself was rejected (4xx other than 401/403/429). Not retried."""
+
+
+class APIClient:
+    def __init__(self, api_key=None, base_url=None, timeout=30.0, connect_timeout=5.0,
+                 max_retries=4, backoff_base=0.5, backoff_max=8.0, max_connections=10):
+        """
+        One pooled HTTP client shared by the Transcriber and the LLMEngine.
+
+        :param timeout: Default per-call deadline in seconds
+        :param connect_timeout: TCP/TLS connect timeout
+        :param max_retries: Retries on 429 / 5xx / connection errors
+        :param backoff_base: First backoff step (seconds); doubles every attempt
+        :param backoff_max: Upper bound of a single backoff sleep
+        :param max_connections: Size of the keep-alive connection pool
+        """
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not self.api_key:
+            raise ConfigurationError("GROQ_API_KEY not found in .env file")
+
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Keep-alive pool: connections (and their TLS sessions) are reused across turns
+        self.http = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=120.0),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+        # Retries are handled here (with jitter and deadlines), not by the SDK
+        self.groq = groq.Groq(api_key=self.api_key, base_url=base_url, http_client=self.http, max_retries=0)
+
+    def warm_up(self, background=True):
+        """
+        Opens a pooled connection ahead of the first real request so the
+        DNS/TCP/TLS handshake is not paid on the user's first command.
+        """
+        def _ping():
+            try:
+                self.groq.with_options(timeout=5.0).models.list()
+            except Exception as e:
+                logging.info(f"Warm-up failed (ignored): {e}")
+
+        if background:
+            threading.Thread(target=_ping, daemon=True).start()
+        else:
+            _ping()
+
+    def call(self, request, deadline=None):
+        """
+        Runs request(client) with retries and an overall deadline.
+        Raises one of the typed APIError subclasses on failure.
+
+        :param request: Callable taking the Groq client and performing one API call
+        :param deadline: Seconds for the whole call including retries (defaults to timeout)
+        """
+        deadline = deadline if deadline is not None else self.timeout
+        end_time = time.monotonic() + deadline
+        attempt = 0
+
+        while True:
+            attempt += 1
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"Deadline of {deadline:.1f}s exceeded", attempts=attempt - 1)
+
+            try:
+                return request(self.groq.with_options(timeout=remaining))
+            except Exception as e:
+                error, retry_after = translate_error(e, attempt)
+                if not isinstance(error, (RateLimitError, ServerError)) or attempt > self.max_retries:
+                    raise error from e
+
+            # Full jitter exponential backoff, honouring Retry-After when given
+            sleep_for = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+            if retry_after is not None:
+                sleep_for = max(sleep_for, retry_after)
+            if time.monotonic() + sleep_for >= end_time:
+                raise DeadlineExceededError(
+                    f"Deadline of {deadline:.1f}s exceeded while backing off ({error})",
+                    status_code=error.status_code, attempts=attempt)
+            logging.info(f"Retrying after {error} (attempt {attempt}, sleeping {sleep_for:.2f}s)")
+            time.sleep(sleep_for)
+
+    def close(self):
+        self.http.close()
+
+
+def translate_error(e, attempt=1):
+    """
+    Maps SDK/transport exceptions onto our typed errors. Returns (error, retry_after_seconds).
+    """
+    if isinstance(e, APIError):
+        return e, None
+    if isinstance(e, groq.APITimeoutError):
+        return DeadlineExceededError(f"Request timed out: {e}", attempts=attempt), None
+    if isinstance(e, groq.APIConnectionError):
+        return ServerError(f"Connection error: {e}", attempts=attempt), None
+    if isinstance(e, groq.APIStatusError):
+        status = e.status_code
+        retry_after = None
+        try:
+            retry_after = float(e.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+        if status == 429:
+            return RateLimitError(f"Rate limited: {e}", status, attempt), retry_after
+        if status >= 500:
+            return ServerError(f"Server error {status}: {e}", status, attempt), retry_after
+        if status in (401, 403):
+            return ConfigurationError(f"Authentication failed: {e}", status, attempt), None
+        return RequestError(f"Request rejected ({status}): {e}", status, attempt), None
+    return APIError(f"Unexpected API failure: {e}", attempts=attempt), None
+
+
+# --- Shared Instance ---
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client(**kwargs):
+    """
+    Returns the process-wide APIClient, creating it on first use.
+    """
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = APIClient(**kwargs)
+        return _shared_client
@@ -0,0 +1,92 @@
+import io
+from math import gcd
+
+import numpy as np
+import scipy.io.wavfile as wav
+from scipy.signal import resample_poly
+
+try:
+    import soundfile as sf
+except (ImportError, OSError):
+    sf = None
+
+
+class AudioClip:
+    """
+    In-memory audio passed from AudioListener to Transcriber.
+    Samples are float32 in [-1, 1], shaped (frames,) or (frames, channels).
+    """
+    def __init__(self, samples, sample_rate, name="voice_command"):
+        self.samples = np.asarray(samples, dtype=np.float32)
+        self.sample_rate = int(sample_rate)
+        self.name = name
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate if self.sample_rate else 0.0
+
+    @property
+    def channels(self):
+        return 1 if self.samples.ndim == 1 else self.samples.shape[1]
+
+    # --- Transforms (each returns a new clip) ---
+    def downmix(self):
+        """
+        Averages all channels into mono.
+        """
+        if self.samples.ndim == 1:
+            return self
+        return AudioClip(self.samples.mean(axis=1), self.sample_rate, self.name)
+
+    def resample(self, target_rate):
+        """
+        Polyphase resampling to target_rate (e.g. 48 kHz mic -> 16 kHz for Whisper).
+        """
+        target_rate = int(target_rate)
+        if target_rate == self.sample_rate or len(self.samples) == 0:
+            return self
+        g = gcd(self.sample_rate, target_rate)
+        resampled = resample_poly(self.samples, target_rate // g, self.sample_rate // g, axis=0)
+        return AudioClip(resampled.astype(np.float32), target_rate, self.name)
+
+    def to_pcm16(self):
+        return (np.clip(self.samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+    # --- Encoding ---
+    def encode(self, fmt="flac"):
+        """
+        Encodes the clip into a BytesIO. 'wav' is int16 PCM (half the size of
+        float32); 'flac' is lossless and smaller still. Falls back to 'wav'
+        when soundfile/libsndfile is not available.
+        Returns (buffer, fmt_used).
+        """
+        buffer = io.BytesIO()
+        if fmt == "flac" and sf is not None:
+            sf.write(buffer, self.to_pcm16(), self.sample_rate, format="FLAC", subtype="PCM_16")
+        elif fmt in ("flac", "wav"):
+            fmt = "wav"
+            wav.write(buffer, self.sample_rate, self.to_pcm16())
+        else:
+            raise ValueError(f"Unsupported audio format: {fmt}")
+        buffer.seek(0)
+        return buffer, fmt
+
+    def to_upload(self, fmt="flac", sample_rate=None, mono=True):
+        """
+        Prepares a (filename, bytes) tuple ready for an HTTP file upload.
+        """
+        clip = self.downmix() if mono else self
+        if sample_rate:
+            clip = clip.resample(sample_rate)
+        buffer, fmt = clip.encode(fmt)
+        return f"{self.name}.{fmt}", buffer.getvalue()
+
+    def save(self, filepath):
+        """
+        Writes the clip to disk as int16 WAV (debugging / fixtures only).
+        """
+        wav.write(filepath, self.sample_rate, self.to_pcm16())
+        return filepath
@@ -1,119 +1,298 @@
 import sounddevice as sd
 import numpy as np
-import scipy.io.wavfile as wav
+import threading
+import queue
 import time
-import os
+from core.vad import FrameVAD
+from core.tracing import span, get_tracer
+from core.audio_clip import AudioClip
+
+
+class RingBuffer:
+    """
+    Fixed-size circular buffer of float32 samples.
+    Memory is allocated once up front; writes never allocate.
+    """
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=np.float32)
+        self.write_pos = 0
+        self.total_written = 0
+
+    def clear(self):
+        self.write_pos = 0
+        self.total_written = 0
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        n = len(samples)
+        if n == 0:
+            return
+        # If a single write is larger than the buffer, only the tail survives
+        if n >= self.capacity:
+            self.buffer[:] = samples[-self.capacity:]
+            self.write_pos = 0
+            self.total_written += n
+            return
+
+        end = self.write_pos + n
+        if end <= self.capacity:
+            self.buffer[self.write_pos:end] = samples
+        else:
+            first = self.capacity - self.write_pos
+            self.buffer[self.write_pos:] = samples[:first]
+            self.buffer[:n - first] = samples[first:]
+        self.write_pos = end % self.capacity
+        self.total_written += n
+
+    def read_all(self):
+        """
+        Returns the buffered samples in chronological order (one copy).
+        """
+        if self.total_written < self.capacity:
+            return self.buffer[:self.write_pos].copy()
+        return np.concatenate((self.buffer[self.write_pos:], self.buffer[:self.write_pos]))
+
+    def read_range(self, start, end):
+        """
+        Returns samples [start, end) addressed by absolute sample index
+        (counted since the last clear). The range must still be buffered.
+        """
+        if start < self.total_written - self.capacity or end > self.total_written:
+            raise IndexError("Requested range is no longer in the ring buffer")
+        if end <= start:
+            return self.buffer[:0].copy()
+        a, b = start % self.capacity, end % self.capacity
+        if a < b or b == 0:
+            return self.buffer[a:b or self.capacity].copy()
+        return np.concatenate((self.buffer[a:], self.buffer[:b]))
+
 
 class AudioListener:
-    def __init__(self, sample_rate=16000, silence_duration=2.0, threshold_multiplier=3.0):
+    def __init__(self, sample_rate=16000, silence_duration=2.0, threshold_multiplier=3.0,
+                 block_duration=0.1, speech_timeout=15.0, max_duration=30.0, vad=None):
         """
+        Recording starts and stops on the VAD's per-frame speech decisions
+        (adaptive noise floor, min_speech, hangover), so the end of speech
+        is found promptly even in a noisy room.
+
         :param sample_rate: Hz (16000 is optimal for Whisper)
-        :param silence_duration: Seconds of silence before stopping recording
+        :param silence_duration: Seconds without speech (after the VAD's hangover) before stopping
         :param threshold_multiplier: How much louder than background noise to trigger recording
+        :param block_duration: Seconds of audio delivered per stream callback
+        :param speech_timeout: Seconds to wait for speech before giving up
+        :param max_duration: Hard cap on the length of a single recording
+        :param vad: FrameVAD that detects speech and pads the clip (pre/post roll live there)
         """
         self.sample_rate = sample_rate
         self.silence_duration = silence_duration
         self.threshold_multiplier = threshold_multiplier
-        self.threshold = 0
-        self.recording = []
+        self.threshold = 0  # Calibrated starting threshold (shown to the user); the VAD adapts from there
+        self.block_size = int(sample_rate * block_duration)
+        self.speech_timeout = speech_timeout
+        self.max_duration = max_duration
+        self.vad = vad if vad is not None else FrameVAD(sample_rate=sample_rate,
+                                                        threshold_multiplier=threshold_multiplier)
+
+        # Preallocated capture state (reused across recordings)
+        self.ring = RingBuffer(int(max_duration * sample_rate))
+        self._vad_stream = self.vad.stream()
+        self._speech_event = threading.Event()
+        self._done_event = threading.Event()
+        self._reset_capture_state()
+
+    def _reset_capture_state(self):
+        self.ring.clear()
+        self._vad_stream.reset()
+        self._samples_seen = 0
+        self._speech_started = False
+        self._stop_reason = None
+        self._last_cut_sample = 0
+        self._segments = None
+        self._speech_event.clear()
+        self._done_event.clear()
 
     def calibrate_noise(self, duration=1.0):
         """
         Listens for a second to understand background noise levels.
         """
         print("Adjusting to ambient noise... please remain silent.")
-        # Record a short chunk
-        recording = sd.rec(int(duration * self.sample_rate), 
-                           samplerate=self.sample_rate, channels=1)
-        sd.wait() # Wait for recording to finish
-        
-        # Calculate Volume (RMS amplitude)
-        rms = np.sqrt(np.mean(recording**2))
-        
+        with span("calibrate", seconds=duration):
+            # Record a short chunk
+            recording = sd.rec(int(duration * self.sample_rate),
+                               samplerate=self.sample_rate, channels=1)
+            sd.wait() # Wait for recording to finish
+
+            # Calculate Volume (RMS amplitude)
+            rms = self.vad.calibrate(recording)
+
         # Set threshold slightly higher than ambient noise
         self.threshold = rms * self.threshold_multiplier
-        
+
         # Safety: If environment is dead silent, set a minimum threshold
         if self.threshold < 0.001:
             self.threshold = 0.001
-            
+
         print(f"Calibration complete. Threshold set to: {self.threshold:.5f}")
 
-    def listen_and_record(self, output_filename="input_command.wav"):
+    def _process_block(self, samples):
         """
-        Blocks execution until speech is detected, recorded, and finished.
-        Returns the filename.
+        Feeds one block of audio into the ring buffer and the streaming VAD
+        and makes the start/stop decision from its per-frame verdicts. Runs
+        on the audio thread, so it must stay allocation-light and never block.
+        """
+        self.ring.write(samples)
+        self._vad_stream.feed(samples)
+        self._samples_seen += len(samples)
+        now = self._samples_seen
+        vad = self._vad_stream
+
+        # 1. Waiting for speech to start
+        if not self._speech_started:
+            if vad.speech_start is not None:
+                self._speech_started = True
+                self._speech_event.set()
+            elif now > self.speech_timeout * self.sample_rate:
+                self._stop("timeout")
+                return
+
+        # 2. Speech has started, looking for silence to stop
+        else:
+            if now - vad.last_speech_sample > self.silence_duration * self.sample_rate:
+                self._stop("silence")
+                return
+            if self._segments is not None:
+                self._maybe_cut_segment(now)
+
+        # Max recording length safety
+        if now >= self.max_duration * self.sample_rate:
+            self._stop("max_duration")
+
+    def _maybe_cut_segment(self, now):
         """
-        self.recording = []
-        
+        Streaming mode: at a short pause inside speech, hand the audio since
+        the previous cut to the consumer so it can be transcribed while the
+        user keeps talking. Pauses are judged on loud frames, without the
+        VAD's hangover, so short gaps between phrases are caught.
+        """
+        last_voiced = self._vad_stream.last_voiced_sample
+        paused = now - last_voiced >= self._chunk_pause
+        long_enough = last_voiced - self._last_cut_sample >= self._chunk_min
+        if paused and long_enough:
+            self._segments.put(self._speech_span(self._last_cut_sample, now))
+            self._last_cut_sample = now
+
+    def _speech_span(self, start, end):
+        """
+        The part of [start, end) holding speech, padded by the VAD's pre/post roll.
+        """
+        vad = self._vad_stream
+        padded_start, padded_end = self.vad.pad(vad.speech_start, vad.last_speech_sample, self._samples_seen)
+        return max(start, padded_start), min(end, padded_end)
+
+    def _stop(self, reason):
+        if self._stop_reason is None:
+            self._stop_reason = reason
+            if self._segments is not None:
+                if self._speech_started and self._vad_stream.last_voiced_sample > self._last_cut_sample:
+                    self._segments.put(self._speech_span(self._last_cut_sample, self._samples_seen))
+                self._segments.put(None)
+            self._done_event.set()
+
+    def _callback(self, indata, frames, time_info, status):
         # This function runs every time the mic captures a chunk of audio
-        def callback(indata, frames, time_info, status):
-            if status:
-                print(status)
-            self.recording.append(indata.copy())
+        if status:
+            print(status)
+        if self._stop_reason is None:
+            self._process_block(indata[:, 0])
+
+    def _open_stream(self):
+        return sd.InputStream(samplerate=self.sample_rate, channels=1, dtype='float32',
+                              blocksize=self.block_size, callback=self._callback)
 
+    def _report_stop(self):
+        if self._stop_reason == "timeout" or not self._speech_started:
+            print("Timeout: No speech detected.")
+        elif self._stop_reason == "max_duration":
+            print("Max duration reached.")
+        else:
+            print("Silence detected. Stopping.")
+
+    def listen_and_record(self, output_filename=None):
+        """
+        Blocks execution until speech is detected, recorded, and finished.
+        Returns an in-memory AudioClip (or None if nothing was said).
+        The clip is only written to disk when output_filename is given.
+        """
+        self._reset_capture_state()
         print("🎤 Listening... (Speak now)")
-        
+
         # Open Microphone Stream
-        with sd.InputStream(samplerate=self.sample_rate, channels=1, callback=callback):
-            start_time = time.time()
-            speech_started = False
-            last_speech_time = time.time()
-            
+        with span("listen", streaming=False) as trace, self._open_stream():
+            # Both waits are event driven; the timeouts are only a guard
+            # against a stalled audio device.
+            guard = self.max_duration + 1.0
+            if self._speech_event.wait(timeout=self.speech_timeout + 1.0):
+                print("Detected speech, recording...")
+            self._done_event.wait(timeout=guard)
+            trace.set(reason=self._stop_reason, samples=self._samples_seen)
+
+        self._report_stop()
+        if self._stop_reason == "timeout" or not self._speech_started:
+            return None
+
+        # Keep only the speech the VAD found, plus its pre/post roll
+        full_audio = self.ring.read_range(*self._speech_span(0, self._samples_seen))
+        if not len(full_audio):
+            return None
+
+        clip = AudioClip(full_audio, self.sample_rate)
+        if output_filename:
+            clip.save(output_filename)
+            print(f"Audio saved to {output_filename}")
+        return clip
+
+    def stream_segments(self, min_chunk_duration=1.5, chunk_pause=0.4):
+        """
+        Streaming variant of listen_and_record. Yields an AudioClip for every
+        speech chunk (cut at short pauses) while recording is still running,
+        and a final chunk once the silence timeout ends the recording.
+
+        :param min_chunk_duration: Seconds of speech before a chunk may be cut
+        :param chunk_pause: Seconds of pause that count as a chunk boundary
+        """
+        self._reset_capture_state()
+        self._chunk_min = int(min_chunk_duration * self.sample_rate)
+        self._chunk_pause = int(chunk_pause * self.sample_rate)
+        self._segments = queue.Queue()
+        print("🎤 Listening... (Speak now, streaming)")
+
+        # A generator can't hold a span open across its yields, so the
+        # capture time is measured here and recorded once it ends
+        start = time.perf_counter()
+        chunks = 0
+        with self._open_stream():
             while True:
-                if not self.recording:
-                    time.sleep(0.1)
-                    continue
-                
-                # Check volume of the most recent audio chunk
-                # We analyze the last 0.5 seconds (approx sample_rate/2 frames)
-                if len(self.recording) > 5:
-                    recent_data = np.concatenate(self.recording[-5:])
-                else:
-                    recent_data = self.recording[-1]
-                    
-                current_volume = np.sqrt(np.mean(recent_data**2))
-
-                # LOGIC:
-                # 1. Waiting for speech to start
-                if not speech_started:
-                    if current_volume > self.threshold:
-                        print("Detected speech, recording...")
-                        speech_started = True
-                        last_speech_time = time.time()
-                    # Optional timeout if no one speaks for 15 seconds
-                    elif time.time() - start_time > 15:
-                        print("Timeout: No speech detected.")
-                        return None
-                
-                # 2. Speech has started, looking for silence to stop
-                else:
-                    if current_volume > self.threshold:
-                        last_speech_time = time.time() # Reset timer if we hear sound
-                    
-                    # If silence exceeds limit, stop
-                    if time.time() - last_speech_time > self.silence_duration:
-                        print("Silence detected. Stopping.")
-                        break
-                
-                # Max recording length safety (30 seconds)
-                if time.time() - start_time > 30:
-                    print("Max duration reached.")
+                try:
+                    item = self._segments.get(timeout=self.max_duration + 1.0)
+                except queue.Empty:
+                    break
+                if item is None:
                     break
-                
-                time.sleep(0.1)
+                audio = self.ring.read_range(*item)
+                if len(audio):
+                    chunks += 1
+                    yield AudioClip(audio, self.sample_rate, name=f"chunk_{item[0]}")
 
-        # Process and Save File
-        if self.recording:
-            full_audio = np.concatenate(self.recording, axis=0)
-            wav.write(output_filename, self.sample_rate, full_audio)
-            print(f"Audio saved to {output_filename}")
-            return output_filename
-        else:
-            return None
+        get_tracer().record("listen", time.perf_counter() - start, streaming=True, chunks=chunks,
+                            reason=self._stop_reason, samples=self._samples_seen)
+        self._report_stop()
 
 # --- Testing Block ---
 if __name__ == "__main__":
     listener = AudioListener()
     listener.calibrate_noise()
-    listener.listen_and_record("test_output.wav")
\ No newline at end of file
+    listener.listen_and_record("test_output.wav")
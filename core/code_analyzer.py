@@ -0,0 +1,484 @@
+import ast
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+
+# Findings of these kinds are worth a regeneration request when the rewriter can't fix them
+SLOW_KINDS = {"iterrows", "row_apply", "index_loop"}
+
+_BUILTINS_OK = {"abs", "round"}  # Builtins that work unchanged on a Series
+_ROW_ITERATORS = {"iterrows", "itertuples", "items", "iteritems"}
+
+
+@lru_cache(maxsize=512)
+def compile_snippet(code):
+    """
+    Compiled code object for a snippet. Shared by the analyzer and the
+    executor, so a snippet is only compiled once however often it runs.
+    Raises SyntaxError.
+    """
+    return compile(code, "<generated>", "exec")
+
+
+class Finding:
+    def __init__(self, kind, lineno, message):
+        self.kind = kind
+        self.lineno = lineno
+        self.message = message
+
+    def __str__(self):
+        return f"Line {self.lineno}: {self.message}"
+
+
+class CodeAnalysis:
+    def __init__(self, original, code, compiled=None, error=None, findings=None, rewrites=None):
+        self.original = original
+        self.code = code            # What should run (original or vectorized rewrite)
+        self.compiled = compiled
+        self.error = error
+        self.findings = findings or []  # Slow patterns still present in code
+        self.rewrites = rewrites or []  # Human-readable notes on what was vectorized
+
+    @property
+    def slow_findings(self):
+        return [f for f in self.findings if f.kind in SLOW_KINDS]
+
+    @property
+    def needs_regeneration(self):
+        return self.error is not None or bool(self.slow_findings)
+
+    def feedback(self):
+        """
+        Targeted instructions for the model describing what to fix.
+        """
+        if self.error is not None:
+            return f"Your code does not compile: {self.error}. Return the corrected code."
+        lines = ["Your code is correct but too slow on large sheets:"]
+        lines += [f"- {f}" for f in self.slow_findings]
+        lines.append("Rewrite it with vectorized pandas column operations (no Python loops over rows, "
+                     "no apply(axis=1)). Use arithmetic on whole columns, boolean masks with df.loc, "
+                     "Series.where / Series.mask, and groupby. Return only the code.")
+        return "\n".join(lines)
+
+
+# --- Detection ---
+def _call_name(node):
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def _is_row_axis(call):
+    for kw in call.keywords:
+        if kw.arg == "axis" and isinstance(kw.value, ast.Constant) and kw.value.value in (1, "columns"):
+            return True
+    return False
+
+
+def _is_index_loop(node):
+    """
+    for i in df.index / range(len(df)) / range(df.shape[0])
+    """
+    it = node.iter
+    if isinstance(it, ast.Attribute) and it.attr == "index":
+        return True
+    if isinstance(it, ast.Call) and isinstance(it.func, ast.Name) and it.func.id == "range" and it.args:
+        arg = it.args[-1] if len(it.args) > 1 else it.args[0]
+        if isinstance(arg, ast.Call) and isinstance(arg.func, ast.Name) and arg.func.id == "len":
+            return True
+        if isinstance(arg, ast.Subscript) and isinstance(arg.value, ast.Attribute) and arg.value.attr == "shape":
+            return True
+    return False
+
+
+@lru_cache(maxsize=512)
+def referenced_sheets(code):
+    """
+    Names used as sheets['Name'] in a snippet, so only those sheets are
+    loaded for it. Returns a frozenset, or None when sheets is used in a
+    way that can't be resolved statically (a loop over it, a variable key).
+    Raises SyntaxError.
+    """
+    tree = ast.parse(code)
+    names = set()
+    resolved = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "sheets" \
+                and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+            names.add(node.slice.value)
+            resolved.add(id(node.value))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == "sheets" and id(node) not in resolved:
+            return None
+    return frozenset(names)
+
+
+def find_slow_patterns(tree):
+    findings = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.For, ast.comprehension)):
+            lineno = getattr(node, "lineno", getattr(node.iter, "lineno", 0))
+            if _call_name(node.iter) in _ROW_ITERATORS:
+                findings.append(Finding("iterrows", lineno, f"Python loop over .{_call_name(node.iter)}()"))
+            elif _is_index_loop(node):
+                findings.append(Finding("index_loop", lineno, "Python loop over the row index"))
+        elif isinstance(node, ast.Call) and _call_name(node) == "apply" and _is_row_axis(node):
+            findings.append(Finding("row_apply", node.lineno, "row-wise apply(axis=1)"))
+        elif isinstance(node, ast.Call) and _call_name(node) in ("apply", "map") \
+                and node.args and isinstance(node.args[0], ast.Lambda):
+            findings.append(Finding("element_apply", node.lineno, f"element-wise .{_call_name(node)}(lambda)"))
+    return sorted(findings, key=lambda f: f.lineno)
+
+
+# --- Vectorizing rewrites ---
+class _Vectorizer:
+    """
+    Turns an expression that reads one row into the equivalent whole-column
+    expression. resolve(node) maps a row access to a column name and
+    build(name) returns the column expression; anything other than
+    arithmetic, comparisons and abs/round on those is rejected.
+    """
+
+    def __init__(self, resolve, build):
+        self.resolve = resolve
+        self.build = build
+        self.columns_read = set()
+
+    def convert(self, node):
+        col = self.resolve(node)
+        if col is not None:
+            self.columns_read.add(col)
+            return self.build(col)
+        if isinstance(node, ast.Constant):
+            return node
+        if isinstance(node, ast.BinOp):
+            left, right = self.convert(node.left), self.convert(node.right)
+            if left is None or right is None:
+                return None
+            return ast.BinOp(left=left, op=node.op, right=right)
+        if isinstance(node, ast.UnaryOp):
+            operand = self.convert(node.operand)
+            if operand is None:
+                return None
+            if not isinstance(node.op, ast.Not):
+                return ast.UnaryOp(op=node.op, operand=operand)
+            if not _is_boolean(node.operand):
+                # `not x` is truthiness: ~x would flip the bits of an int column
+                operand = ast.Call(func=ast.Attribute(value=operand, attr="astype", ctx=ast.Load()),
+                                   args=[ast.Name(id="bool", ctx=ast.Load())], keywords=[])
+            return ast.UnaryOp(op=ast.Invert(), operand=operand)
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 \
+                and not isinstance(node.ops[0], (ast.Is, ast.IsNot, ast.In, ast.NotIn)):
+            left, right = self.convert(node.left), self.convert(node.comparators[0])
+            if left is None or right is None:
+                return None
+            return ast.Compare(left=left, ops=node.ops, comparators=[right])
+        if isinstance(node, ast.BoolOp) and all(isinstance(v, (ast.Compare, ast.BoolOp)) for v in node.values):
+            # and/or between comparisons become element-wise &/|
+            values = [self.convert(v) for v in node.values]
+            if any(v is None for v in values):
+                return None
+            op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+            result = values[0]
+            for value in values[1:]:
+                result = ast.BinOp(left=result, op=op, right=value)
+            return result
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _BUILTINS_OK \
+                and not node.keywords:
+            args = [self.convert(a) for a in node.args]
+            if any(a is None for a in args):
+                return None
+            return ast.Call(func=node.func, args=args, keywords=[])
+        return None
+
+
+def _is_boolean(node):
+    """
+    True when the row expression is boolean whatever the column dtypes
+    (comparisons, and/or between them, not).
+    """
+    if isinstance(node, (ast.Compare, ast.BoolOp)):
+        return True
+    return isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not)
+
+
+def _frame_column(frame):
+    return lambda name: ast.Subscript(value=ast.Name(id=frame, ctx=ast.Load()),
+                                      slice=ast.Constant(value=name), ctx=ast.Load())
+
+
+def _subscript_key(node):
+    """
+    'X' for x['X']; (a, 'X') for x[a, 'X']; else None.
+    """
+    key = node.slice
+    if isinstance(key, ast.Constant) and isinstance(key.value, str):
+        return key.value
+    if isinstance(key, ast.Tuple) and len(key.elts) == 2 \
+            and isinstance(key.elts[1], ast.Constant) and isinstance(key.elts[1].value, str):
+        return key.elts[0], key.elts[1].value
+    return None
+
+
+def _cell_ref(node, frame, index_name):
+    """
+    Column name if node is df.at[i, 'X'] / df.loc[i, 'X'] / df['X'][i] for the loop variable i.
+    """
+    if not isinstance(node, ast.Subscript):
+        return None
+    base = node.value
+    if isinstance(base, ast.Attribute) and base.attr in ("at", "loc") \
+            and isinstance(base.value, ast.Name) and base.value.id == frame:
+        key = _subscript_key(node)
+        if isinstance(key, tuple) and isinstance(key[0], ast.Name) and key[0].id == index_name:
+            return key[1]
+    if isinstance(base, ast.Subscript) and isinstance(base.value, ast.Name) and base.value.id == frame \
+            and isinstance(node.slice, ast.Name) and node.slice.id == index_name:
+        key = _subscript_key(base)
+        if isinstance(key, str):
+            return key
+    return None
+
+
+def _name_subscript(node, name):
+    """
+    Column name if node is name['X'].
+    """
+    if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == name:
+        key = _subscript_key(node)
+        if isinstance(key, str):
+            return key
+    return None
+
+
+class _Rewriter(ast.NodeTransformer):
+    def __init__(self):
+        self.notes = []
+        self._masks = 0
+
+    # --- df.apply(lambda row: ..., axis=1) and s.apply(lambda x: ...) ---
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        name = _call_name(node)
+        if name not in ("apply", "map") or len(node.args) != 1 or not isinstance(node.args[0], ast.Lambda):
+            return node
+        receiver = node.func.value
+        lam = node.args[0]
+        if len(lam.args.args) != 1:
+            return node
+        param = lam.args.args[0].arg
+        other_kwargs = [kw for kw in node.keywords if kw.arg != "axis"]
+        if other_kwargs:
+            return node
+
+        if name == "apply" and _is_row_axis(node):
+            if not isinstance(receiver, ast.Name):
+                return node
+            vec = _Vectorizer(lambda n: _name_subscript(n, param), _frame_column(receiver.id))
+            converted = vec.convert(lam.body)
+            if converted is None or not vec.columns_read:
+                return node
+            self.notes.append(f"Line {node.lineno}: apply(axis=1) replaced by column arithmetic")
+            return converted
+
+        # Element-wise: the parameter stands for the whole column. Only on
+        # df['X'] receivers; a Name could be a GroupBy, where apply means something else
+        if node.keywords or _name_subscript(receiver, "df") is None:
+            return node
+        vec = _Vectorizer(lambda n: param if isinstance(n, ast.Name) and n.id == param else None,
+                          lambda _: receiver)
+        converted = vec.convert(lam.body)
+        if converted is None or not vec.columns_read:
+            return node
+        self.notes.append(f"Line {node.lineno}: .{name}(lambda) replaced by column arithmetic")
+        return converted
+
+    # --- for i, row in df.iterrows(): df.at[i, 'C'] = ... ---
+    def visit_For(self, node):
+        self.generic_visit(node)
+        if node.orelse:
+            return node
+        plan = self._loop_plan(node)
+        if plan is None:
+            return node
+        frame, resolve = plan
+        statements = self._vectorize_body(node.body, frame, resolve, node)
+        if statements is None:
+            return node
+        self.notes.append(f"Line {node.lineno}: row loop replaced by vectorized assignments")
+        return statements
+
+    def _loop_plan(self, node):
+        """
+        (frame name, row-access resolver) for loops we know how to rewrite.
+        """
+        it = node.iter
+        if _call_name(it) == "iterrows" and isinstance(it.func.value, ast.Name) and not it.args \
+                and isinstance(node.target, ast.Tuple) and len(node.target.elts) == 2 \
+                and all(isinstance(e, ast.Name) for e in node.target.elts):
+            frame = it.func.value.id
+            index_name, row_name = (e.id for e in node.target.elts)
+            return frame, (index_name, lambda n: _name_subscript(n, row_name) or _cell_ref(n, frame, index_name))
+        if isinstance(it, ast.Attribute) and it.attr == "index" and isinstance(it.value, ast.Name) \
+                and isinstance(node.target, ast.Name):
+            frame = it.value.id
+            index_name = node.target.id
+            return frame, (index_name, lambda n: _cell_ref(n, frame, index_name))
+        return None
+
+    def _assignment(self, stmt, frame, index_name):
+        """
+        (column, value) for `df.at[i, 'C'] = value` inside the loop, else None.
+        """
+        if not isinstance(stmt, ast.Assign) or len(stmt.targets) != 1:
+            return None
+        col = _cell_ref(stmt.targets[0], frame, index_name)
+        if col is None:
+            return None
+        return col, stmt.value
+
+    def _vectorize_body(self, body, frame, resolve, loop):
+        index_name, resolve_row = resolve
+        written = set()
+        read = set()
+        out = []
+
+        def column_target(col, mask=None):
+            target = ast.Subscript(value=ast.Name(id=frame, ctx=ast.Load()),
+                                   slice=ast.Constant(value=col), ctx=ast.Store())
+            if mask is None:
+                return target
+            return ast.Subscript(value=ast.Attribute(value=ast.Name(id=frame, ctx=ast.Load()), attr="loc",
+                                                     ctx=ast.Load()),
+                                 slice=ast.Tuple(elts=[mask, ast.Constant(value=col)], ctx=ast.Load()),
+                                 ctx=ast.Store())
+
+        def convert(expr):
+            vec = _Vectorizer(resolve_row, _frame_column(frame))
+            converted = vec.convert(expr)
+            if converted is not None:
+                read.update(vec.columns_read)
+            return converted
+
+        for stmt in body:
+            simple = self._assignment(stmt, frame, index_name)
+            if simple is not None:
+                col, value = simple
+                converted = convert(value)
+                if converted is None:
+                    return None
+                written.add(col)
+                out.append(ast.Assign(targets=[column_target(col)], value=converted))
+                continue
+
+            if isinstance(stmt, ast.If):
+                cond = convert(stmt.test)
+                branches = []
+                for branch in (stmt.body, stmt.orelse):
+                    assigns = [self._assignment(s, frame, index_name) for s in branch]
+                    if any(a is None for a in assigns):
+                        return None
+                    branches.append(assigns)
+                if cond is None or not branches[0]:
+                    return None
+                self._masks += 1
+                mask_name = f"_row_mask_{self._masks}"
+                out.append(ast.Assign(targets=[ast.Name(id=mask_name, ctx=ast.Store())], value=cond))
+                for negate, assigns in zip((False, True), branches):
+                    mask = ast.Name(id=mask_name, ctx=ast.Load())
+                    if negate:
+                        mask = ast.UnaryOp(op=ast.Invert(), operand=mask)
+                    for col, value in assigns:
+                        converted = convert(value)
+                        if converted is None:
+                            return None
+                        written.add(col)
+                        out.append(ast.Assign(targets=[column_target(col, mask)], value=converted))
+                continue
+            return None
+
+        # Row-by-row, later statements would see earlier writes one row at a time;
+        # only rewrite when no statement reads a column the loop writes
+        if not out or written & read:
+            return None
+        for stmt in out:
+            ast.copy_location(stmt, loop)
+        return out
+
+
+class CodeAnalyzer:
+    def __init__(self, max_entries=256, rewrite=True):
+        """
+        Pre-flight stage between generation and execution: compiles the
+        snippet (syntax errors never reach the executor), flags slow
+        row-by-row patterns and vectorizes the simple ones.
+
+        :param max_entries: Analyses kept in memory, keyed by snippet text
+        :param rewrite: Apply vectorizing rewrites (False = report only)
+        """
+        self.max_entries = max_entries
+        self.rewrite = rewrite
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def analyze(self, code):
+        """
+        Returns a CodeAnalysis for code. Cached, so repeated commands cost a dict lookup.
+        """
+        with self._lock:
+            if code in self._cache:
+                self._cache.move_to_end(code)
+                return self._cache[code]
+
+        analysis = self._analyze(code)
+
+        with self._lock:
+            self._cache[code] = analysis
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return analysis
+
+    def _analyze(self, code):
+        try:
+            tree = ast.parse(code)
+            compile_snippet(code)
+        except SyntaxError as e:
+            return CodeAnalysis(code, code, error=f"Syntax error on line {e.lineno}: {e.msg}")
+
+        final_code = code
+        notes = []
+        findings = find_slow_patterns(tree)
+        if self.rewrite and findings:
+            rewriter = _Rewriter()
+            new_tree = ast.fix_missing_locations(rewriter.visit(tree))
+            if rewriter.notes:
+                try:
+                    candidate = ast.unparse(new_tree)
+                    compile_snippet(candidate)
+                    final_code, notes = candidate, rewriter.notes
+                    findings = find_slow_patterns(ast.parse(candidate))
+                except (SyntaxError, ValueError):
+                    pass  # Keep the original; it compiled
+
+        return CodeAnalysis(code, final_code, compile_snippet(final_code), findings=findings, rewrites=notes)
+
+    def preflight(self, code, regenerate=None):
+        """
+        Analyzes code and, if it doesn't compile or keeps slow patterns the
+        rewriter can't fix, asks regenerate(code, feedback) for one new version.
+        Returns the CodeAnalysis of the code to run (check .error first).
+
+        :param regenerate: Callable(code, feedback) -> new code or None (e.g. LLMEngine.refine_code)
+        """
+        analysis = self.analyze(code)
+        if regenerate is None or not analysis.needs_regeneration:
+            return analysis
+
+        new_code = regenerate(analysis.original, analysis.feedback())
+        if not new_code:
+            return analysis
+        retry = self.analyze(new_code)
+        if retry.error is None and (analysis.error is not None
+                                    or len(retry.slow_findings) < len(analysis.slow_findings)):
+            return retry
+        return analysis
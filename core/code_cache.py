@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CodeCache:
+    def __init__(self, max_entries=256, ttl_seconds=7 * 24 * 3600, disk_path=None, max_disk_entries=5000):
+        """
+        Two-level cache for LLM generated code.
+
+        :param max_entries: Size of the in-memory LRU layer
+        :param ttl_seconds: Entries older than this are treated as misses (None = never expire)
+        :param disk_path: Optional SQLite file so the cache survives restarts
+        :param max_disk_entries: Size cap for the on-disk store (least recently used rows go first)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.disk_path = disk_path
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (code, created_at)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if disk_path:
+            folder = os.path.dirname(disk_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS code_cache ("
+                "key TEXT PRIMARY KEY, code TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    # --- Keys ---
+    @staticmethod
+    def normalize_prompt(user_prompt):
+        """
+        Case, whitespace and trailing punctuation don't change the meaning
+        of a spoken command ("Total sales by department." == "total sales by department").
+        """
+        text = re.sub(r"\s+", " ", user_prompt.strip().lower())
+        return text.rstrip(".!?")
+
+    @staticmethod
+    def schema_hash(columns_context):
+        """
+        Stable hash of the column list / dtypes handed to the model.
+        """
+        payload = json.dumps(columns_context, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def make_key(cls, user_prompt, columns_context, model):
+        raw = "\x00".join([model, cls.normalize_prompt(user_prompt), cls.schema_hash(columns_context)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # --- Lookup ---
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT code, created FROM code_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1]):
+                        self._db.execute("UPDATE code_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                        self._db.commit()
+                        self._remember(key, row[0], row[1])
+                        self.hits += 1
+                        return row[0]
+                    self._db.execute("DELETE FROM code_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key, code):
+        now = time.time()
+        with self._lock:
+            self._remember(key, code, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO code_cache (key, code, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, code, now, now)
+                )
+                self._db.execute(
+                    "DELETE FROM code_cache WHERE key NOT IN "
+                    "(SELECT key FROM code_cache ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_disk_entries,)
+                )
+                self._db.commit()
+
+    def _remember(self, key, code, created_at):
+        self._memory[key] = (code, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM code_cache")
+                self._db.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,202 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from core.api_client import APIError
+from core.code_analyzer import CodeAnalyzer
+from core.tracing import span
+from utils.prompt_templates import EXECUTION_ERROR_FEEDBACK
+
+
+class SolveResult:
+    def __init__(self, success, df, message, code=None, attempts=0, winner=None, rounds=0,
+                 elapsed=0.0, rewrites=None, cancelled=False, engine="pandas", estimate=None):
+        self.success = success
+        self.df = df
+        self.message = message
+        self.code = code
+        self.attempts = attempts    # Candidates that were generated and tried
+        self.winner = winner        # Index of the winning attempt (0 = the regular/cached answer)
+        self.rounds = rounds
+        self.elapsed = elapsed      # Wall time from request to committed frame
+        self.rewrites = rewrites or []
+        self.cancelled = cancelled
+        self.engine = engine        # Query engine the code was generated for
+        self.estimate = estimate    # Dry run's estimate of the winner's full run, seconds (None = no dry run)
+
+    def summary(self):
+        via = "" if self.engine == "pandas" else f" on {self.engine}"
+        if not self.success:
+            return f"{self.attempts} attempt(s) failed{via} in {self.elapsed:.2f}s"
+        text = f"candidate #{self.winner + 1} won{via} after {self.attempts} attempt(s) in {self.elapsed:.2f}s"
+        if self.estimate is not None:
+            text += f" (full run estimated at {self.estimate:.2f}s)"
+        return text
+
+
+class _Attempt:
+    def __init__(self, index, code=None, success=False, df=None, message="", error=None, rewrites=None,
+                 estimate=None):
+        self.index = index
+        self.estimate = estimate
+        self.code = code
+        self.success = success
+        self.df = df
+        self.message = message
+        self.error = error
+        self.rewrites = rewrites or []
+
+
+class CommandSolver:
+    def __init__(self, llm, executor, analyzer=None, candidates=2, max_rounds=2, alt_temperature=0.6,
+                 slow_run_seconds=5.0):
+        """
+        Turns a spoken command into a committed frame with as few voice
+        round trips as possible: several candidate programs are generated
+        concurrently, each goes through pre-flight, dry run and full run in
+        parallel, and the first one to succeed wins. If every candidate
+        fails, the failures are sent back to the model with their errors.
+
+        :param llm: LLMEngine
+        :param executor: ExcelExecutor
+        :param analyzer: CodeAnalyzer for pre-flight checks (a private one by default)
+        :param candidates: Candidates per round (1 = plain generate, then traceback retries)
+        :param max_rounds: Generation rounds; rounds after the first revise failed candidates
+        :param alt_temperature: Temperature for the alternative candidates, so they actually differ
+        :param slow_run_seconds: Full runs the dry run expects to take longer than this are announced first
+        """
+        self.llm = llm
+        self.executor = executor
+        self.analyzer = analyzer if analyzer is not None else CodeAnalyzer()
+        self.candidates = max(1, candidates)
+        self.max_rounds = max(1, max_rounds)
+        self.alt_temperature = alt_temperature
+        self.slow_run_seconds = slow_run_seconds
+        self._pool = ThreadPoolExecutor(max_workers=self.candidates, thread_name_prefix="candidate")
+
+    def solve(self, user_prompt, df, columns_context, schema_key=None, cancel_event=None, sheets=None):
+        """
+        Returns a SolveResult. df itself is never modified; the winner's
+        frame is in result.df.
+
+        :param cancel_event: threading.Event; setting it abandons every candidate
+        :param sheets: The workbook's other sheets, readable by the code as sheets['Name']
+        """
+        # Large sheets get code for the executor's columnar engine (see ExcelExecutor.engine_for)
+        engine = self.executor.engine_for(df)
+        with span("solve", candidates=self.candidates, engine=engine) as trace:
+            result = self._solve(user_prompt, df, columns_context, schema_key, cancel_event, sheets, engine)
+            trace.set(success=result.success, attempts=result.attempts, rounds=result.rounds,
+                      winner=result.winner, cancelled=result.cancelled)
+        return result
+
+    def _solve(self, user_prompt, df, columns_context, schema_key, cancel_event, sheets, engine):
+        start = time.monotonic()
+        stop = cancel_event or threading.Event()
+        attempts = 0
+        failures = []
+
+        for round_no in range(1, self.max_rounds + 1):
+            if round_no == 1:
+                cached = self.llm.cached_code(user_prompt, columns_context, schema_key, engine)
+                if cached is not None:
+                    # A cached answer already ran successfully once; no need to pay for alternatives
+                    jobs = [lambda: cached]
+                else:
+                    jobs = [lambda i=i: self._generate(i, user_prompt, columns_context, schema_key, stop, engine)
+                            for i in range(self.candidates)]
+            else:
+                # Revise the candidates that produced code, feeding back their errors
+                revisable = [f for f in failures if f.code is not None][:self.candidates]
+                if not revisable:
+                    break
+                jobs = [lambda f=f: self._revise(f, user_prompt, columns_context, schema_key, stop, engine)
+                        for f in revisable]
+            winner, failures = self._race(jobs, attempts, df, user_prompt, columns_context, schema_key, stop,
+                                          sheets, engine)
+            attempts += len(jobs)
+
+            if winner is not None:
+                stop.set()  # Abandon the candidates still streaming
+                self.llm.remember(user_prompt, winner.code, columns_context, schema_key, engine)
+                return SolveResult(True, winner.df, winner.message, winner.code, attempts, winner.index,
+                                   round_no, time.monotonic() - start, winner.rewrites, engine=engine,
+                                   estimate=winner.estimate)
+            if stop.is_set():
+                return SolveResult(False, df, "Request cancelled.", attempts=attempts, rounds=round_no,
+                                   elapsed=time.monotonic() - start, cancelled=True, engine=engine)
+
+        error = failures[0].error if failures else "No candidate produced code."
+        return SolveResult(False, df, error, attempts=attempts, rounds=round_no,
+                           elapsed=time.monotonic() - start, engine=engine)
+
+    # --- Candidates ---
+    def _generate(self, index, user_prompt, columns_context, schema_key, stop, engine=None):
+        # Candidates are only cached once they have run (see solve)
+        temperature = None if index == 0 else self.alt_temperature
+        return self.llm.generate_code(user_prompt, columns_context, schema_key=schema_key, cancel_event=stop,
+                                      temperature=temperature, use_cache=False, engine=engine)
+
+    def _revise(self, failure, user_prompt, columns_context, schema_key, stop, engine=None):
+        return self.llm.refine_code(user_prompt, columns_context, failure.code,
+                                    EXECUTION_ERROR_FEEDBACK.format(error=failure.error),
+                                    schema_key=schema_key, cancel_event=stop, engine=engine)
+
+    def _race(self, jobs, first_index, df, user_prompt, columns_context, schema_key, stop, sheets=None,
+              engine=None):
+        """
+        Runs every job through generate -> pre-flight -> dry run -> full run.
+        Returns (first successful _Attempt or None, failed attempts in index order).
+        Attempts are numbered from first_index so indexes stay unique across rounds.
+        """
+        # Each candidate runs in a copy of the caller's context so its spans nest under "solve"
+        pending = {self._pool.submit(contextvars.copy_context().run, self._attempt, i, job, df, user_prompt,
+                                     columns_context, schema_key, stop, sheets, engine)
+                   for i, job in enumerate(jobs, start=first_index)}
+        failures = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = future.result()
+                if attempt.success:
+                    return attempt, failures
+                failures.append(attempt)
+        failures.sort(key=lambda a: a.index)
+        return None, failures
+
+    def _attempt(self, index, job, df, user_prompt, columns_context, schema_key, stop, sheets=None, engine=None):
+        try:
+            code = job()
+        except APIError as e:
+            return _Attempt(index, error=f"LLM request failed: {e}")
+        if code is None or stop.is_set():
+            return _Attempt(index, error="Request cancelled.")
+
+        def regenerate(bad_code, feedback):
+            try:
+                return self.llm.refine_code(user_prompt, columns_context, bad_code, feedback,
+                                            schema_key=schema_key, cancel_event=stop, engine=engine)
+            except APIError:
+                return None
+
+        analysis = self.analyzer.preflight(code, regenerate)
+        if analysis.error:
+            return _Attempt(index, code, error=analysis.error)
+        code = analysis.code
+
+        valid, message, estimate = self.executor.validate_code(df, code, sheets, engine)
+        if not valid:
+            return _Attempt(index, code, error=message)
+        if stop.is_set():
+            return _Attempt(index, code, error="Request cancelled.")
+        if estimate is not None and estimate > self.slow_run_seconds:
+            print(f"⏳ Candidate #{index + 1}: full run on {len(df):,} rows estimated at ~{estimate:.0f}s.")
+
+        success, new_df, message = self.executor.execute_code(df, code, sheets, engine)
+        if not success:
+            return _Attempt(index, code, error=message, estimate=estimate)
+        return _Attempt(index, code, True, new_df, message, rewrites=analysis.rewrites, estimate=estimate)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,131 @@
+import ast
+import pandas as pd
+
+# In-place methods that only reorder / relabel, so column statistics stay valid
+_STATS_PRESERVING_METHODS = {"sort_values", "sort_index", "rename", "drop", "reset_index", "set_index"}
+
+
+class ContextManager:
+    def __init__(self, max_tokens=800, sample_values=3):
+        """
+        Builds and caches a per-column profile of the sheet that is rendered
+        into the LLM system prompt (Module C in the design doc).
+
+        :param max_tokens: Approximate token budget for the rendered summary
+        :param sample_values: Distinct example values shown per column
+        """
+        self.max_tokens = max_tokens
+        self.sample_values = sample_values
+        self._profiles = {}
+        self._row_count = None
+
+    # --- Profiling ---
+    def profile_column(self, series):
+        non_null = series.dropna()
+        profile = {
+            "dtype": str(series.dtype),
+            "nulls": int(len(series) - len(non_null)),
+            "unique": int(non_null.nunique()),
+            "samples": [str(v) for v in non_null.drop_duplicates().head(self.sample_values)],
+        }
+        if len(non_null) and (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)) \
+                and not pd.api.types.is_bool_dtype(series):
+            profile["min"] = str(non_null.min())
+            profile["max"] = str(non_null.max())
+        return profile
+
+    def invalidate(self, columns=None):
+        """
+        Drops cached profiles. None means everything (new file, unknown edit).
+        """
+        if columns is None:
+            self._profiles.clear()
+            self._row_count = None
+        else:
+            for col in columns:
+                self._profiles.pop(col, None)
+
+    def refresh(self, df):
+        """
+        Recomputes only what is missing or stale: new columns, columns whose
+        dtype changed, and everything when the row count changed.
+        """
+        if self._row_count != len(df):
+            self._profiles.clear()
+            self._row_count = len(df)
+
+        for col in list(self._profiles):
+            if col not in df.columns or self._profiles[col]["dtype"] != str(df[col].dtype):
+                del self._profiles[col]
+
+        for col in df.columns:
+            if col not in self._profiles:
+                self._profiles[col] = self.profile_column(df[col])
+        return self._profiles
+
+    # --- Rendering ---
+    def get_spreadsheet_summary(self, df):
+        """
+        Compact, token-budgeted description of the sheet for the system prompt.
+        """
+        profiles = self.refresh(df)
+        header = f"{len(df)} rows x {len(df.columns)} columns."
+        budget_chars = self.max_tokens * 4  # ~4 characters per token
+
+        for with_samples in (True, False):
+            lines = [header]
+            used = len(header)
+            for i, col in enumerate(df.columns):
+                line = self._render_column(col, profiles[col], with_samples)
+                if used + len(line) > budget_chars:
+                    lines.append(f"... and {len(df.columns) - i} more columns: {list(df.columns[i:])}")
+                    break
+                lines.append(line)
+                used += len(line) + 1
+            else:
+                return "\n".join(lines)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _render_column(col, profile, with_samples):
+        parts = [f"- {col!r}: {profile['dtype']}", f"nulls={profile['nulls']}", f"unique={profile['unique']}"]
+        if "min" in profile:
+            parts.append(f"range=[{profile['min']} .. {profile['max']}]")
+        if with_samples and profile["samples"]:
+            parts.append(f"e.g. {', '.join(profile['samples'])}")
+        return ", ".join(parts)
+
+    @staticmethod
+    def schema_key(df):
+        """
+        Column names + dtypes only; used for the code cache so data edits
+        don't invalidate cached code.
+        """
+        return {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+    @staticmethod
+    def touched_columns(code, columns):
+        """
+        Best-effort static guess of which columns a snippet modifies.
+        Returns None when the whole frame may have changed.
+        """
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+
+        names = {str(c) for c in columns}
+        touched = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value in names:
+                touched.add(node.value)
+            # df = ... may replace every column
+            elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "df" for t in node.targets):
+                return None
+            # df.fillna(..., inplace=True) and friends rewrite values without naming a column
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                    and isinstance(node.func.value, ast.Name) and node.func.value.id == "df" \
+                    and node.func.attr not in _STATS_PRESERVING_METHODS \
+                    and any(k.arg == "inplace" for k in node.keywords):
+                return None
+        return touched
@@ -1,71 +1,575 @@
 import pandas as pd
+import numpy as np
 import io
+import os
+import time
+import threading
+import shutil
+import warnings
 import contextlib
+from collections.abc import Mapping
+from core.frame_cache import FrameCache
+from core.code_analyzer import compile_snippet, referenced_sheets
+from core.tracing import span
+from core.query_engines import get_engine
+from utils.code_executor import lookup_failure
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# pandas >= 3 is always Copy-on-Write; on 2.x it is opt-in (see enable_copy_on_write)
+COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+
+
+def enable_copy_on_write():
+    """
+    Opts pandas 2.x into Copy-on-Write (pandas 3 always has it). Entry
+    points call this at startup: without it every snapshot_frame, and so
+    every undo step in the VersionStore, is a full deep copy.
+    """
+    global COPY_ON_WRITE
+    if not COPY_ON_WRITE:
+        pd.set_option("mode.copy_on_write", True)
+        COPY_ON_WRITE = True
+
+
+def _dedup_columns(header):
+    """
+    Column names for a header row [name or None], as pd.read_excel makes
+    them: blanks become "Unnamed: i" and repeats X.1, X.2 ..., skipping
+    suffixes the header already uses.
+    """
+    names = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+    original = set(names)
+    counts = {}
+    # Like pandas, named columns claim their suffixes before the unnamed ones
+    order = [i for i, name in enumerate(header) if name is not None] + \
+            [i for i, name in enumerate(header) if name is None]
+    for i in order:
+        name = base = names[i]
+        count = counts.get(base, 0)
+        while count > 0:
+            counts[base] = count + 1
+            name = f"{base}.{count}"
+            count = count + 1 if name in original else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def snapshot_frame(df):
+    """
+    Frozen view of df that later in-place edits can't reach. Under
+    Copy-on-Write this is a cheap shallow copy; otherwise a deep copy.
+    """
+    return df.copy(deep=not COPY_ON_WRITE)
+
+
+class SheetInfo:
+    def __init__(self, name, rows, cols, columns=None):
+        self.name = name
+        self.rows = rows  # From the sheet's stored dimension; None when the file doesn't record it
+        self.cols = cols
+        self.columns = columns  # Header row, when list_sheets was asked for it
+
+    def describe(self):
+        text = self.name
+        if self.rows is not None:
+            text += f" ({max(self.rows - 1, 0):,} rows x {self.cols} cols)"
+        if self.columns:
+            text += f": {self.columns}"
+        return text
+
+
+class LazySheets(Mapping):
+    """
+    The other sheets of a workbook, loaded on first access. Generated code
+    sees them as sheets['Name']; only the names a snippet references are
+    ever loaded.
+    """
+    def __init__(self, loader, infos):
+        """
+        :param loader: Callable(sheet name) -> DataFrame (raises on failure)
+        :param infos: [SheetInfo] of the sheets on offer
+        """
+        self.loader = loader
+        self.infos = {info.name: info for info in infos}
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        if name not in self.infos:
+            raise KeyError(name)
+        with self._lock:
+            if name not in self._frames:
+                self._frames[name] = self.loader(name)
+            return self._frames[name]
+
+    def __iter__(self):
+        return iter(self.infos)
+
+    def __len__(self):
+        return len(self.infos)
+
+    def loaded(self):
+        return list(self._frames)
+
+    def describe(self):
+        return "\n".join(f"- {info.describe()}" for info in self.infos.values())
 
 class ExcelExecutor:
-    def __init__(self):
-        pass
+    def __init__(self, date_sample_size=200, date_threshold=0.5, frame_cache=None, sandbox=None,
+                 dry_run_rows=2000, dry_run_min_rows=20000, stream_rows=200_000, chunk_rows=50_000,
+                 query_engine=None, engine_min_rows=500_000):
+        """
+        :param date_sample_size: Values sampled per column to decide whether it holds dates
+        :param date_threshold: Share of non-empty values that must parse for a column to count as dates
+        :param frame_cache: FrameCache for columnar sidecars (defaults to one next to each workbook)
+        :param sandbox: utils.code_executor.SandboxExecutor to run code out of process (None = in-process exec)
+        :param dry_run_rows: Size of the stratified sample used by validate_code
+        :param dry_run_min_rows: Sheets smaller than this skip the dry run (the full run is already cheap)
+        :param stream_rows: Sheets with more rows than this are read in chunks instead of in one go
+        :param chunk_rows: Rows per chunk when streaming
+        :param query_engine: "duckdb" or "polars" to generate and run code for a multi-threaded
+            columnar engine on large sheets (None = pandas only); see core.query_engines
+        :param engine_min_rows: Sheets with fewer rows stay on pandas (the engine's setup isn't worth it)
+        """
+        if query_engine is not None:
+            try:
+                get_engine(query_engine)
+            except ImportError as e:
+                print(f"⚠️ {e}; using pandas.")
+                query_engine = None
+        self.query_engine = query_engine
+        self.engine_min_rows = engine_min_rows
+        self.stream_rows = stream_rows
+        self.chunk_rows = chunk_rows
+        self.sandbox = sandbox
+        self.dry_run_rows = dry_run_rows
+        self.dry_run_min_rows = dry_run_min_rows
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache()
+        self.date_sample_size = date_sample_size
+        self.date_threshold = date_threshold
+        # Inferred {column: format} per file fingerprint, so reloads skip detection
+        self._date_schema_cache = {}
+        # redirect_stdout swaps the process-wide sys.stdout, so in-process runs take turns
+        self._exec_lock = threading.Lock()
+
+    @staticmethod
+    def file_fingerprint(filepath):
+        stat = os.stat(filepath)
+        return (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
 
-    def load_sheet(self, filepath):
+    def infer_date_format(self, series):
+        """
+        Phase 1: decides on a small random sample whether the column holds
+        dates and, if so, which single format string parses them. Every
+        format guessed from the sample (month-first and day-first) is scored
+        by how many sample values it parses; when none parses them all (e.g.
+        03/04/2023 next to 25/04/2023) the per-value "mixed" parse is used
+        instead, so no dates are lost to a wrong format.
+        Returns the format, or None for non-date columns.
         """
-        Loads the Excel file and robustly converts date columns.
+        non_empty = series.dropna()
+        if non_empty.empty:
+            return None
+        sample = non_empty.sample(min(len(non_empty), self.date_sample_size), random_state=0)
+
+        # Excel date cells already arrive as datetime objects
+        if pd.api.types.infer_dtype(sample, skipna=True) in ("datetime", "datetime64", "date"):
+            return "ISO8601"
+
+        text = sample.astype(str)
+        # pandas warns about day-first/month-first ambiguity on every guess and parse
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            # Guessing is slow, so a few values propose formats and the whole sample scores them;
+            # month-first guesses go first, so ties keep pandas' default reading
+            values = text.unique()[:20]
+            candidates = dict.fromkeys(guess_datetime_format(v) for v in values)
+            candidates.update(dict.fromkeys(guess_datetime_format(v, dayfirst=True) for v in values))
+            candidates.pop(None, None)
+            if not candidates:
+                return None
+            scores = {fmt: pd.to_datetime(text, format=fmt, errors="coerce").notna().mean() for fmt in candidates}
+            fmt = max(scores, key=scores.get)
+            score = scores[fmt]
+            if score < 1.0:
+                mixed = pd.to_datetime(text, format="mixed", errors="coerce").notna().mean()
+                if mixed > score:
+                    fmt, score = "mixed", mixed
+
+        if score > self.date_threshold:
+            return fmt
+        return None
+
+    def detect_date_columns(self, df):
+        """
+        Returns {column: format} for every text column that looks like dates.
+        """
+        schema = {}
+        for col in df.columns:
+            # 1. Skip if already datetime or numeric
+            if pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            fmt = self.infer_date_format(df[col])
+            if fmt:
+                schema[col] = fmt
+        return schema
+
+    # --- Workbook structure ---
+    def list_sheets(self, filepath, headers=False):
+        """
+        [SheetInfo] for every sheet, in workbook order. Uses openpyxl's
+        read-only mode, which reads the workbook index and each sheet's
+        stored dimension without parsing any cells.
+
+        :param headers: Also read each sheet's first row (its column names)
+        """
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(filepath, read_only=True)
+        try:
+            infos = []
+            for ws in workbook.worksheets:
+                rows, cols = ws.max_row, ws.max_column
+                columns = None
+                if headers:
+                    first = next(ws.iter_rows(max_row=1, values_only=True), ())
+                    columns = [c for c in first if c is not None]
+                infos.append(SheetInfo(ws.title, rows, cols, columns))
+            return infos
+        finally:
+            workbook.close()
+
+    def iter_sheet_chunks(self, filepath, sheet=None, chunk_rows=None):
+        """
+        Yields a sheet as DataFrames of up to chunk_rows rows (header taken
+        from the first row, named like pd.read_excel names it). The generator
+        itself holds one chunk of raw cell values at a time; callers that
+        keep the chunks hold them all. No date conversion; see load_sheet.
+        """
+        from openpyxl import load_workbook
+
+        chunk_rows = chunk_rows or self.chunk_rows
+        workbook = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            ws = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = _dedup_columns(header)
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunk_rows:
+                    yield pd.DataFrame.from_records(batch, columns=columns)
+                    batch = []
+            if batch:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+        finally:
+            workbook.close()
+
+    def _read_sheet(self, filepath, sheet):
+        """
+        Reads one sheet in full. Sheets larger than stream_rows are built
+        from chunks, so only one chunk of cells is ever held as Python
+        objects. The typed chunks are kept until the final concat, so peak
+        memory is about twice the typed frame.
+        """
+        rows = None
+        if self.stream_rows and filepath.endswith((".xlsx", ".xlsm")):
+            infos = self.list_sheets(filepath)
+            info = next((i for i in infos if i.name == sheet), None) if sheet is not None else infos[0]
+            rows = info.rows if info is not None else None
+        if rows is not None and rows > self.stream_rows:
+            chunks = list(self.iter_sheet_chunks(filepath, sheet))
+            return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        return pd.read_excel(filepath, sheet_name=sheet if sheet is not None else 0)
+
+    def load_sheet(self, filepath, sheet=None):
+        """
+        Loads one sheet (the first when sheet is None) and robustly converts date columns.
         This fixes the '.dt accessor' error by forcing text dates into real datetime objects.
+        Detection runs on a sample; only date columns are converted in full,
+        with an explicit format (no slow per-element guessing).
+        Other sheets of the workbook are not read.
         """
+        with span("load", file=os.path.basename(filepath), sheet=sheet) as trace:
+            success, df, message = self._load_sheet(filepath, sheet, trace)
+            if success:
+                trace.set(rows=len(df), cols=df.shape[1])
+        return success, df, message
+
+    def _load_sheet(self, filepath, sheet, trace):
         try:
-            df = pd.read_excel(filepath)
-            
-            # --- Robust Date Detection ---
-            for col in df.columns:
-                # 1. Skip if already datetime or numeric
-                if pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_numeric_dtype(df[col]):
-                    continue
-                
-                # 2. Try converting with 'coerce' (turns bad values into NaT)
-                try:
-                    # 'dayfirst' helps with international dates, but isn't strictly necessary if ISO
-                    converted_col = pd.to_datetime(df[col], errors='coerce')
-                    
-                    # 3. CHECK: Is this actually a date column?
-                    # logic: If conversion worked for >50% of the non-empty rows, it's a date column.
-                    non_na_count = converted_col.notna().sum()
-                    original_count = df[col].notna().sum()
-                    
-                    if original_count > 0 and (non_na_count / original_count) > 0.5:
-                        df[col] = converted_col
-                        
-                except Exception:
+            # Warm path: memory-mapped sidecar of an unchanged workbook
+            cached_df = self.frame_cache.load(filepath, sheet)
+            trace.set(cached=cached_df is not None)
+            if cached_df is not None:
+                return True, cached_df, "Spreadsheet loaded from cache."
+
+            df = self._read_sheet(filepath, sheet)
+
+            # --- Robust Date Detection (cached per file and sheet) ---
+            key = (self.file_fingerprint(filepath), sheet)
+            schema = self._date_schema_cache.get(key)
+            if schema is None:
+                schema = self.detect_date_columns(df)
+                self._date_schema_cache[key] = schema
+
+            # Phase 2: full conversion of the columns that passed
+            for col, fmt in schema.items():
+                if col not in df.columns:
                     continue
-            
+                converted_col = pd.to_datetime(df[col], format=fmt, errors='coerce')
+
+                # CHECK: the sample can be unlucky, so confirm on the full column
+                non_na_count = converted_col.notna().sum()
+                original_count = df[col].notna().sum()
+                if original_count > 0 and (non_na_count / original_count) > self.date_threshold:
+                    df[col] = converted_col
+
+            self.frame_cache.store(filepath, df, sheet)
             return True, df, "Spreadsheet loaded and dates processed."
         except Exception as e:
             return False, None, f"Error loading file: {e}"
 
-    def execute_code(self, df, code_snippet):
+    def engine_for(self, df):
+        """
+        Name of the query engine commands on df should target.
+        """
+        if self.query_engine is not None and len(df) >= self.engine_min_rows:
+            return self.query_engine
+        return "pandas"
+
+    def execute_code(self, df, code_snippet, sheets=None, engine=None):
         """
         Safely executes code and captures print() output for the UI.
+        With a sandbox configured, the code runs in a worker process under
+        time and memory limits and the caller's df is left untouched.
+
+        :param sheets: Mapping of the workbook's other sheets (e.g. LazySheets);
+            the snippet reads them as sheets['Name']
+        :param engine: Query engine the snippet was written for (None = pandas)
+        """
+        with span("execute", rows_in=len(df), cols_in=df.shape[1], sandbox=self.sandbox is not None,
+                  engine=engine or "pandas") as trace:
+            success, new_df, message = self._run_code(df, code_snippet, sheets, engine)
+            trace.set(success=success, rows_out=len(new_df), cols_out=new_df.shape[1])
+        return success, new_df, message
+
+    @staticmethod
+    def _resolve_sheets(code_snippet, sheets):
+        """
+        {name: DataFrame} of the sheets the snippet actually reads. Only
+        those are loaded (and shipped to a sandbox worker); every sheet when
+        the names can't be worked out from the code.
+        """
+        if sheets is None:
+            return None
+        try:
+            names = referenced_sheets(code_snippet)
+        except SyntaxError:
+            return {}
+        if names is None:
+            names = list(sheets)
+        return {name: sheets[name] for name in names if name in sheets}
+
+    def _run_code(self, df, code_snippet, sheets=None, engine=None):
+        success, new_df, message, _ = self._run_code_detailed(df, code_snippet, sheets, engine)
+        return success, new_df, message
+
+    def _run_code_detailed(self, df, code_snippet, sheets=None, engine=None):
+        """
+        _run_code plus lookup_failure() of the error (None on success or other errors).
         """
-        local_vars = {'df': df, 'pd': pd}
+        try:
+            extra = self._resolve_sheets(code_snippet, sheets)
+        except Exception as e:
+            return False, df, f"Error loading sheet: {e}", None
+
+        if self.sandbox is not None:
+            result = self.sandbox.run(df, code_snippet, sheets=extra, engine=engine)
+            if not result.success:
+                return False, df, result.error, result.lookup
+            captured_output = result.stdout.strip()
+            return True, result.df, captured_output if captured_output else "Execution successful.", None
+
+        # The snippet edits a copy-on-write snapshot, never the caller's frame
+        local_vars = {'df': snapshot_frame(df), 'pd': pd}
+        if extra is not None:
+            local_vars['sheets'] = {name: snapshot_frame(frame) for name, frame in extra.items()}
         output_buffer = io.StringIO()
+        namespace = {}
         
         try:
-            with contextlib.redirect_stdout(output_buffer):
-                exec(code_snippet, {}, local_vars)
+            query_engine = get_engine(engine)
+            namespace = query_engine.namespace(local_vars['df'])
+            local_vars.update(namespace)
+            with self._exec_lock, contextlib.redirect_stdout(output_buffer):
+                exec(compile_snippet(code_snippet), {}, local_vars)
+                # Engine results (relations, lazy frames) only become pandas here, once
+                result = query_engine.to_pandas(local_vars['df']) if 'df' in local_vars else None
             
             captured_output = output_buffer.getvalue().strip()
             
-            if 'df' in local_vars:
+            if isinstance(result, pd.DataFrame):
                 # Return the printed answer if available, otherwise just success message
                 message = captured_output if captured_output else "Execution successful."
-                return True, local_vars['df'], message
+                return True, result, message, None
             else:
-                return False, df, "Error: The code deleted the 'df' variable."
+                return False, df, "Error: The code deleted the 'df' variable.", None
                 
         except Exception as e:
-            return False, df, f"Python Error: {e}"
+            return False, df, f"Python Error: {e}", lookup_failure(e)
+        finally:
+            if namespace:
+                query_engine.close(namespace)
+
+    # --- Dry Run ---
+    def stratified_sample(self, df, rows=None):
+        """
+        Small slice of df (same columns and dtypes) that still contains the
+        awkward rows: the first rows, a null of every column that has one,
+        each numeric/date column's extremes and one row per category of
+        low-cardinality columns. Random rows fill the rest.
+        """
+        rows = rows or self.dry_run_rows
+        if len(df) <= rows:
+            return df
+        per_column = max(2, rows // (2 * max(len(df.columns), 1)))
+        picks = [np.arange(min(20, len(df)))]
+
+        for i in range(df.shape[1]):
+            series = df.iloc[:, i]
+            nulls = series.isna().to_numpy()
+            if nulls.any():
+                picks.append(np.flatnonzero(nulls)[:1])
+                if nulls.all():
+                    continue
+            if (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)) \
+                    and not pd.api.types.is_bool_dtype(series):
+                picks.append(np.array([series.argmin(skipna=True), series.argmax(skipna=True)]))
+            elif series.iloc[:rows].nunique() <= per_column:
+                # Cheap cardinality check on the first rows before factorizing the whole column
+                codes, uniques = pd.factorize(series)
+                if len(uniques) <= per_column:
+                    # Codes are numbered in order of appearance, so the running
+                    # maximum steps up exactly at each category's first row
+                    running = np.maximum.accumulate(codes)
+                    picks.append(np.flatnonzero(np.diff(running, prepend=-1) > 0))
+
+        chosen = np.unique(np.concatenate(picks))
+        missing = rows - len(chosen)
+        if missing > 0:
+            rng = np.random.default_rng(0)
+            chosen = np.union1d(chosen, rng.choice(len(df), size=missing, replace=False))
+        return df.iloc[chosen]
+
+    def validate_code(self, df, code_snippet, sheets=None, engine=None):
+        """
+        Dry-runs the snippet on a stratified sample so column typos and
+        dtype errors fail in milliseconds instead of after a full pass.
+        Returns (success, message, estimated_seconds); the estimate for the
+        full frame is extrapolated from two sample sizes (None when skipped).
+        """
+        if len(df) < self.dry_run_min_rows:
+            return True, "Dry run skipped (small sheet).", None
+
+        with span("dry_run", rows=len(df)) as trace:
+            sample = self.stratified_sample(df)
+            timings = []
+            # A quarter first: most errors surface there at a quarter of the cost.
+            # _run_code, not execute_code: sample runs stay out of the "execute" stage stats
+            for part in (sample.iloc[::4], sample):
+                start = time.perf_counter()
+                success, _, message, lookup = self._run_code_detailed(part, code_snippet, sheets, engine)
+                timings.append((len(part), time.perf_counter() - start))
+                if not success and self._sample_lacks_rows(df, lookup):
+                    # e.g. df.iloc[4999] or df.loc[12345]: fine on the sheet, not on a sample of it
+                    trace.set(success=True, sample_rows=len(part), inconclusive=True)
+                    return True, f"Dry run inconclusive (row lookup outside the sample: {message}).", None
+                if not success:
+                    trace.set(success=False, sample_rows=len(part))
+                    return False, f"Dry run on {len(part):,} sample rows failed: {message}", None
+            trace.set(success=True, sample_rows=len(sample))
+
+        (n_small, t_small), (n_sample, t_sample) = timings
+        per_row = max(t_sample - t_small, 0.0) / max(n_sample - n_small, 1)
+        estimate = t_sample + per_row * (len(df) - n_sample)
+        return True, f"Dry run passed on {n_sample:,} sample rows (full run ~{estimate:.2f}s).", estimate
 
-    def save_file(self, df, filepath):
+    @staticmethod
+    def _sample_lacks_rows(df, lookup):
+        """
+        Whether a dry-run failure may only be down to the sample: any
+        positional IndexError, or a KeyError for a row label the full frame
+        has (a missing column is a real error either way).
+        """
+        if lookup is None:
+            return False
+        kind, key = lookup
+        if kind == "IndexError":
+            return True
         try:
-            df.to_excel(filepath, index=False)
+            return key is not None and key not in df.columns and key in df.index
+        except TypeError:
+            return False
+
+    def save_file(self, df, filepath, sheet=None):
+        """
+        Writes one sheet (the first when sheet is None) and keeps every
+        other sheet of the workbook. See save_sheets.
+        """
+        return self.save_sheets(filepath, {sheet: df})
+
+    def save_sheets(self, filepath, frames):
+        """
+        Writes {sheet name: df} (None = the first sheet) to a temp file next
+        to the target and renames it over the original, so a crash
+        mid-write never leaves a corrupt workbook. Sheets not in frames are
+        carried over as they are instead of being re-serialized from pandas.
+        """
+        folder, name = os.path.split(os.path.abspath(filepath))
+        tmp_path = os.path.join(folder, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp.xlsx")
+        try:
+            existing = [info.name for info in self.list_sheets(filepath)] if os.path.exists(filepath) else []
+            first = existing[0] if existing else "Sheet1"
+            named = {(sheet if sheet is not None else first): df for sheet, df in frames.items()}
+            untouched = [s for s in existing if s not in named]
+            # Sidecars of untouched sheets stay valid; note which ones match the file before it changes
+            carried = [s for s in untouched if self.frame_cache.is_current(filepath, s)]
+            if first in untouched and self.frame_cache.is_current(filepath, None):
+                carried.append(None)
+
+            with span("save", file=name, sheets=len(named), kept_sheets=len(untouched),
+                      rows=sum(len(df) for df in named.values())) as trace:
+                if untouched:
+                    # Replace only the changed sheets (positions and the other tabs are preserved)
+                    shutil.copy2(filepath, tmp_path)
+                    with pd.ExcelWriter(tmp_path, engine="openpyxl", mode="a", if_sheet_exists="replace") as writer:
+                        for sheet_name, df in named.items():
+                            df.to_excel(writer, sheet_name=sheet_name, index=False)
+                else:
+                    order = [s for s in existing if s in named] + [s for s in named if s not in existing]
+                    with pd.ExcelWriter(tmp_path, engine="openpyxl") as writer:
+                        for sheet_name in order:
+                            named[sheet_name].to_excel(writer, sheet_name=sheet_name, index=False)
+                trace.set(file_bytes=os.path.getsize(tmp_path))
+                os.replace(tmp_path, filepath)
+
+                # Keep the sidecars in step so the next load stays warm
+                for sheet_name, df in named.items():
+                    self.frame_cache.store(filepath, df, sheet_name)
+                    if sheet_name == first:
+                        self.frame_cache.store(filepath, df)
+                self.frame_cache.restamp(filepath, carried)
             return True, "File saved successfully."
         except Exception as e:
-            return False, f"Error saving file: {e}"
\ No newline at end of file
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False, f"Error saving file: {e}"
@@ -0,0 +1,150 @@
+import os
+import json
+import hashlib
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+CACHE_VERSION = 1
+
+
+class FrameCache:
+    def __init__(self, cache_dir=None):
+        """
+        Arrow/Feather sidecar cache for parsed workbooks. A sidecar holds the
+        frame after date detection and is memory-mapped on later loads, so
+        the XLSX XML is only parsed again when the file itself changes.
+
+        :param cache_dir: Where sidecars live (defaults to .xcelord_cache next to each workbook)
+        """
+        self.cache_dir = cache_dir
+        self.enabled = feather is not None
+
+    # --- Fingerprints ---
+    @staticmethod
+    def content_hash(filepath, chunk_size=1 << 20):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _paths(self, filepath, sheet=None):
+        filepath = os.path.abspath(filepath)
+        folder = self.cache_dir or os.path.join(os.path.dirname(filepath), ".xcelord_cache")
+        key = hashlib.sha1(f"{filepath}\x00{sheet}".encode("utf-8")).hexdigest()[:12]
+        base = os.path.join(folder, f"{os.path.basename(filepath)}.{key}")
+        return folder, base + ".feather", base + ".json"
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path, meta):
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    # --- Public API ---
+    def load(self, filepath, sheet=None):
+        """
+        Returns the cached DataFrame if the workbook is unchanged, else None.
+        mtime+size matching is trusted; if only the mtime moved (touch, copy)
+        the content hash decides.
+        """
+        if not self.is_current(filepath, sheet):
+            return None
+        _, data_path, _ = self._paths(filepath, sheet)
+        try:
+            table = feather.read_table(data_path, memory_map=True)
+            return table.to_pandas()
+        except Exception as e:
+            logging.info(f"Sidecar unreadable, falling back to XLSX: {e}")
+            return None
+
+    def is_current(self, filepath, sheet=None):
+        """
+        True when a sidecar exists and matches the workbook as it is now.
+        """
+        if not self.enabled:
+            return False
+        _, data_path, meta_path = self._paths(filepath, sheet)
+        meta = self._read_meta(meta_path)
+        if not meta or meta.get("version") != CACHE_VERSION or not os.path.exists(data_path):
+            return False
+
+        stat = os.stat(filepath)
+        if stat.st_size != meta["size"]:
+            return False
+        if stat.st_mtime_ns != meta["mtime_ns"]:
+            if self.content_hash(filepath) != meta["hash"]:
+                return False
+            meta["mtime_ns"] = stat.st_mtime_ns
+            self._write_meta(meta_path, meta)
+        return True
+
+    def restamp(self, filepath, sheets):
+        """
+        Re-validates the sidecars of sheets after a save that rewrote other
+        sheets only (the file hash is computed once for all of them). Pass
+        only sheets whose sidecars were current before that save.
+        """
+        if not self.enabled or not sheets:
+            return
+        stat = os.stat(filepath)
+        meta = {
+            "version": CACHE_VERSION,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": self.content_hash(filepath),
+        }
+        for sheet in sheets:
+            _, data_path, meta_path = self._paths(filepath, sheet)
+            if os.path.exists(data_path):
+                self._write_meta(meta_path, meta)
+
+    def store(self, filepath, df, sheet=None):
+        """
+        Writes the sidecar for the current state of filepath. Frames Arrow
+        can't represent (mixed-type object columns, ...) are skipped.
+        """
+        if not self.enabled:
+            return False
+        # Arrow needs string headers; renaming would change the frame on reload
+        if not all(isinstance(col, str) for col in df.columns):
+            return False
+        folder, data_path, meta_path = self._paths(filepath, sheet)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # Uncompressed so the file can be memory-mapped without decoding
+            tmp = data_path + ".tmp"
+            feather.write_feather(table, tmp, compression="uncompressed")
+            os.replace(tmp, data_path)
+
+            stat = os.stat(filepath)
+            self._write_meta(meta_path, {
+                "version": CACHE_VERSION,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": self.content_hash(filepath),
+            })
+            return True
+        except Exception as e:
+            logging.info(f"Sidecar not written for {filepath}: {e}")
+            return False
+
+    def invalidate(self, filepath, sheet=None):
+        _, data_path, meta_path = self._paths(filepath, sheet)
+        for path in (data_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,151 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from core.excel_ops import snapshot_frame
+
+ROW_ID = "__row__"  # Hidden grid column: the row's position in the full frame
+
+
+class GridPage:
+    def __init__(self, frame, page, pages, total_rows, positions):
+        self.frame = frame            # What is sent to the browser (page rows + ROW_ID)
+        self.page = page              # 0-based, clamped to the valid range
+        self.pages = pages
+        self.total_rows = total_rows  # Rows left after filtering
+        self.positions = positions    # Positions of the page rows in the full frame
+
+
+class GridView:
+    def __init__(self, max_views=8):
+        """
+        Server-side paging, sorting and filtering for the grid. Only the
+        visible page is serialized and sent to the browser; the sorted and
+        filtered row order is computed once per frame and view settings and
+        reused while the user pages through it.
+
+        :param max_views: Row orders kept per frame (different sort/filter combinations)
+        """
+        self.max_views = max_views
+        self._df = None
+        self._views = OrderedDict()
+
+    def positions(self, df, sort_by=None, ascending=True, filter_column=None, filter_text=""):
+        """
+        Row positions of df after filtering and sorting (cached).
+        """
+        if df is not self._df:
+            # New frame (command, undo, edit): every cached order is stale
+            self._df = df
+            self._views.clear()
+        key = (sort_by, ascending, filter_column, filter_text)
+        if key in self._views:
+            self._views.move_to_end(key)
+            return self._views[key]
+
+        positions = np.arange(len(df))
+        if filter_column in df.columns and filter_text:
+            # Case-insensitive "contains" on the displayed text, like the grid's own quick filter
+            text = df[filter_column].astype(str)
+            positions = np.flatnonzero(text.str.contains(filter_text, case=False, regex=False, na=False).to_numpy())
+        if sort_by in df.columns:
+            column = df[sort_by].iloc[positions].reset_index(drop=True)
+            order = column.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+            positions = positions[order]
+
+        self._views[key] = positions
+        if len(self._views) > self.max_views:
+            self._views.popitem(last=False)
+        return positions
+
+    def page(self, df, page=0, page_size=50, **view):
+        """
+        Returns the GridPage to display. view takes the positions() options.
+        """
+        positions = self.positions(df, **view)
+        pages = max(1, math.ceil(len(positions) / page_size))
+        page = min(max(page, 0), pages - 1)
+        chunk = positions[page * page_size:(page + 1) * page_size]
+        frame = df.iloc[chunk].reset_index(drop=True)
+        frame.insert(0, ROW_ID, chunk)
+        return GridPage(frame, page, pages, len(positions), chunk)
+
+
+# --- Cell edits ---
+def _coerce(values, dtype):
+    """
+    Brings grid values (JSON round trip: dates as text, ints as floats)
+    back to the column's dtype so unchanged cells compare equal. Values
+    that don't convert (text typed into a number column) are kept as typed.
+    """
+    values = pd.Series(values).reset_index(drop=True)
+    try:
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            converted = pd.to_datetime(values, errors="coerce", format="mixed")
+        elif pd.api.types.is_bool_dtype(dtype):
+            return values.astype(dtype)
+        elif pd.api.types.is_numeric_dtype(dtype):
+            converted = pd.to_numeric(values, errors="coerce")
+        else:
+            return values.astype(dtype)
+    except (TypeError, ValueError):
+        return values
+
+    rejected = converted.isna() & values.notna()
+    if rejected.any():
+        return converted.astype(object).where(~rejected, values)
+    if not converted.isna().any():
+        try:
+            return converted.astype(dtype)
+        except (TypeError, ValueError):
+            pass
+    return converted
+
+
+def diff_page(sent, returned):
+    """
+    Cell-level differences between the page that was sent and what the
+    grid sent back. Returns [(row position, column, new value)].
+    """
+    if returned is None or ROW_ID not in returned.columns or len(returned) != len(sent):
+        return []
+    returned = returned.astype({ROW_ID: "int64"}).set_index(ROW_ID)
+    if not np.array_equal(np.sort(returned.index.to_numpy()), np.sort(sent[ROW_ID].to_numpy())):
+        return []  # A stale grid state from another page or an older frame
+    returned = returned.reindex(sent[ROW_ID].to_numpy())
+    edits = []
+    for col in sent.columns:
+        if col == ROW_ID or col not in returned.columns:
+            continue
+        before = sent[col].reset_index(drop=True)
+        after = _coerce(returned[col].to_numpy(), before.dtype)
+        changed = ~((before == after).fillna(False) | (before.isna() & after.isna()))
+        for i in np.flatnonzero(changed.to_numpy()):
+            edits.append((int(sent[ROW_ID].iat[i]), col, after.iat[i]))
+    return edits
+
+
+def apply_cell_edits(df, edits):
+    """
+    Applies [(row position, column, value)] to a copy-on-write snapshot of
+    df, so only the edited columns are copied. Returns (new_df, touched columns).
+    """
+    new_df = snapshot_frame(df)
+    touched = []
+    by_column = {}
+    for position, col, value in edits:
+        by_column.setdefault(col, []).append((position, value))
+    for col, cells in by_column.items():
+        col_index = new_df.columns.get_loc(col)
+        positions = [p for p, _ in cells]
+        values = [v for _, v in cells]
+        try:
+            new_df.iloc[positions, col_index] = values
+        except (TypeError, ValueError):
+            # Value doesn't fit the dtype (text typed into a number column): widen the column
+            new_df[col] = new_df[col].astype(object)
+            new_df.iloc[positions, col_index] = values
+        touched.append(col)
+    return new_df, touched
@@ -0,0 +1,178 @@
+import re
+import difflib
+import pandas as pd
+
+
+class IntentParser:
+    """
+    Deterministic fast-path in front of the LLM. Recognizes common
+    spreadsheet commands and turns them straight into vectorized pandas
+    code; anything it doesn't recognize returns None and goes to the model.
+    """
+
+    AGGREGATIONS = {
+        "sum": "sum", "total": "sum",
+        "average": "mean", "mean": "mean", "avg": "mean",
+        "max": "max", "maximum": "max", "highest": "max",
+        "min": "min", "minimum": "min", "lowest": "min",
+        "count": "count", "median": "median",
+    }
+    COMPARISONS = {
+        "equals": "==", "equal to": "==", "is": "==", "is equal to": "==", "=": "==", "==": "==",
+        "is not": "!=", "not equal to": "!=", "is not equal to": "!=", "does not equal": "!=",
+        "greater than": ">", "more than": ">", "above": ">", ">": ">",
+        "is greater than": ">", "is more than": ">", "is above": ">", "is over": ">",
+        "less than": "<", "below": "<", "under": "<", "<": "<",
+        "is less than": "<", "is below": "<", "is under": "<",
+        "at least": ">=", "is at least": ">=", ">=": ">=",
+        "greater than or equal to": ">=", "is greater than or equal to": ">=",
+        "at most": "<=", "is at most": "<=", "<=": "<=",
+        "less than or equal to": "<=", "is less than or equal to": "<=",
+    }
+
+    def __init__(self, fuzzy_cutoff=0.85):
+        """
+        :param fuzzy_cutoff: Similarity needed to match a spoken name to a column (transcripts are noisy)
+        """
+        self.fuzzy_cutoff = fuzzy_cutoff
+        agg_words = "|".join(sorted(self.AGGREGATIONS, key=len, reverse=True))
+
+        # Order matters: more specific patterns first
+        self.patterns = [
+            (re.compile(rf"^(?:what is the |show |show me the |get the |calculate the )?(?P<agg>{agg_words})(?: of)? (?P<value>.+?) (?:by|per|for each) (?P<group>.+)$"), self._group_aggregate),
+            (re.compile(rf"^(?:what is the |show |show me the |get the |calculate the )?(?P<agg>{agg_words})(?: of)? (?P<col>.+)$"), self._aggregate),
+            (re.compile(r"^sort(?: the)?(?: data| table| sheet)? by (?P<col>.+?)(?: in)?(?: (?P<order>ascending|descending|asc|desc)(?: order)?)?$"), self._sort),
+            (re.compile(r"^(?P<verb>filter|keep|show)(?: me)?(?: the)?(?: rows)?(?: where| with)? (?P<condition>.+)$"), self._filter),
+            (re.compile(r"^(?:delete|remove|drop)(?: the)? column (?P<col>.+)$"), self._drop_column),
+            (re.compile(r"^(?:delete|remove|drop)(?: the)? (?P<col>.+?) column$"), self._drop_column),
+            (re.compile(r"^rename(?: the)?(?: column)? (?P<col>.+?) to (?P<new>.+)$"), self._rename_column),
+        ]
+
+    def parse(self, text, df):
+        """
+        Returns pandas code for a recognized command, or None.
+        """
+        if df is None or not text:
+            return None
+        normalized = re.sub(r"\s+", " ", text.strip()).rstrip(".!?").strip()
+        lowered = normalized.lower()
+        for pattern, builder in self.patterns:
+            match = pattern.match(lowered)
+            if match:
+                # Re-slice the original text so values keep their case ("IT", "New York")
+                groups = {k: normalized[match.start(k):match.end(k)] if match.group(k) else None
+                          for k in pattern.groupindex}
+                code = builder(df, **groups)
+                if code is not None:
+                    return code
+        return None
+
+    # --- Column resolution ---
+    def resolve_column(self, df, spoken):
+        if spoken is None:
+            return None
+        key = self._squash(spoken)
+        squashed = {self._squash(col): col for col in df.columns}
+        if key in squashed:
+            return squashed[key]
+        close = difflib.get_close_matches(key, list(squashed), n=1, cutoff=self.fuzzy_cutoff)
+        return squashed[close[0]] if close else None
+
+    @staticmethod
+    def _squash(name):
+        name = re.sub(r"^the ", "", str(name).strip().lower())
+        return re.sub(r"[\s_\-]+", "", name)
+
+    def _literal(self, df, col, raw):
+        """
+        Converts the spoken value into a Python literal matching the column dtype.
+        """
+        raw = raw.strip().strip("'\"")
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series):
+            try:
+                number = float(raw.replace(",", ""))
+            except ValueError:
+                return None
+            return repr(int(number)) if number.is_integer() else repr(number)
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return f"pd.Timestamp({raw!r})"
+        # Match the spoken value to an existing category, ignoring case ("it" -> "IT")
+        uniques = pd.Series(series.dropna().unique())
+        matches = uniques[uniques.astype(str).str.lower() == raw.lower()]
+        return repr(matches.iloc[0]) if len(matches) else repr(raw)
+
+    # --- Builders ---
+    def _aggregate(self, df, agg, col):
+        column = self.resolve_column(df, col)
+        if column is None:
+            return None
+        func = self.AGGREGATIONS[agg.lower()]
+        if func not in ("count",) and not pd.api.types.is_numeric_dtype(df[column]):
+            return None
+        return f"print(df[{column!r}].{func}())"
+
+    def _group_aggregate(self, df, agg, value, group):
+        value_col = self.resolve_column(df, value)
+        group_col = self.resolve_column(df, group)
+        if value_col is None or group_col is None:
+            return None
+        func = self.AGGREGATIONS[agg.lower()]
+        if func not in ("count",) and not pd.api.types.is_numeric_dtype(df[value_col]):
+            return None
+        return f"print(df.groupby({group_col!r})[{value_col!r}].{func}())"
+
+    def _sort(self, df, col, order=None):
+        column = self.resolve_column(df, col)
+        if column is None:
+            return None
+        ascending = not (order and order.lower().startswith("desc"))
+        return f"df.sort_values({column!r}, ascending={ascending}, inplace=True)"
+
+    def _filter(self, df, verb, condition):
+        # "Sales is greater than 5" also reads as "Sales" is "greater than 5": try
+        # the longest operator first, then the other splits until one makes sense
+        for start, op in self._comparison_splits(condition.lower()):
+            code = self._filter_split(df, verb, condition[:start], op, condition[start + len(op) + 2:])
+            if code is not None:
+                return code
+        return None
+
+    def _comparison_splits(self, condition):
+        """
+        [(position, operator)] of every operator surrounded by spaces,
+        leftmost first and the longest operator first at each position.
+        """
+        splits = []
+        for op in self.COMPARISONS:
+            splits += [(m.start(), op) for m in re.finditer(rf"(?= {re.escape(op)} )", condition)]
+        return sorted(splits, key=lambda split: (split[0], -len(split[1])))
+
+    def _filter_split(self, df, verb, col, op, value):
+        column = self.resolve_column(df, col)
+        if column is None:
+            return None
+        operator = self.COMPARISONS[op.lower()]
+        literal = self._literal(df, column, value)
+        if literal is None:
+            return None
+        if operator not in ("==", "!=") and not (pd.api.types.is_numeric_dtype(df[column])
+                                                  or pd.api.types.is_datetime64_any_dtype(df[column])):
+            return None
+        mask = f"df[{column!r}] {operator} {literal}"
+        if verb.lower() == "show":
+            # Asking to see rows must not drop the others from the workbook
+            return f"print(df[{mask}])"
+        return f"df = df[{mask}]"
+
+    def _drop_column(self, df, col):
+        column = self.resolve_column(df, col)
+        if column is None:
+            return None
+        return f"df.drop(columns=[{column!r}], inplace=True)"
+
+    def _rename_column(self, df, col, new):
+        column = self.resolve_column(df, col)
+        if column is None:
+            return None
+        return f"df.rename(columns={{{column!r}: {new.strip()!r}}}, inplace=True)"
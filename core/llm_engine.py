@@ -1,44 +1,110 @@
-import os
+import time
 import logging
-from groq import Groq
-from dotenv import load_dotenv
+import threading
+from core.api_client import get_client, translate_error
+from core.code_cache import CodeCache
+from core.tracing import span, setup_queue_logging
+from utils.prompt_templates import CODE_GENERATION_PROMPT, DUCKDB_CODE_PROMPT, POLARS_CODE_PROMPT
 
-load_dotenv()
+# System prompt per query engine (see core.query_engines)
+ENGINE_PROMPTS = {
+    "pandas": CODE_GENERATION_PROMPT,
+    "duckdb": DUCKDB_CODE_PROMPT,
+    "polars": POLARS_CODE_PROMPT,
+}
 
 # --- Logging Setup ---
-logging.basicConfig(
-    filename='llm_traffic.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# Written by a background thread, so logging a full response never stalls a turn
+setup_queue_logging('llm_traffic.log')
+
+class CodeStreamParser:
+    """
+    Incrementally extracts the code block from a streamed completion.
+    done becomes True as soon as a fenced block is closed, so the caller
+    can stop the stream instead of paying for any trailing explanation.
+    """
+    FENCE = "```"
 
-class LLMEngine:
     def __init__(self):
-        self.api_key = os.getenv("GROQ_API_KEY")
-        self.client = Groq(api_key=self.api_key)
+        self.text = ""
+        self.done = False
+        self._code_start = None
+        self._code_end = None
+
+    def feed(self, delta):
+        if self.done or not delta:
+            return self.done
+        self.text += delta
+
+        if self._code_start is None:
+            fence = self.text.find(self.FENCE)
+            if fence == -1:
+                return False
+            # The language tag ("python") runs up to the end of the fence line
+            newline = self.text.find("\n", fence)
+            if newline == -1:
+                return False
+            self._code_start = newline + 1
+
+        close = self.text.find(self.FENCE, self._code_start)
+        if close != -1:
+            self._code_end = close
+            self.done = True
+        return self.done
+
+    @property
+    def code(self):
+        if self._code_start is not None:
+            return self.text[self._code_start:self._code_end].strip()
+        # No fence at all: the model followed the "no markdown" rule
+        return self.text.replace("```python", "").replace("```", "").strip()
+
+
+class LLMEngine:
+    def __init__(self, cache=None, stream=True, client=None, deadline=30.0):
+        """
+        :param cache: CodeCache for repeated prompts on the same schema (defaults to in-memory only)
+        :param stream: Stream tokens and stop as soon as the code block is complete
+        :param client: APIClient to use (defaults to the shared pooled client)
+        :param deadline: Seconds allowed per generation request, retries included
+        """
+        self.client = client if client is not None else get_client()
+        self.deadline = deadline
         self.model = "openai/gpt-oss-20b" # Or "llama3-70b-8192"
+        self.temperature = 0.1
+        self.cache = cache if cache is not None else CodeCache()
+        self.stream = stream
+        self._active_requests = set()
+        self._lock = threading.Lock()
 
-    def generate_code(self, user_prompt, columns_context):
+    def cancel(self):
         """
-        Constructs the prompt, logs it, and gets code from the LLM.
+        Aborts every in-flight generation (their generate_code returns None).
         """
-        
-        system_prompt = f"""
-        You are an expert Python Data Analyst.
-        You are given a Pandas DataFrame named `df`.
-        The columns are: {columns_context}
-        
-        Your task: Write Python code to fulfill the User's request.
-        
-        CRITICAL RULES:
-        1. Operate directly on `df`. Do NOT create sample data.
-        2. **DATE SAFETY**: The date columns might be loaded as strings. BEFORE using any `.dt` accessor (like .dt.year, .dt.month), YOU MUST write a line of code to convert the column to datetime. 
-           Example: `df['Date'] = pd.to_datetime(df['Date'], errors='coerce')`
-        3. If the user asks for a calculation, print the result.
-        4. If the user asks to modify data, update `df` inplace.
-        5. Return ONLY the python code. No markdown, no explanations.
+        with self._lock:
+            for event in self._active_requests:
+                event.set()
+
+    def generate_code(self, user_prompt, columns_context, schema_key=None, cancel_event=None,
+                      temperature=None, use_cache=True, engine=None):
         """
+        Constructs the prompt, logs it, and gets code from the LLM.
+        Identical prompts on the same schema are served from the cache.
+
+        :param columns_context: Sheet description placed in the system prompt
+        :param schema_key: What the cache is keyed on (defaults to columns_context)
+        :param cancel_event: threading.Event; when set the request is abandoned and None is returned
+        :param temperature: Sampling temperature (defaults to self.temperature); raised for alternative candidates
+        :param use_cache: False skips the cache both ways (alternative candidates are only cached if they win)
+        :param engine: Query engine the code must target (None = pandas); picks the prompt variant
+        Raises core.api_client.APIError when the API call fails.
+        """
+        cache_key = self._cache_key(user_prompt, columns_context, schema_key, engine)
+        cached_code = self.cached_code(user_prompt, columns_context, schema_key, engine) if use_cache else None
+        if cached_code is not None:
+            return cached_code
+
+        system_prompt = self._system_prompt(columns_context, engine)
 
         messages_payload = [
             {"role": "system", "content": system_prompt},
@@ -50,25 +116,148 @@ class LLMEngine:
         print(f"\n📢 [LOG] Sending Request to LLM...")
         logging.info(log_message)
 
+        clean_code = self._request(messages_payload, cancel_event, temperature)
+        if clean_code is not None and use_cache:
+            self.cache.put(cache_key, clean_code)
+        return clean_code
+
+    def _cache_key(self, user_prompt, columns_context, schema_key=None, engine=None):
+        schema = schema_key if schema_key is not None else columns_context
+        # Code for another engine is a different answer; pandas keeps the original keys
+        model = self.model if engine in (None, "pandas") else f"{self.model}:{engine}"
+        return self.cache.make_key(user_prompt, schema, model)
+
+    @staticmethod
+    def _system_prompt(columns_context, engine=None):
+        return ENGINE_PROMPTS[engine or "pandas"].format(columns_context=columns_context)
+
+    def cached_code(self, user_prompt, columns_context, schema_key=None, engine=None):
+        """
+        The cached answer for this prompt and schema, or None. Never calls the API.
+        """
+        code = self.cache.get(self._cache_key(user_prompt, columns_context, schema_key, engine))
+        if code is not None:
+            print(f"⚡ [LOG] Cache hit, skipping LLM call.")
+            logging.info(f"CACHE HIT: {user_prompt}")
+        return code
+
+    def remember(self, user_prompt, code, columns_context, schema_key=None, engine=None):
+        """
+        Stores code that proved itself (e.g. a winning candidate) as the cached answer.
+        """
+        self.cache.put(self._cache_key(user_prompt, columns_context, schema_key, engine), code)
+
+    def refine_code(self, user_prompt, columns_context, code, feedback, schema_key=None, cancel_event=None,
+                    engine=None):
+        """
+        Asks the model to rework code it produced for user_prompt, given
+        feedback (slow patterns found by pre-flight analysis, a traceback, ...).
+        The answer is not cached until it has run; see remember().
+        Returns the new code, or None when cancelled.
+        Raises core.api_client.APIError when the API call fails.
+        """
+        messages_payload = [
+            {"role": "system", "content": self._system_prompt(columns_context, engine)},
+            {"role": "user", "content": user_prompt},
+            {"role": "assistant", "content": code},
+            {"role": "user", "content": feedback},
+        ]
+
+        print(f"\n🔁 [LOG] Asking LLM to revise its code...")
+        logging.info(f"\n{'='*20} REFINE REQUEST {'='*20}\nUSER REQUEST: {user_prompt}\nFEEDBACK: {feedback}\n")
+
+        return self._request(messages_payload, cancel_event)
+
+    def _request(self, messages_payload, cancel_event=None, temperature=None):
+        """
+        Sends one completion request and returns the extracted code, or None if cancelled.
+        """
+        cancel_event = cancel_event or threading.Event()
+        temperature = temperature if temperature is not None else self.temperature
+        with self._lock:
+            self._active_requests.add(cancel_event)
+
+        trace = span("llm", model=self.model, temperature=temperature, stream=self.stream,
+                     prompt_chars=sum(len(m["content"]) for m in messages_payload))
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=messages_payload,
-                model=self.model,
-                temperature=0.1, 
-            )
-            
-            response = chat_completion.choices[0].message.content
+            with trace:
+                if self.stream:
+                    response, clean_code = self._stream_completion(messages_payload, cancel_event, temperature, trace)
+                else:
+                    chat_completion = self.client.call(
+                        lambda groq: groq.chat.completions.create(
+                            messages=messages_payload,
+                            model=self.model,
+                            temperature=temperature,
+                        ),
+                        deadline=self.deadline
+                    )
+                    response = chat_completion.choices[0].message.content
+                    parser = CodeStreamParser()
+                    parser.feed(response)
+                    clean_code = parser.code
+                    usage = getattr(chat_completion, "usage", None)
+                    if usage is not None:
+                        trace.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                trace.set(completion_chars=len(response or ""), code_chars=len(clean_code or ""),
+                          cancelled=cancel_event.is_set())
+
+            if cancel_event.is_set():
+                print(f"⏹️ [LOG] Request cancelled.")
+                logging.info("CANCELLED")
+                return None
             
             # --- LOGGING RESPONSE ---
-            print(f"📥 [LOG] Received Response.")
-            print(f"\n--- FULL LLM RESPONSE START ---\n{response}\n--- FULL LLM RESPONSE END ---\n")
+            # The full response goes to llm_traffic.log only
+            print(f"📥 [LOG] Received Response ({len(clean_code or '')} chars of code).")
             logging.info(f"RESPONSE:\n{response}")
-            
-            # Cleanup
-            clean_code = response.replace("```python", "").replace("```", "").strip()
             return clean_code
 
         except Exception as e:
-            error_msg = f"API Error: {e}"
-            print(f"❌ [LOG] {error_msg}")
-            return f"print('{error_msg}')"
\ No newline at end of file
+            print(f"❌ [LOG] API Error: {e}")
+            logging.info(f"API ERROR: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._active_requests.discard(cancel_event)
+
+    def _stream_completion(self, messages_payload, cancel_event, temperature, trace):
+        """
+        Streams the completion, stopping at the closing code fence or when
+        cancel_event is set. Returns (raw_text, code).
+
+        :param trace: Span that receives time-to-first-token and chunk counts
+        """
+        parser = CodeStreamParser()
+        start = time.perf_counter()
+        chunks = 0
+        stream = self.client.call(
+            lambda groq: groq.chat.completions.create(
+                messages=messages_payload,
+                model=self.model,
+                temperature=temperature,
+                stream=True,
+            ),
+            deadline=self.deadline
+        )
+        try:
+            for chunk in stream:
+                if cancel_event.is_set():
+                    break
+                if not chunk.choices:
+                    continue
+                if chunks == 0:
+                    trace.set(first_token_ms=round((time.perf_counter() - start) * 1000, 1))
+                chunks += 1  # Roughly one token per streamed chunk
+                if parser.feed(chunk.choices[0].delta.content):
+                    break
+        except Exception as e:
+            # Failures mid-stream are not retried (tokens were already consumed)
+            raise translate_error(e)[0] from e
+        finally:
+            # Closing the HTTP response stops generation (and billing) server side
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            trace.set(completion_tokens=chunks)
+        return parser.text, parser.code
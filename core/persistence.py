@@ -0,0 +1,120 @@
+import time
+import atexit
+import threading
+from core.excel_ops import snapshot_frame
+
+
+class PersistenceService:
+    def __init__(self, executor, debounce_seconds=1.5):
+        """
+        Saves workbooks on a background thread. Bursts of commands/edits are
+        coalesced: only the latest frame per file and session is written,
+        once it has been quiet for debounce_seconds. Writes go through
+        ExcelExecutor.save_file (temp file + atomic rename). Sessions never
+        replace each other's pending frames; each is written (or rejected as
+        a conflict by the registry) on its own.
+
+        :param executor: Anything with save_file(df, filepath, sheet): an ExcelExecutor, or a
+                         WorkbookRegistry to serialize writes with other sessions (needed for
+                         mark_dirty(session=...))
+        :param debounce_seconds: Quiet period before a dirty file is written
+        """
+        self.executor = executor
+        self.debounce_seconds = debounce_seconds
+        self.last_result = {}  # filepath -> (success, message)
+
+        self._pending = {}     # (filepath, sheet, session) -> (frame snapshot, time marked dirty)
+        self._writing = set()  # (filepath, sheet, session) being written
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def mark_dirty(self, df, filepath, sheet=None, session=None):
+        """
+        Schedules df to be written to filepath as the given sheet (None =
+        the first sheet). Returns immediately.
+
+        :param session: Editing session the frame belongs to, passed on to
+            WorkbookRegistry.save_file so it can detect conflicting saves
+        """
+        snapshot = snapshot_frame(df)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PersistenceService is closed")
+            self._pending[(filepath, sheet, session)] = (snapshot, time.monotonic())
+            self._cond.notify_all()
+
+    def is_dirty(self, filepath=None):
+        with self._cond:
+            if filepath is None:
+                return bool(self._pending or self._writing)
+            return any(key[0] == filepath for key in (*self._pending, *self._writing))
+
+    def flush(self, timeout=None):
+        """
+        Writes everything pending right away and waits for it to finish.
+        Returns False if the timeout expired first.
+        """
+        end_time = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # Make every pending entry due immediately
+            for key, (snapshot, _) in self._pending.items():
+                self._pending[key] = (snapshot, float("-inf"))
+            self._cond.notify_all()
+            while self._pending or self._writing:
+                remaining = None if end_time is None else end_time - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """
+        Flushes pending writes and stops the background thread.
+        """
+        if self._closed:
+            return
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _due(self):
+        """
+        Pops every entry whose quiet period is over. Returns (due, seconds until the next one).
+        """
+        now = time.monotonic()
+        due, next_wait = [], None
+        for key, (snapshot, marked) in list(self._pending.items()):
+            wait = marked + self.debounce_seconds - now
+            if wait <= 0:
+                due.append((key, snapshot))
+                del self._pending[key]
+                self._writing.add(key)
+            elif next_wait is None or wait < next_wait:
+                next_wait = wait
+        return due, next_wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed and not self._pending:
+                        return
+                    due, next_wait = self._due()
+                    if due:
+                        break
+                    self._cond.wait(next_wait)
+
+            for (filepath, sheet, session), snapshot in due:
+                if session is None:
+                    result = self.executor.save_file(snapshot, filepath, sheet)
+                else:
+                    result = self.executor.save_file(snapshot, filepath, sheet, session=session)
+                with self._cond:
+                    self.last_result[filepath] = result
+                    self._writing.discard((filepath, sheet, session))
+                    self._cond.notify_all()
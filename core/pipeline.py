@@ -0,0 +1,425 @@
+import queue
+import asyncio
+import threading
+import concurrent.futures
+
+from core.context_manager import ContextManager
+from core.version_store import VersionStore
+from core.grid_view import apply_cell_edits
+from core.excel_ops import LazySheets
+from core.tracing import span
+from utils.prompt_templates import WORKBOOK_SHEETS_CONTEXT
+
+_STOP = object()  # Flows through every queue so each stage finishes its backlog, then exits
+
+
+def sheets_context(sheets):
+    """
+    Prompt text listing the workbook's other sheets ("" when there are none).
+    """
+    if not sheets:
+        return ""
+    if isinstance(sheets, LazySheets):
+        listing = sheets.describe()
+    else:
+        listing = "\n".join(f"- {name}: {list(frame.columns)}" for name, frame in sheets.items())
+    return WORKBOOK_SHEETS_CONTEXT.format(sheets=listing)
+
+
+class PipelineEvent:
+    """
+    What a stage reports back (transcripts, command outcomes, errors).
+    kind is one of: transcript, result, history, load, edit, error, exit.
+    """
+    def __init__(self, kind, text="", success=True, message="", summary=None, rewrites=None):
+        self.kind = kind
+        self.text = text
+        self.success = success
+        self.message = message
+        self.summary = summary
+        self.rewrites = rewrites or []
+
+    def render(self):
+        if self.kind == "transcript":
+            return self.text
+        lines = [f"🔧 Vectorized: {note}" for note in self.rewrites]
+        if self.summary:
+            lines.append(f"🏁 {self.summary}")
+        lines.append(f"{'✅' if self.success else '❌'} {self.message}")
+        return "\n".join(lines)
+
+
+class CommandPipeline:
+    def __init__(self, executor, solver, intent_parser, persistence, transcriber=None, listener=None,
+                 context_manager=None, versions=None, streaming=True, queue_size=2, exit_phrase=None,
+                 on_event=None):
+        """
+        listen -> transcribe -> execute as asyncio stages joined by bounded
+        queues. The next utterance is captured and transcribed while the
+        previous command is still executing; saving is handed to the
+        PersistenceService. When a queue is full the stage before it waits,
+        so a slow stage throttles capture instead of piling up audio.
+        Runs its own event loop on a background thread, so the CLI and the
+        Streamlit app drive it with plain method calls.
+
+        :param executor: ExcelExecutor (intent fast-path code runs here)
+        :param solver: CommandSolver for everything the intent parser doesn't recognize
+        :param persistence: PersistenceService; every committed frame is queued for saving, with
+                            the pipeline as its session (see WorkbookRegistry.save_file)
+        :param transcriber: Transcriber (None = text-only pipeline)
+        :param listener: AudioListener (None = text-only pipeline)
+        :param streaming: Transcribe chunks while the user is still speaking
+        :param queue_size: Capacity of the queues between stages
+        :param exit_phrase: Spoken phrase that stops the pipeline (None = disabled)
+        :param on_event: Callback(PipelineEvent), called on the pipeline thread; events are also kept for poll_events()
+        """
+        self.executor = executor
+        self.solver = solver
+        self.intent_parser = intent_parser
+        self.persistence = persistence
+        self.transcriber = transcriber
+        self.listener = listener
+        self.context_manager = context_manager if context_manager is not None else ContextManager()
+        self.versions = versions if versions is not None else VersionStore()
+        self.streaming = streaming
+        self.queue_size = queue_size
+        self.exit_phrase = exit_phrase
+        self.on_event = on_event
+
+        self.df = None
+        self.filepath = None
+        self.sheet = None   # Sheet df was loaded from (None = the first)
+        self.sheets = None  # The workbook's other sheets, readable by generated code
+        self._cell_lineage = None  # (grid base, current df) while only cell edits separate them
+        self.stage_status = {"listen": "idle", "transcribe": "idle", "execute": "idle"}
+        self._events = queue.Queue()
+        self._continuous = False
+        self._stopping = False
+        self._cancel_event = None
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._finished = threading.Event()
+
+    # --- Lifecycle (any thread) ---
+    def start(self, continuous=False):
+        """
+        :param continuous: Re-arm the microphone after every utterance (hands-free dictation)
+        """
+        if self._thread is not None:
+            return
+        self._continuous = continuous
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._main()), daemon=True,
+                                        name="command-pipeline")
+        self._thread.start()
+        self._ready.wait()
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._finished.is_set()
+
+    def stop(self, wait=True, timeout=None):
+        """
+        Lets queued work finish, then stops every stage.
+        """
+        if not self.running:
+            return
+        asyncio.run_coroutine_threadsafe(self._begin_stop(), self._loop)
+        if wait:
+            self._finished.wait(timeout)
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the pipeline has stopped (e.g. the exit phrase was spoken).
+        """
+        return self._finished.wait(timeout)
+
+    def cancel(self):
+        """
+        Abandons the command being generated and drops queued commands.
+        """
+        self.cancel_current()
+        if self.running:
+            self._loop.call_soon_threadsafe(self._drop_queued_commands)
+
+    def cancel_current(self):
+        """
+        Abandons only the command being generated; queued commands still run.
+        """
+        cancel_event = self._cancel_event
+        if cancel_event is not None:
+            cancel_event.set()
+
+    # --- Inputs (any thread) ---
+    def capture(self):
+        """
+        Arms the microphone for one utterance. Returns at once; the result arrives as events.
+        """
+        return asyncio.run_coroutine_threadsafe(self._capture_q.put(True), self._loop)
+
+    def submit_text(self, text, supersede=False):
+        """
+        Queues a typed command. Returns a Future resolving to its PipelineEvent.
+
+        :param supersede: The new command makes the one being generated stale, so cancel it first
+        """
+        if supersede:
+            self.cancel_current()
+        return self._submit(("text", text))
+
+    def load(self, df, filepath, sheet=None, sheets=None):
+        """
+        :param sheet: Sheet df came from; edits are saved back to it
+        :param sheets: Mapping of the other sheets (e.g. LazySheets) commands may read
+        """
+        return self._submit(("load", df, filepath, sheet, sheets))
+
+    def edit(self, df, label="Edit"):
+        return self._submit(("edit", df, label))
+
+    def edit_cells(self, base_df, edits, label="Cell edit"):
+        """
+        Queues cell-level edits [(row position, column, value)] made on a
+        view of base_df. Several batches may be queued against the same
+        base_df; they are dropped if anything else replaced the frame in the
+        meantime, since the positions may no longer match.
+        """
+        return self._submit(("cells", base_df, edits, label))
+
+    def undo(self):
+        return self._submit(("undo",))
+
+    def redo(self):
+        return self._submit(("redo",))
+
+    def _submit(self, action):
+        future = concurrent.futures.Future()
+        asyncio.run_coroutine_threadsafe(self._command_q.put((action, future)), self._loop)
+        return future
+
+    # --- Outputs (any thread) ---
+    def poll_events(self):
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def has_events(self):
+        return not self._events.empty()
+
+    @property
+    def busy(self):
+        return any(status != "idle" for status in self.stage_status.values()) \
+            or (self.running and (self._audio_q.qsize() or self._command_q.qsize()))
+
+    def status(self):
+        parts = [f"{stage}: {status}" for stage, status in self.stage_status.items() if status != "idle"]
+        if self.running and self._command_q.qsize():
+            parts.append(f"{self._command_q.qsize()} queued")
+        return ", ".join(parts) or "idle"
+
+    def _emit(self, event):
+        self._events.put(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    # --- Event loop ---
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._capture_q = asyncio.Queue(maxsize=1)
+        self._audio_q = asyncio.Queue(maxsize=self.queue_size)
+        self._command_q = asyncio.Queue(maxsize=self.queue_size)
+        self._ready.set()
+        try:
+            await asyncio.gather(self._listen_stage(), self._transcribe_stage(), self._execute_stage())
+        finally:
+            self._finished.set()
+
+    async def _begin_stop(self):
+        self._continuous = False
+        self._stopping = True
+        await self._capture_q.put(_STOP)
+
+    def _drop_queued_commands(self):
+        while not self._command_q.empty():
+            item = self._command_q.get_nowait()
+            if item is _STOP:
+                self._command_q.put_nowait(item)
+                return
+            if item[1] is not None:
+                item[1].cancel()
+
+    async def _listen_stage(self):
+        while True:
+            trigger = await self._capture_q.get()
+            if trigger is _STOP or self.listener is None:
+                if trigger is _STOP:
+                    await self._audio_q.put(_STOP)
+                    return
+                continue
+
+            self.stage_status["listen"] = "listening"
+            try:
+                if self.streaming:
+                    # Hand the segment feed downstream first so transcription overlaps capture
+                    feed = queue.Queue()
+                    await self._audio_q.put(feed)
+                    await asyncio.to_thread(self._capture_segments, feed)
+                else:
+                    clip = await asyncio.to_thread(self.listener.listen_and_record)
+                    if clip is not None:
+                        await self._audio_q.put(clip)
+            except Exception as e:
+                self._emit(PipelineEvent("error", success=False, message=f"Microphone error: {e}"))
+            finally:
+                self.stage_status["listen"] = "idle"
+
+            if self._continuous and self._capture_q.empty():
+                self._capture_q.put_nowait(True)
+
+    def _capture_segments(self, feed):
+        try:
+            for clip in self.listener.stream_segments():
+                feed.put(clip)
+        finally:
+            feed.put(None)
+
+    async def _transcribe_stage(self):
+        while True:
+            audio = await self._audio_q.get()
+            if audio is _STOP:
+                await self._command_q.put(_STOP)
+                return
+
+            self.stage_status["transcribe"] = "transcribing"
+            try:
+                text = await asyncio.to_thread(self._transcribe, audio)
+            except Exception as e:
+                # Odd audio or a backend error fails this utterance only; the stage keeps running
+                self._emit(PipelineEvent("error", success=False, message=f"Transcription failed: {e}"))
+                continue
+            finally:
+                self.stage_status["transcribe"] = "idle"
+
+            if self._stopping:
+                continue  # Captured after the stop request; queued commands still finish
+            if not text:
+                self._emit(PipelineEvent("error", success=False, message="No speech detected."))
+                continue
+            self._emit(PipelineEvent("transcript", text=text))
+            if self.exit_phrase and self.exit_phrase in text.lower():
+                self._emit(PipelineEvent("exit", text=text, message="Goodbye."))
+                self._stopping = True
+                asyncio.ensure_future(self._begin_stop())
+                continue
+            await self._command_q.put((("text", text), None))
+
+    def _transcribe(self, audio):
+        if isinstance(audio, queue.Queue):
+            return self.transcriber.transcribe_stream(iter(audio.get, None))
+        return self.transcriber.transcribe(audio)
+
+    async def _execute_stage(self):
+        while True:
+            item = await self._command_q.get()
+            if item is _STOP:
+                return
+            action, future = item
+            if future is not None and not future.set_running_or_notify_cancel():
+                continue
+
+            self.stage_status["execute"] = "executing"
+            try:
+                event = await asyncio.to_thread(self._apply, action)
+            except Exception as e:
+                event = PipelineEvent("error", success=False, message=f"Pipeline error: {e}")
+            finally:
+                self.stage_status["execute"] = "idle"
+            if future is not None:
+                future.set_result(event)
+            self._emit(event)
+
+    # --- Commands (pipeline worker thread, one at a time) ---
+    def _apply(self, action):
+        kind = action[0]
+        if kind == "load":
+            _, df, filepath, sheet, sheets = action
+            self.df, self.filepath, self.sheet, self.sheets = df, filepath, sheet, sheets
+            self.context_manager.invalidate()
+            self.versions.reset(df)
+            return PipelineEvent("load", message=f"Loaded {len(df)} rows.")
+        if kind == "edit":
+            _, df, label = action
+            self._commit(df, label, None)
+            return PipelineEvent("edit", message="Changes saved!")
+        if kind == "cells":
+            _, base_df, edits, label = action
+            lineage = self._cell_lineage
+            chained = lineage is not None and lineage[0] is base_df and lineage[1] is self.df
+            if base_df is not self.df and not chained:
+                return PipelineEvent("edit", success=False,
+                                     message="The sheet changed while you were editing; edit discarded.")
+            new_df, touched = apply_cell_edits(self.df, edits)
+            self._commit(new_df, label, touched)
+            self._cell_lineage = (base_df, new_df)
+            return PipelineEvent("edit", message=f"Saved {len(edits)} cell edit(s).")
+        if kind in ("undo", "redo"):
+            return self._restore(kind)
+
+        text = action[1]
+        # Spoken "undo" / "redo" (history is kept in memory, no reload needed)
+        spoken = text.strip().rstrip(".!").lower()
+        if spoken in ("undo", "redo"):
+            return self._restore(spoken)
+        with span("command", chars=len(text)) as trace:
+            event = self._run_command(text)
+            trace.set(success=event.success)
+        return event
+
+    def _run_command(self, text):
+        if self.df is None:
+            return PipelineEvent("result", text, False, "No spreadsheet loaded.")
+
+        # Local fast-path first, LLM candidates for everything else
+        code = self.intent_parser.parse(text, self.df)
+        if code is not None:
+            success, new_df, message = self.executor.execute_code(self.df, code, self.sheets)
+            summary, rewrites = "Recognized command, skipped LLM.", []
+        else:
+            self.stage_status["execute"] = "thinking"
+            self._cancel_event = cancel_event = threading.Event()
+            summary_text = self.context_manager.get_spreadsheet_summary(self.df) + sheets_context(self.sheets)
+            result = self.solver.solve(text, self.df, summary_text,
+                                       schema_key=self.context_manager.schema_key(self.df),
+                                       cancel_event=cancel_event, sheets=self.sheets)
+            self._cancel_event = None
+            if result.cancelled:
+                return PipelineEvent("result", text, False, "Request cancelled.")
+            success, new_df, message, code = result.success, result.df, result.message, result.code
+            summary, rewrites = result.summary(), result.rewrites
+
+        if success:
+            self._commit(new_df, text, ContextManager.touched_columns(code, self.df.columns))
+        return PipelineEvent("result", text, success, message, summary, rewrites)
+
+    def _commit(self, df, label, touched):
+        """
+        :param touched: Columns whose cached profiles are stale (None = all)
+        """
+        self.context_manager.invalidate(touched)
+        self.df = df
+        self.versions.commit(df, label)
+        if self.filepath:
+            self.persistence.mark_dirty(df, self.filepath, self.sheet, session=self)
+
+    def _restore(self, direction):
+        restored = self.versions.undo() if direction == "undo" else self.versions.redo()
+        if restored is None:
+            return PipelineEvent("history", direction, False, f"Nothing to {direction}.")
+        self.df = restored
+        self.context_manager.invalidate()
+        if self.filepath:
+            self.persistence.mark_dirty(restored, self.filepath, self.sheet, session=self)
+        return PipelineEvent("history", direction, True, f"{direction.capitalize()} done.")
@@ -0,0 +1,134 @@
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class PandasEngine:
+    """
+    The default: generated code edits the pandas frame `df` directly.
+    """
+    name = "pandas"
+
+    @staticmethod
+    def available():
+        return True
+
+    def namespace(self, df):
+        """
+        Variables the snippet sees next to df, pd and sheets.
+        """
+        return {}
+
+    def to_pandas(self, value):
+        """
+        Turns what the snippet left in `df` back into a pandas frame
+        (returned unchanged when it isn't one the engine knows).
+        """
+        return value
+
+    def close(self, namespace):
+        pass
+
+
+class DuckDBEngine(PandasEngine):
+    """
+    In-process DuckDB. The frame is registered as the table `df` (scanned
+    in place, not copied) and queries run on every core. A query result
+    stays a lazy relation until it is printed or assigned back to `df`.
+    """
+    name = "duckdb"
+
+    def __init__(self, threads=None):
+        """
+        :param threads: Worker threads per query (None = DuckDB's default, every core)
+        """
+        self.threads = threads
+
+    @staticmethod
+    def available():
+        return duckdb is not None
+
+    def namespace(self, df):
+        con = duckdb.connect()
+        if self.threads:
+            con.execute(f"SET threads TO {int(self.threads)}")
+        con.register("df", self._table(df))
+        return {"duckdb": duckdb, "con": con, "sql": con.sql}
+
+    @staticmethod
+    def _table(df):
+        """
+        Arrow view of df when possible: pandas' Arrow-backed columns convert
+        without a copy, while registering the frame itself makes DuckDB
+        inspect every string column.
+        """
+        if pa is not None:
+            try:
+                return pa.Table.from_pandas(df, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                pass  # Mixed-type object columns: let DuckDB scan the frame
+        return df
+
+    def to_pandas(self, value):
+        if isinstance(value, duckdb.DuckDBPyRelation):
+            return value.df()
+        return value
+
+    def close(self, namespace):
+        namespace["con"].close()
+
+
+class PolarsEngine(PandasEngine):
+    """
+    Polars lazy frames. `lf` is a LazyFrame over the sheet; the query plan
+    is optimized as a whole and runs multi-threaded when collected.
+    """
+    name = "polars"
+
+    @staticmethod
+    def available():
+        return pl is not None
+
+    def namespace(self, df):
+        return {"pl": pl, "lf": pl.from_pandas(df).lazy()}
+
+    def to_pandas(self, value):
+        if isinstance(value, pl.LazyFrame):
+            value = value.collect()
+        if isinstance(value, pl.DataFrame):
+            return value.to_pandas()
+        return value
+
+
+ENGINES = {engine.name: engine for engine in (PandasEngine, DuckDBEngine, PolarsEngine)}
+_instances = {}
+
+
+def available_engines():
+    return [name for name, engine in ENGINES.items() if engine.available()]
+
+
+def get_engine(name=None):
+    """
+    Shared engine instance by name (None = pandas). Raises ValueError for
+    unknown engines and ImportError when the engine's package is missing.
+    """
+    name = name or PandasEngine.name
+    if name not in ENGINES:
+        raise ValueError(f"Unknown query engine '{name}' (choose from {', '.join(ENGINES)})")
+    if not ENGINES[name].available():
+        raise ImportError(f"Query engine '{name}' needs the {name} package (pip install {name})")
+    if name not in _instances:
+        _instances[name] = ENGINES[name]()
+    return _instances[name]
@@ -0,0 +1,232 @@
+import os
+import json
+import atexit
+import time
+import queue
+import logging
+import itertools
+import threading
+import contextvars
+import logging.handlers
+from collections import deque, defaultdict
+
+import numpy as np
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """
+    One timed stage (listen, transcribe, llm, execute, ...). Use as a
+    context manager; attributes (sizes, token counts, shapes) can be added
+    with set() while it runs.
+    """
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.started_at = time.time()
+        self.duration = None
+        self.error = None
+        self._start = None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            pass  # Exited in another context (e.g. a generator resumed elsewhere)
+        self.tracer.record_span(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "span": self.name,
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "ts": round(self.started_at, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread": threading.current_thread().name,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class _JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, default=str)
+
+
+class Tracer:
+    def __init__(self, jsonl_path=None, window=500, enabled=True):
+        """
+        Collects spans for every stage of a turn. Recording only appends to
+        in-memory windows and a queue; a QueueListener thread serializes
+        and writes the JSON lines, so tracing never blocks a stage on disk I/O.
+
+        :param jsonl_path: File every finished span is appended to as one JSON line (None = memory only)
+        :param window: Spans kept per stage for the rolling percentiles
+        :param enabled: False turns span() into a no-op
+        """
+        self.enabled = enabled
+        self.window = window
+        self._durations = defaultdict(lambda: deque(maxlen=window))
+        self._recent = deque(maxlen=window * 4)
+        self._lock = threading.Lock()
+        self._queue = None
+        self._listener = None
+        if jsonl_path:
+            folder = os.path.dirname(jsonl_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            handler = logging.FileHandler(jsonl_path, encoding="utf-8")
+            handler.setFormatter(_JsonLinesFormatter())
+            self._queue = queue.SimpleQueue()
+            self._listener = logging.handlers.QueueListener(self._queue, handler)
+            self._listener.start()
+            atexit.register(self.close)
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NullSpan()
+        return Span(self, name, attrs)
+
+    def record(self, name, duration, **attrs):
+        """
+        Records a span measured by the caller (for work that can't sit
+        inside a with block, like a generator that yields to its consumer).
+        """
+        if not self.enabled:
+            return
+        span = Span(self, name, attrs)
+        span.duration = duration
+        span.started_at = time.time() - duration
+        self.record_span(span)
+
+    def record_span(self, span):
+        data = span.to_dict()
+        with self._lock:
+            self._durations[span.name].append(span.duration)
+            self._recent.append(data)
+        if self._queue is not None:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": data}))
+
+    # --- Reporting ---
+    def stats(self, percentiles=(50, 90, 99)):
+        """
+        {stage: {"count", "mean_ms", "p50_ms", ...}} over the rolling window.
+        """
+        with self._lock:
+            samples = {name: np.array(values) * 1000 for name, values in self._durations.items() if values}
+        report = {}
+        for name, values in sorted(samples.items()):
+            row = {"count": len(values), "mean_ms": float(values.mean())}
+            for p, value in zip(percentiles, np.percentile(values, percentiles)):
+                row[f"p{p}_ms"] = float(value)
+            row["last_ms"] = float(values[-1])
+            report[name] = row
+        return report
+
+    def histogram(self, name, bins=10):
+        """
+        (counts, bin_edges_ms) of one stage's rolling window.
+        """
+        with self._lock:
+            values = np.array(self._durations.get(name, ())) * 1000
+        if not len(values):
+            return np.array([]), np.array([])
+        return np.histogram(values, bins=bins)
+
+    def recent(self, limit=50):
+        with self._lock:
+            return list(self._recent)[-limit:]
+
+    def export_jsonl(self, path=None):
+        """
+        Writes the spans still in memory as JSON lines. Returns the text when path is None.
+        """
+        text = "\n".join(json.dumps(s, default=str) for s in self.recent(len(self._recent)))
+        if path is None:
+            return text
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        return path
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+class _NullSpan:
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+# --- Shared Instance ---
+_tracer = Tracer()
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    return _tracer
+
+
+def configure_tracer(**kwargs):
+    """
+    Replaces the process-wide tracer (e.g. to add a JSON-lines file).
+    """
+    global _tracer
+    with _tracer_lock:
+        _tracer.close()
+        _tracer = Tracer(**kwargs)
+        return _tracer
+
+
+def span(name, **attrs):
+    """
+    Shortcut for get_tracer().span(...).
+    """
+    return _tracer.span(name, **attrs)
+
+
+def setup_queue_logging(filename, fmt="%(asctime)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"):
+    """
+    Sends the root logger through a queue to a file writer thread, so
+    logging.info() on a hot path never waits for the disk. Does nothing if
+    logging is already configured (same rule as logging.basicConfig).
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    handler = logging.FileHandler(filename, encoding="utf-8")
+    handler.setFormatter(logging.Formatter(fmt, datefmt))
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)  # Drain what is still queued on exit
+    return listener
@@ -1,37 +1,117 @@
 import os
-from groq import Groq
-from dotenv import load_dotenv
+import re
+from concurrent.futures import ThreadPoolExecutor
+from core.audio_clip import AudioClip
+from core.api_client import get_client
+from core.tracing import span
+
+class GroqWhisperBackend:
+    """
+    Default transcription backend. Any object with a
+    transcribe(upload) -> str method can be used instead (a local
+    stand-in server via APIClient(base_url=...), a fake in tests, ...).
+    """
+    def __init__(self, client=None, model="whisper-large-v3", language="en", deadline=20.0):
+        """
+        :param client: APIClient to use (defaults to the shared pooled client)
+        :param deadline: Seconds allowed per upload, retries included
+        """
+        self.client = client if client is not None else get_client()
+        self.model = model # Groq's super fast Whisper model
+        self.language = language
+        self.deadline = deadline
+
+    def transcribe(self, upload):
+        """
+        :param upload: (filename, bytes) tuple
+        Raises core.api_client.APIError on failure.
+        """
+        transcription = self.client.call(
+            lambda groq: groq.audio.transcriptions.create(
+                file=upload,
+                model=self.model,
+                response_format="json",
+                language=self.language,
+                temperature=0.0
+            ),
+            deadline=self.deadline
+        )
+        return transcription.text
 
-# Load environment variables from .env file
-load_dotenv()
 
 class Transcriber:
-    def __init__(self):
-        self.api_key = os.getenv("GROQ_API_KEY")
-        if not self.api_key:
-            raise ValueError("GROQ_API_KEY not found in .env file")
-        
-        self.client = Groq(api_key=self.api_key)
-
-    def transcribe(self, audio_filepath):
-        """
-        Sends audio to Groq Whisper and returns text.
-        """
-        if not os.path.exists(audio_filepath):
-            return "Error: Audio file not found."
-
-        try:
-            with open(audio_filepath, "rb") as file:
-                transcription = self.client.audio.transcriptions.create(
-                    file=(audio_filepath, file.read()),
-                    model="whisper-large-v3", # Groq's super fast Whisper model
-                    response_format="json",
-                    language="en",
-                    temperature=0.0
-                )
-            return transcription.text
-        except Exception as e:
-            return f"Error during transcription: {e}"
+    def __init__(self, backend=None, upload_format="flac", upload_sample_rate=16000, stream_workers=4):
+        """
+        :param backend: Transcription backend (defaults to Groq Whisper)
+        :param upload_format: 'flac' or 'wav' (int16 PCM) for in-memory clips
+        :param upload_sample_rate: Clips are resampled to this rate before upload (Whisper uses 16 kHz)
+        :param stream_workers: Max chunks in flight at once in streaming mode
+        """
+        self.backend = backend if backend is not None else GroqWhisperBackend()
+        self.upload_format = upload_format
+        self.upload_sample_rate = upload_sample_rate
+        self.stream_workers = stream_workers
+
+    def _prepare_upload(self, audio):
+        """
+        Accepts an AudioClip (preferred, no disk I/O) or a path to an audio file.
+        Returns the (filename, bytes) tuple the API expects.
+        """
+        if isinstance(audio, AudioClip):
+            return audio.to_upload(self.upload_format, sample_rate=self.upload_sample_rate)
+
+        with open(audio, "rb") as file:
+            return (os.path.basename(audio), file.read())
+
+    def transcribe(self, audio):
+        """
+        Sends audio to the backend and returns text.
+        Raises FileNotFoundError for a missing file and core.api_client.APIError
+        when the API call fails.
+        """
+        upload = self._prepare_upload(audio)
+        with span("transcribe", upload_bytes=len(upload[1]), format=self.upload_format) as trace:
+            text = self.backend.transcribe(upload)
+            trace.set(chars=len(text or ""))
+        return text
+
+    def transcribe_stream(self, clips):
+        """
+        Streaming mode: every chunk is uploaded as soon as it arrives (while
+        the user is still speaking) and the partial transcripts are stitched
+        together in order once the stream ends. Returns "" if nothing was said.
+
+        :param clips: Iterable of AudioClips, e.g. AudioListener.stream_segments()
+        """
+        with span("transcribe_stream") as trace:
+            with ThreadPoolExecutor(max_workers=self.stream_workers) as pool:
+                futures = [pool.submit(self.transcribe, clip) for clip in clips]
+                parts = [f.result() for f in futures]
+            text = self.stitch(parts)
+            trace.set(chunks=len(parts), chars=len(text))
+        return text
+
+    @staticmethod
+    def stitch(parts):
+        """
+        Joins chunk transcripts into one sentence. Whisper closes every chunk
+        with a full stop and sometimes repeats the boundary word, so both are
+        removed at the seams.
+        """
+        words = []
+        for i, part in enumerate(parts):
+            part = part.strip()
+            if i < len(parts) - 1:
+                part = part.rstrip(".")
+            chunk_words = part.split()
+            if words and chunk_words and _norm(words[-1]) == _norm(chunk_words[0]):
+                chunk_words = chunk_words[1:]
+            words.extend(chunk_words)
+        return " ".join(words)
+
+
+def _norm(word):
+    return re.sub(r"\W", "", word).lower()
 
 # Test block
 if __name__ == "__main__":
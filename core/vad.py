@@ -0,0 +1,243 @@
+import numpy as np
+import scipy.io.wavfile as wav
+from numpy.lib.stride_tricks import sliding_window_view
+
+from core.tracing import span
+
+
+class FrameVAD:
+    def __init__(self, sample_rate=16000, frame_ms=20, threshold_multiplier=3.0, min_threshold=0.001,
+                 noise_window_ms=1500, hangover_ms=300, min_speech_ms=60,
+                 pre_roll_ms=300, post_roll_ms=300):
+        """
+        Frame-based Voice Activity Detection. Everything is vectorized over
+        frames so a 30 s clip is classified in a handful of NumPy calls.
+
+        :param sample_rate: Hz of the audio that will be analysed
+        :param frame_ms: Frame length (10-30 ms is typical for speech)
+        :param threshold_multiplier: How much louder than the noise floor a frame must be to count as speech
+        :param min_threshold: Absolute floor for the speech threshold (dead silent rooms)
+        :param noise_window_ms: Window of the running-minimum noise floor estimate
+        :param hangover_ms: Keep a segment open this long after the last loud frame
+        :param min_speech_ms: Loud bursts shorter than this are treated as clicks, not speech
+        :param pre_roll_ms: Audio kept before the first speech frame
+        :param post_roll_ms: Audio kept after the last speech frame
+        """
+        if not 10 <= frame_ms <= 30:
+            raise ValueError("frame_ms must be between 10 and 30")
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.threshold_multiplier = threshold_multiplier
+        self.min_threshold = min_threshold
+        self.noise_window = self._ms_to_frames(noise_window_ms)
+        self.hangover = self._ms_to_frames(hangover_ms)
+        self.min_speech = self._ms_to_frames(min_speech_ms)
+        self.pre_roll = int(sample_rate * pre_roll_ms / 1000)
+        self.post_roll = int(sample_rate * post_roll_ms / 1000)
+        # Calibrated ambient RMS; the adaptive floor never drops below it
+        self.noise_floor = 0.0
+
+    def _ms_to_frames(self, ms):
+        return max(1, int(round(ms / self.frame_ms)))
+
+    def calibrate(self, noise_audio):
+        """
+        Seeds the noise floor from a recording of background noise.
+        """
+        noise_audio = self._as_mono(noise_audio)
+        self.noise_floor = float(np.sqrt(np.mean(noise_audio**2))) if len(noise_audio) else 0.0
+        return self.noise_floor
+
+    # --- Analysis ---
+    def frame_energies(self, audio):
+        """
+        Returns the RMS of every complete frame.
+        """
+        audio = self._as_mono(audio)
+        n_frames = len(audio) // self.frame_size
+        if n_frames == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = audio[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        return np.sqrt(np.einsum('ij,ij->i', frames, frames) / self.frame_size)
+
+    def adaptive_noise_floor(self, energies):
+        """
+        Running-minimum noise estimate: the quietest frame in the trailing
+        window approximates the background level, so the floor follows slow
+        changes (fans, traffic) but is not pulled up by speech.
+        """
+        if len(energies) == 0:
+            return energies
+        pad = np.full(self.noise_window - 1, energies[0], dtype=energies.dtype)
+        floor = sliding_window_view(np.concatenate((pad, energies)), self.noise_window).min(axis=1)
+        return np.maximum(floor, self.noise_floor)
+
+    def speech_mask(self, audio):
+        """
+        Returns a boolean array with one entry per frame (True = speech).
+        """
+        energies = self.frame_energies(audio)
+        if len(energies) == 0:
+            return np.zeros(0, dtype=bool)
+
+        threshold = np.maximum(self.adaptive_noise_floor(energies) * self.threshold_multiplier,
+                               self.min_threshold)
+        raw = energies > threshold
+
+        # Drop bursts that are too short to be speech
+        starts, ends = self._runs(raw)
+        for s, e in zip(starts, ends):
+            if e - s < self.min_speech:
+                raw[s:e] = False
+
+        # Hangover: extend every speech frame forward so short pauses don't split words
+        smoothed = np.convolve(raw.astype(np.int8), np.ones(self.hangover + 1, dtype=np.int8))[:len(raw)]
+        return smoothed > 0
+
+    def find_segments(self, audio):
+        """
+        Returns a list of (start_sample, end_sample) speech segments with the
+        pre-roll/post-roll applied. Overlapping segments are merged.
+        """
+        audio = self._as_mono(audio)
+        starts, ends = self._runs(self.speech_mask(audio))
+        segments = []
+        for s, e in zip(starts, ends):
+            start, end = self.pad(s * self.frame_size, e * self.frame_size, len(audio))
+            if segments and start <= segments[-1][1]:
+                segments[-1] = (segments[-1][0], int(end))
+            else:
+                segments.append((int(start), int(end)))
+        return segments
+
+    def pad(self, start, end, length):
+        """
+        Widens the speech span [start, end) by the pre/post roll, within [0, length).
+        """
+        return max(0, start - self.pre_roll), min(length, end + self.post_roll)
+
+    def stream(self):
+        """
+        Returns a VADStream that makes the same per-frame decisions on live audio.
+        """
+        return VADStream(self)
+
+    def trim(self, audio):
+        """
+        Cuts leading and trailing silence, keeping the span from the first to
+        the last speech segment (plus pre/post roll). Returns an empty array
+        if no speech was found.
+        """
+        audio = self._as_mono(audio)
+        with span("vad", samples=len(audio)) as trace:
+            segments = self.find_segments(audio)
+            trace.set(segments=len(segments),
+                      kept_samples=segments[-1][1] - segments[0][0] if segments else 0)
+        if not segments:
+            return audio[:0]
+        return audio[segments[0][0]:segments[-1][1]]
+
+    def trim_file(self, filepath):
+        """
+        Offline helper: loads a WAV fixture and returns the trimmed audio.
+        """
+        return self.trim(self.load_wav(filepath, self.sample_rate))
+
+    # --- Helpers ---
+    @staticmethod
+    def load_wav(filepath, expected_rate=None):
+        """
+        Reads a WAV file as float32 mono in [-1, 1].
+        """
+        rate, data = wav.read(filepath)
+        if expected_rate is not None and rate != expected_rate:
+            raise ValueError(f"{filepath} is {rate} Hz, expected {expected_rate} Hz")
+        if np.issubdtype(data.dtype, np.integer):
+            data = data.astype(np.float32) / np.iinfo(data.dtype).max
+        return FrameVAD._as_mono(data)
+
+    @staticmethod
+    def _as_mono(audio):
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        return audio
+
+    @staticmethod
+    def _runs(mask):
+        """
+        Start/end indices (end exclusive) of every True run in a boolean array.
+        """
+        edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+class VADStream:
+    """
+    Frame-by-frame FrameVAD for audio that arrives in blocks (a microphone
+    callback): the same running-minimum noise floor, threshold, min_speech
+    and hangover rules as speech_mask, decided as each frame completes.
+    State is preallocated, so feed() can run on the audio thread.
+    Sample positions count from the last reset().
+    """
+    def __init__(self, vad):
+        self.vad = vad
+        self._partial = np.zeros(vad.frame_size, dtype=np.float32)
+        self._energies = np.zeros(vad.noise_window, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self._partial_len = 0
+        self._frames = 0
+        self._loud_run = 0
+        self._last_voiced = -1
+        self.speech_start = None        # First sample of the first confirmed speech (None = none yet)
+        self.last_voiced_sample = 0     # End of the last loud speech frame
+        self.last_speech_sample = 0     # End of the last speech frame, hangover included
+
+    def feed(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        size = self.vad.frame_size
+        pos = 0
+        if self._partial_len:
+            take = min(size - self._partial_len, len(samples))
+            self._partial[self._partial_len:self._partial_len + take] = samples[:take]
+            self._partial_len += take
+            pos = take
+            if self._partial_len < size:
+                return
+            self._frame(np.sqrt(np.dot(self._partial, self._partial) / size))
+            self._partial_len = 0
+
+        n_frames = (len(samples) - pos) // size
+        if n_frames:
+            frames = samples[pos:pos + n_frames * size].reshape(n_frames, size)
+            for energy in np.sqrt(np.einsum('ij,ij->i', frames, frames) / size):
+                self._frame(energy)
+            pos += n_frames * size
+        rest = len(samples) - pos
+        if rest:
+            self._partial[:rest] = samples[pos:]
+            self._partial_len = rest
+
+    def _frame(self, energy):
+        vad = self.vad
+        if self._frames == 0:
+            # A calibrated floor beats guessing from the first frame, which may already be speech
+            self._energies[:] = vad.noise_floor or energy
+        self._energies[self._frames % vad.noise_window] = energy
+        self._frames += 1
+        end = self._frames * vad.frame_size
+
+        floor = max(self._energies.min(), vad.noise_floor)
+        loud = energy > max(floor * vad.threshold_multiplier, vad.min_threshold)
+        self._loud_run = self._loud_run + 1 if loud else 0
+        # A loud run only counts as speech once it outlasts min_speech (clicks don't)
+        if self._loud_run >= vad.min_speech:
+            if self.speech_start is None:
+                self.speech_start = end - self._loud_run * vad.frame_size
+            self._last_voiced = self._frames - 1
+            self.last_voiced_sample = end
+        if self._last_voiced >= 0 and self._frames - 1 - self._last_voiced <= vad.hangover:
+            self.last_speech_sample = end
@@ -0,0 +1,118 @@
+from core.excel_ops import snapshot_frame
+
+
+def _column_buffers(series):
+    """
+    Identifies the memory behind a column as [(key, nbytes)], so columns
+    shared between versions are only counted once.
+    """
+    array = series.array
+    ndarray = getattr(array, "_ndarray", None)
+    if ndarray is not None:
+        return [(("np", ndarray.__array_interface__["data"][0], ndarray.nbytes), ndarray.nbytes)]
+    pa_array = getattr(array, "_pa_array", None)
+    if pa_array is not None:
+        return [(("arrow", buf.address, buf.size), buf.size)
+                for chunk in pa_array.chunks for buf in chunk.buffers() if buf is not None]
+    # Unknown storage: count it as unshared
+    return [(("obj", id(array)), int(series.memory_usage(index=False, deep=False)))]
+
+
+class Version:
+    def __init__(self, df, label):
+        self.df = df
+        self.label = label
+
+
+class VersionStore:
+    def __init__(self, memory_budget_mb=512, max_versions=50):
+        """
+        Copy-on-write history of the sheet for undo/redo. Each command
+        records a new version; columns a command didn't touch keep pointing
+        at the same buffers, so a step only costs the columns it changed.
+        That needs pandas Copy-on-Write (pandas 3, or enable_copy_on_write()
+        on 2.x); without it every version is a deep copy.
+
+        :param memory_budget_mb: Unique bytes all versions may hold; oldest undo steps are evicted above it
+        :param max_versions: Hard cap on undo steps
+        """
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.max_versions = max_versions
+        self.current = None
+        self._undo = []
+        self._redo = []
+
+    def reset(self, df, label="Loaded"):
+        """
+        Starts a fresh history (new file / reload).
+        """
+        self._undo.clear()
+        self._redo.clear()
+        self.current = Version(snapshot_frame(df), label)
+
+    def commit(self, df, label):
+        """
+        Records df as the newest version. Clears the redo stack.
+        """
+        if self.current is None:
+            self.reset(df, label)
+            return
+        self._undo.append(self.current)
+        self.current = Version(snapshot_frame(df), label)
+        self._redo.clear()
+        self._evict()
+
+    def undo(self):
+        """
+        Steps back one version. Returns the frame to show, or None.
+        """
+        if not self._undo:
+            return None
+        self._redo.append(self.current)
+        self.current = self._undo.pop()
+        return snapshot_frame(self.current.df)
+
+    def redo(self):
+        if not self._redo:
+            return None
+        self._undo.append(self.current)
+        self.current = self._redo.pop()
+        return snapshot_frame(self.current.df)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    @property
+    def undo_label(self):
+        return self.current.label if self._undo else None
+
+    @property
+    def redo_label(self):
+        return self._redo[-1].label if self._redo else None
+
+    def memory_usage(self):
+        """
+        Bytes held by the whole history, counting shared column buffers once.
+        """
+        seen = {}
+        for version in self._all_versions():
+            df = version.df
+            for i in range(df.shape[1]):
+                for key, nbytes in _column_buffers(df.iloc[:, i]):
+                    seen[key] = nbytes
+        return sum(seen.values())
+
+    def _all_versions(self):
+        versions = list(self._undo) + list(self._redo)
+        if self.current is not None:
+            versions.append(self.current)
+        return versions
+
+    def _evict(self):
+        while len(self._undo) > self.max_versions:
+            self._undo.pop(0)
+        while self._undo and self.memory_usage() > self.memory_budget:
+            self._undo.pop(0)
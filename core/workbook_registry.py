@@ -0,0 +1,292 @@
+import os
+import time
+import weakref
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from core.excel_ops import snapshot_frame, LazySheets
+
+
+class FileLock:
+    def __init__(self, lock_path, timeout=30.0, poll_interval=0.05):
+        """
+        Exclusive lock on lock_path, held across threads and processes
+        (a second Streamlit server or the CLI on the same workbook).
+
+        :param timeout: Seconds to wait before giving up with TimeoutError
+        """
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self):
+        end_time = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Timed out waiting for {self.lock_path}")
+        try:
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            while True:
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    else:
+                        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if time.monotonic() >= end_time:
+                        os.close(fd)
+                        raise TimeoutError(f"Timed out waiting for {self.lock_path}")
+                    time.sleep(self.poll_interval)
+            self._fd = fd
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class Workbook:
+    def __init__(self, path, lock):
+        self.path = path
+        self.lock = lock
+        self.bases = {}           # {sheet: shared frame}; sessions only ever get snapshots of them
+        self.fingerprint = None   # File state the bases match
+        self.revision = 0         # Bumped on every save through the registry
+        self.revisions = {}       # {sheet: revision of its last save}; None and the first sheet's name alias
+        self.reloaded = 0         # Revision of sheets not saved since the file was (re)read from disk
+        self.load_lock = threading.Lock()
+
+    def sheet_revision(self, sheet):
+        return self.revisions.get(sheet, self.reloaded)
+
+
+class SaveConflict:
+    def __init__(self, sheet, base_revision, revision):
+        self.sheet = sheet
+        self.base_revision = base_revision  # Revision the session's edits started from
+        self.revision = revision            # Revision someone else committed since
+
+    @property
+    def message(self):
+        return (f"Not saved: another session saved this sheet (revision {self.revision}) after you opened "
+                f"revision {self.base_revision}. Reload to get their changes, or overwrite them with yours.")
+
+
+class WorkbookRegistry:
+    def __init__(self, executor, lock_timeout=30.0):
+        """
+        Process-wide table of open workbooks. Every session opening the same
+        file gets a copy-on-write snapshot of one shared base frame instead
+        of parsing and holding its own copy; a session's edits only copy the
+        columns they touch. Saves are serialized per file behind a FileLock
+        and the saved frame becomes the new base, so the next session that
+        opens the file starts from the latest version without re-reading it.
+
+        Has the same save_file() as ExcelExecutor, so a PersistenceService
+        can write through it.
+
+        Sessions that pass session= to open() and save_file() get optimistic
+        concurrency: each save must start from the revision of the sheet the
+        session last opened or saved. A save on top of someone else's newer
+        revision is rejected and kept as a SaveConflict (see conflict())
+        instead of silently overwriting their work.
+
+        :param executor: ExcelExecutor that loads and writes the files
+        :param lock_timeout: Seconds a save waits for another writer
+        """
+        self.executor = executor
+        self.lock_timeout = lock_timeout
+        self._workbooks = {}
+        self._lock = threading.Lock()
+        # {session: {(path, sheet): base revision}}; forgotten with the session
+        self._checkouts = weakref.WeakKeyDictionary()
+        self._conflicts = weakref.WeakKeyDictionary()  # {session: {(path, sheet): SaveConflict}}
+
+    def _entry(self, filepath):
+        path = os.path.abspath(filepath)
+        with self._lock:
+            entry = self._workbooks.get(path)
+            if entry is None:
+                # Next to the workbook's sidecars, so the lock file never clutters the folder
+                folder = os.path.join(os.path.dirname(path), ".xcelord_cache")
+                os.makedirs(folder, exist_ok=True)
+                lock_path = os.path.join(folder, os.path.basename(path) + ".lock")
+                entry = Workbook(path, FileLock(lock_path, self.lock_timeout))
+                self._workbooks[path] = entry
+            return entry
+
+    def open(self, filepath, sheet=None, session=None):
+        """
+        Returns (success, df, message) like ExcelExecutor.load_sheet; df is
+        this caller's own overlay of the shared base of that sheet.
+
+        :param session: Object identifying the editing session (weakly
+            referenced); its later saves of this sheet are checked against
+            the revision opened here
+        """
+        entry = self._entry(filepath)
+        # One loader per file; sessions opening it at the same time wait for that load
+        with entry.load_lock:
+            fingerprint = self.executor.file_fingerprint(filepath)
+            if entry.fingerprint != fingerprint:
+                # The file was changed outside the registry: every base is stale
+                self._reread(entry, fingerprint)
+            if sheet in entry.bases:
+                success, message = True, "Spreadsheet opened from the shared copy."
+                df = snapshot_frame(entry.bases[sheet])
+            else:
+                success, df, message = self.executor.load_sheet(filepath, sheet)
+                if not success:
+                    return False, None, message
+                entry.bases[sheet] = df
+                df = snapshot_frame(df)
+            if session is not None:
+                self._checkout(session, entry, sheet, entry.sheet_revision(sheet))
+            return success, df, message
+
+    @staticmethod
+    def _reread(entry, fingerprint):
+        entry.bases.clear()
+        entry.fingerprint = fingerprint
+        # Whatever sessions opened before is now out of date
+        entry.revision += 1
+        entry.revisions.clear()
+        entry.reloaded = entry.revision
+
+    def _checkout(self, session, entry, sheet, revision):
+        with self._lock:
+            self._checkouts.setdefault(session, {})[(entry.path, sheet)] = revision
+            self._conflicts.get(session, {}).pop((entry.path, sheet), None)
+
+    def save_file(self, df, filepath, sheet=None, session=None):
+        """
+        Writes df as the given sheet (None = the first) under the file's
+        lock and makes it the shared base. Returns (success, message) like
+        ExcelExecutor.save_file.
+
+        :param session: Session that opened the sheet with open(session=...);
+            the save is rejected if the sheet moved past the revision it opened
+        """
+        entry = self._entry(filepath)
+        try:
+            with entry.lock:
+                exists = os.path.exists(filepath)
+                first = None
+                if exists and (sheet is not None or filepath.endswith((".xlsx", ".xlsm"))):
+                    first = self.executor.list_sheets(filepath)[0].name
+                # None and the first sheet's name are the same tab
+                aliases = {None, first} if sheet is None or sheet == first else {sheet}
+                in_step = exists and entry.fingerprint == self.executor.file_fingerprint(filepath)
+                if exists and not in_step and entry.fingerprint is not None:
+                    with entry.load_lock:
+                        self._reread(entry, self.executor.file_fingerprint(filepath))
+
+                base = self._base_revision(session, entry, aliases)
+                if base is not None and entry.sheet_revision(sheet) != base:
+                    conflict = SaveConflict(sheet, base, entry.sheet_revision(sheet))
+                    with self._lock:
+                        self._conflicts.setdefault(session, {})[(entry.path, sheet)] = conflict
+                    return False, conflict.message
+
+                success, message = self.executor.save_file(df, filepath, sheet)
+                if success:
+                    with entry.load_lock:
+                        fingerprint = self.executor.file_fingerprint(filepath)
+                        # Other sheets were carried over unchanged, so their bases stay valid
+                        bases = entry.bases if in_step else {}
+                        for alias in aliases:
+                            bases.pop(alias, None)
+                        bases[sheet] = snapshot_frame(df)
+                        entry.bases, entry.fingerprint = bases, fingerprint
+                        entry.revision += 1
+                        for alias in aliases:
+                            entry.revisions[alias] = entry.revision
+                    if session is not None:
+                        self._checkout(session, entry, sheet, entry.revision)
+                return success, message
+        except TimeoutError as e:
+            return False, f"Error saving file: {e}"
+
+    def _base_revision(self, session, entry, aliases):
+        if session is None:
+            return None
+        with self._lock:
+            checkouts = self._checkouts.get(session, {})
+            for alias in aliases:
+                if (entry.path, alias) in checkouts:
+                    return checkouts[(entry.path, alias)]
+        return None
+
+    def conflict(self, session, filepath, sheet=None):
+        """
+        The SaveConflict that rejected the session's last save of the sheet (None = no conflict).
+        """
+        with self._lock:
+            return self._conflicts.get(session, {}).get((os.path.abspath(filepath), sheet))
+
+    def overwrite(self, session, filepath, sheet=None):
+        """
+        Resolves a conflict in the session's favour: its next save of the
+        sheet goes on top of the latest revision.
+        """
+        entry = self._entry(filepath)
+        self._checkout(session, entry, sheet, entry.sheet_revision(sheet))
+
+    def other_sheets(self, filepath, sheet=None):
+        """
+        LazySheets over every sheet except the open one, loaded through the
+        registry (shared bases) only when a command reads them.
+        """
+        infos = self.executor.list_sheets(filepath, headers=True)
+        current = sheet if sheet is not None else infos[0].name
+
+        def load(name):
+            success, df, message = self.open(filepath, name)
+            if not success:
+                raise ValueError(message)
+            return df
+
+        return LazySheets(load, [info for info in infos if info.name != current])
+
+    def revision(self, filepath):
+        return self._entry(filepath).revision
+
+    def evict(self, filepath):
+        """
+        Forgets the shared base (sessions keep their snapshots).
+        """
+        with self._lock:
+            self._workbooks.pop(os.path.abspath(filepath), None)
+
+    def stats(self):
+        """
+        [(path, rows, revision)] for every workbook with a loaded base
+        (rows summed over its loaded sheets).
+        """
+        with self._lock:
+            entries = list(self._workbooks.values())
+        return [(e.path, sum(len(df) for df in e.bases.values()), e.revision) for e in entries if e.bases]
@@ -1,47 +1,96 @@
+import argparse
+import numpy as np
 import pandas as pd
-import random
 from datetime import datetime, timedelta
 
 # 1. Setup lists for random generation
 first_names = [
-    "Alice", "Bob", "Charlie", "David", "Eve", "Frank", "Grace", "Heidi", 
-    "Ivan", "Judy", "Kevin", "Laura", "Mike", "Nina", "Oscar", "Paul", 
+    "Alice", "Bob", "Charlie", "David", "Eve", "Frank", "Grace", "Heidi",
+    "Ivan", "Judy", "Kevin", "Laura", "Mike", "Nina", "Oscar", "Paul",
     "Quinn", "Rachel", "Steve", "Tina", "Victor", "Wendy", "Xavier", "Yara", "Zack"
 ]
 last_names = [
-    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", 
-    "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", 
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+    "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez",
     "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin"
 ]
 departments = ["Sales", "IT", "HR", "Marketing", "Finance", "Operations", "Legal"]
+regions = ["North", "South", "East", "West", "Central"]
+notes = ["", "Top performer", "On leave", "New hire", "Needs review", "Remote", "Part-time"]
 
-# 2. Generate 100 rows
-data = []
-
-for _ in range(100):
-    # Create a random name
-    fname = random.choice(first_names)
-    lname = random.choice(last_names)
-    full_name = f"{fname} {lname}"
-    
-    # Random Department and Sales
-    dept = random.choice(departments)
-    sales = random.randint(1000, 50000) # Sales between 1k and 50k
-    
-    # Random Date (within the last 365 days)
-    days_offset = random.randint(0, 365)
-    date_obj = datetime.now() - timedelta(days=days_offset)
-    date_str = date_obj.strftime("%Y-%m-%d")
-
-    data.append([full_name, dept, sales, date_str])
-
-# 3. Create DataFrame
-df = pd.DataFrame(data, columns=["Employee", "Department", "Sales", "Date"])
-
-# 4. Save to Excel
-filename = "data.xlsx"
-df.to_excel(filename, index=False)
-
-print(f"✅ Successfully created '{filename}' with 100 records.")
-print("\n--- Preview of first 5 rows ---")
-print(df.head())
\ No newline at end of file
+EXCEL_MAX_ROWS = 1_048_575  # One row of the sheet is the header
+
+
+def generate_dataframe(rows=100, seed=None, mixed_types=False, null_rate=0.0):
+    """
+    Builds the demo sheet with vectorized NumPy draws, so millions of rows
+    take seconds. Text columns are picked from precomputed pools instead
+    of being formatted row by row.
+
+    :param rows: Number of records
+    :param seed: Random seed (None = different data every run)
+    :param mixed_types: Add float, bool, int id, a day-first date, region and free-text columns
+    :param null_rate: Fraction of blanks in the optional columns (Score, Hired, Notes)
+    """
+    rng = np.random.default_rng(seed)
+
+    # Every "First Last" combination once, then index into it
+    full_names = np.array([f"{f} {l}" for f in first_names for l in last_names], dtype=object)
+    today = datetime.now()
+    # Random Date (within the last 365 days), kept as text like a typed-in sheet
+    date_pool = np.array([(today - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(366)], dtype=object)
+
+    df = pd.DataFrame({
+        "Employee": full_names[rng.integers(0, len(full_names), rows)],
+        "Department": np.array(departments, dtype=object)[rng.integers(0, len(departments), rows)],
+        "Sales": rng.integers(1000, 50001, rows),  # Sales between 1k and 50k
+        "Date": date_pool[rng.integers(0, len(date_pool), rows)],
+    })
+    if not mixed_types:
+        return df
+
+    hired_pool = np.array([(today - timedelta(days=d)).strftime("%d/%m/%Y") for d in range(0, 3650, 7)],
+                          dtype=object)
+    df["EmployeeID"] = rng.permutation(rows) + 10000
+    df["Region"] = np.array(regions, dtype=object)[rng.integers(0, len(regions), rows)]
+    df["Score"] = rng.normal(70, 12, rows).round(1)
+    df["Active"] = rng.random(rows) > 0.1
+    df["Hired"] = hired_pool[rng.integers(0, len(hired_pool), rows)]
+    df["Notes"] = np.array(notes, dtype=object)[rng.integers(0, len(notes), rows)]
+
+    if null_rate > 0:
+        for col in ("Score", "Hired", "Notes"):
+            blanks = rng.random(rows) < null_rate
+            df[col] = df[col].mask(blanks)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a demo spreadsheet.")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--output", default="data.xlsx")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--mixed", action="store_true", help="Add more column types")
+    parser.add_argument("--null-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # 2. Generate the rows
+    df = generate_dataframe(args.rows, seed=args.seed, mixed_types=args.mixed, null_rate=args.null_rate)
+
+    # 3. Save (Excel stops at ~1M rows; larger frames go to CSV)
+    filename = args.output
+    if len(df) > EXCEL_MAX_ROWS and filename.endswith(".xlsx"):
+        filename = filename[:-len(".xlsx")] + ".csv"
+        print(f"⚠️ {len(df):,} rows exceed Excel's sheet limit, writing '{filename}' instead.")
+    if filename.endswith(".csv"):
+        df.to_csv(filename, index=False)
+    else:
+        df.to_excel(filename, index=False)
+
+    print(f"✅ Successfully created '{filename}' with {len(df):,} records.")
+    print("\n--- Preview of first 5 rows ---")
+    print(df.head())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,53 @@
 import os
-import pandas as pd
 from core.audio_listener import AudioListener
 from core.transcriber import Transcriber
 from core.llm_engine import LLMEngine
-from core.excel_ops import ExcelExecutor  # <--- Import the new module
+from core.excel_ops import ExcelExecutor, enable_copy_on_write  # <--- Import the new module
+from core.code_cache import CodeCache
+from core.intent_parser import IntentParser
+from core.code_analyzer import CodeAnalyzer
+from core.command_solver import CommandSolver
+from core.context_manager import ContextManager
+from core.api_client import get_client
+from core.persistence import PersistenceService
+from core.workbook_registry import WorkbookRegistry
+from core.version_store import VersionStore
+from core.pipeline import CommandPipeline
+from core.tracing import configure_tracer
+from utils.code_executor import SandboxExecutor
 
 # --- Configuration ---
 EXCEL_FILE = "dummy_data.xlsx" 
-TEMP_AUDIO_FILE = "voice_command.wav"
+EXCEL_SHEET = None  # Sheet to work on (None = the first); the others load only when a command reads them
+CODE_CACHE_FILE = ".xcelord_cache/llm_code.sqlite"
+STREAMING_TRANSCRIPTION = True  # Transcribe chunks while the user is still speaking
+PARALLEL_CANDIDATES = 2  # Programs requested per command; the first one that runs wins
+HANDS_FREE = False  # True = re-arm the microphone after every utterance (no Enter key)
+TRACE_FILE = ".xcelord_cache/traces.jsonl"  # Per-stage latency spans, one JSON object per line
+QUERY_ENGINE = None  # "duckdb" or "polars": multi-threaded engine for sheets of ENGINE_MIN_ROWS rows and more
+ENGINE_MIN_ROWS = 500_000
+
+enable_copy_on_write()  # Undo history and snapshots share column buffers instead of deep-copying
 
 def main():
     print("--- Excel Voice Assistant Starting ---")
+    tracer = configure_tracer(jsonl_path=TRACE_FILE)
     
     # 1. Initialize Modules
     try:
         listener = AudioListener() 
         listener.calibrate_noise()
         transcriber = Transcriber()
-        llm = LLMEngine()
-        executor = ExcelExecutor() # <--- Initialize Executor
+        llm = LLMEngine(cache=CodeCache(disk_path=CODE_CACHE_FILE))
+        executor = ExcelExecutor(sandbox=SandboxExecutor(), # <--- Generated code runs out of process
+                                 query_engine=QUERY_ENGINE, engine_min_rows=ENGINE_MIN_ROWS)
+        intent_parser = IntentParser()
+        # Parallel candidates with pre-flight checks, dry runs and traceback-fed retries
+        solver = CommandSolver(llm, executor, CodeAnalyzer(), candidates=PARALLEL_CANDIDATES)
+        context_manager = ContextManager()
+        registry = WorkbookRegistry(executor)  # File lock shared with a running UI server
+        persistence = PersistenceService(registry)  # Background, debounced saves
+        get_client().warm_up()  # Open the pooled connection before the first command
         print("✅ Modules loaded.")
     except Exception as e:
         print(f"❌ Initialization Error: {e}")
@@ -29,48 +58,62 @@ def main():
         print(f"Error: {EXCEL_FILE} not found. Please run create_dummy.py first.")
         return
 
-    try:
-        df = pd.read_excel(EXCEL_FILE)
-        print(f"📊 Data loaded: {len(df)} rows.")
-    except Exception as e:
-        print(f"Error reading Excel: {e}")
+    success, df, load_msg = registry.open(EXCEL_FILE, EXCEL_SHEET)
+    if not success:
+        print(f"Error reading Excel: {load_msg}")
         return
+    other_sheets = registry.other_sheets(EXCEL_FILE, EXCEL_SHEET)
+    print(f"📊 Data loaded: {len(df)} rows. {load_msg}")
+    if other_sheets:
+        print(f"📑 Other sheets (loaded on demand): {', '.join(other_sheets)}")
+
+    # 3. Start the pipeline: listen -> transcribe -> execute run concurrently,
+    #    so the next command can be spoken while the previous one executes
+    pipeline = CommandPipeline(executor, solver, intent_parser, persistence,
+                               transcriber=transcriber, listener=listener,
+                               context_manager=context_manager, versions=VersionStore(),
+                               streaming=STREAMING_TRANSCRIPTION, exit_phrase="exit", on_event=print_event)
+    pipeline.start(continuous=HANDS_FREE)
+    pipeline.load(df, EXCEL_FILE, EXCEL_SHEET, other_sheets).result()
 
     # --- Main Loop ---
-    while True:
-        print("\n" + "="*40)
-        if os.path.exists(TEMP_AUDIO_FILE):
-            os.remove(TEMP_AUDIO_FILE)
+    try:
+        if HANDS_FREE:
+            print("🎙️ Hands-free mode: just speak (say 'exit' or press Ctrl+C to stop).")
+            pipeline.capture()
+            pipeline.wait()
+        else:
+            while pipeline.running:
+                input("Press Enter to speak (or Ctrl+C to exit)...\n")
+                if not pipeline.running:
+                    break
+                pipeline.capture()
+    except KeyboardInterrupt:
+        pipeline.cancel()
 
-        input("Press Enter to speak (or Ctrl+C to exit)...")
-        
-        # A. Listen
-        audio_file = listener.listen_and_record(TEMP_AUDIO_FILE)
-        if not audio_file: continue
+    # Let queued commands finish, then make sure the last one reached the disk
+    pipeline.stop()
+    persistence.close()
+    solver.close()
+    print_latency(tracer)
+    tracer.close()
 
-        # B. Transcribe
-        print("📝 Transcribing...")
-        user_text = transcriber.transcribe(audio_file)
-        print(f"USER SAID: '{user_text}'")
-        
-        if "exit" in user_text.lower(): break
 
-        # C. Generate Code
-        print("🧠 Thinking...")
-        columns = list(df.columns)
-        code = llm.generate_code(user_text, columns)
-        
-        # D. Execute Code (Using the new Module)
-        print("⚡ Executing...")
-        success, new_df, message = executor.execute_code(df, code)
-        
-        if success:
-            df = new_df
-            save_success, save_msg = executor.save_file(df, EXCEL_FILE)
-            print(f"✅ {message}")
-            print(f"💾 {save_msg}")
-        else:
-            print(f"❌ {message}")
+def print_event(event):
+    if event.kind == "transcript":
+        print(f"USER SAID: '{event.text}'")
+    elif event.kind != "load":
+        print(event.render())
+        if event.kind == "result" and event.success:
+            print("💾 Save queued.")
+
+def print_latency(tracer):
+    stats = tracer.stats()
+    if not stats:
+        return
+    print("--- Latency per stage (ms) ---")
+    for stage, row in stats.items():
+        print(f"{stage:>12}: n={row['count']:<4} p50={row['p50_ms']:8.1f}  p90={row['p90_ms']:8.1f}  p99={row['p99_ms']:8.1f}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
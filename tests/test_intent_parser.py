@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from core.intent_parser import IntentParser
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({"Sales": [100, 50000], "Department": ["IT", "HR"]})
+
+
+@pytest.mark.parametrize("text, code", [
+    ("Show rows where Sales is greater than 40000", "print(df[df['Sales'] > 40000])"),
+    ("filter sales is more than 10", "df = df[df['Sales'] > 10]"),
+    ("filter sales is above 10", "df = df[df['Sales'] > 10]"),
+    ("keep rows where sales is less than 10", "df = df[df['Sales'] < 10]"),
+    ("keep rows where sales is below 10", "df = df[df['Sales'] < 10]"),
+    ("filter sales is at least 10", "df = df[df['Sales'] >= 10]"),
+    ("filter sales is at most 10", "df = df[df['Sales'] <= 10]"),
+    ("filter sales is greater than or equal to 10", "df = df[df['Sales'] >= 10]"),
+    ("filter sales is less than or equal to 10", "df = df[df['Sales'] <= 10]"),
+    ("filter sales is equal to 10", "df = df[df['Sales'] == 10]"),
+    ("filter sales is not equal to 10", "df = df[df['Sales'] != 10]"),
+])
+def test_is_comparisons(df, text, code):
+    assert IntentParser().parse(text, df) == code
+
+
+def test_plain_is_still_means_equals(df):
+    assert IntentParser().parse("keep rows where department is it", df) == "df = df[df['Department'] == 'IT']"
+
+
+def test_value_containing_an_operator_tries_the_next_split():
+    df = pd.DataFrame({"Status": ["is active", "closed"]})
+    assert IntentParser().parse("keep status is is active", df) == "df = df[df['Status'] == 'is active']"
+
+
+def test_show_prints_instead_of_filtering(df):
+    assert IntentParser().parse("show sales above 1", df) == "print(df[df['Sales'] > 1])"
+
+
+def test_unparseable_comparison_falls_back_to_llm(df):
+    assert IntentParser().parse("show sales is greater than lots", df) is None
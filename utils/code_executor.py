@@ -0,0 +1,347 @@
+import io
+import os
+import time
+import pickle
+import threading
+import contextlib
+from functools import lru_cache
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import pandas as pd
+
+from core.query_engines import get_engine
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# --- Frame transport (shared memory) ---
+def _serialize_frame(df):
+    """
+    Arrow IPC when the frame is representable (zero-copy on read), pickle
+    otherwise (mixed-type object columns are common in Excel sheets).
+    Returns (format, bytes-like).
+    """
+    if pa is not None and all(isinstance(c, str) for c in df.columns):
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return "arrow", sink.getvalue()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    return "pickle", pickle.dumps(df, protocol=5)
+
+
+def _write_shm(payload):
+    shm, spans = _write_payloads([payload])
+    return shm, spans[0][1]
+
+
+def _write_payloads(payloads):
+    """
+    Packs several payloads back to back into one new segment.
+    Returns (shm, [(offset, size)] per payload).
+    """
+    spans, offset = [], 0
+    for payload in payloads:
+        spans.append((offset, len(payload)))
+        offset += len(payload)
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for payload, (start, size) in zip(payloads, spans):
+        shm.buf[start:start + size] = memoryview(payload).cast("B")
+    return shm, spans
+
+
+def _read_frame(shm, fmt, size, copy=False, offset=0):
+    """
+    :param copy: Detach the frame from the segment. Needed when the frame
+        outlives the segment (results handed back to the app); inputs are
+        read zero-copy because the worker drops them after the job.
+    :param offset: Where the frame starts in the segment (extra sheets follow the main frame)
+    """
+    end = offset + size
+    data = bytes(shm.buf[offset:end]) if copy else shm.buf[offset:end]
+    if fmt == "arrow":
+        # The Arrow reader maps the buffer directly; to_pandas copies
+        # only what pandas can't share
+        table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+        return table.to_pandas()
+    return pickle.loads(data)
+
+
+def _close_shm(shm, unlink=False):
+    try:
+        shm.close()
+    except BufferError:
+        # A view is still alive somewhere; the OS reclaims it with the process
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _changed_columns(before, after):
+    """
+    Columns added or modified by the snippet (None = rows changed, send everything).
+    """
+    if len(before) != len(after) or not before.index.equals(after.index):
+        return None
+    changed = []
+    for col in after.columns:
+        if col not in before.columns or before[col].dtype != after[col].dtype or not before[col].equals(after[col]):
+            changed.append(col)
+    return changed
+
+
+# --- Worker process ---
+@lru_cache(maxsize=256)
+def _compile(code):
+    # Workers are long-lived, so repeated commands skip compilation
+    return compile(code, "<generated>", "exec")
+
+
+def _run_job(job, shm):
+    """
+    Executes one snippet. Kept separate from the loop so every frame that
+    may still view the shared buffer is released when it returns.
+    """
+    original = _read_frame(shm, job["fmt"], job["size"])
+    df = original.copy()
+    local_vars = {"df": df, "pd": pd}
+    if job.get("sheets") is not None:
+        # Other sheets are read-only inputs; copies keep the snippet off the shared buffers
+        local_vars["sheets"] = {name: _read_frame(shm, fmt, size, offset=offset).copy()
+                                for name, (fmt, offset, size) in job["sheets"].items()}
+    output_buffer = io.StringIO()
+    engine = get_engine(job.get("engine"))
+    namespace = engine.namespace(df)
+    local_vars.update(namespace)
+    try:
+        with contextlib.redirect_stdout(output_buffer):
+            exec(_compile(job["code"]), {}, local_vars)
+            result = engine.to_pandas(local_vars["df"]) if "df" in local_vars else None
+    finally:
+        engine.close(namespace)
+
+    if not isinstance(result, pd.DataFrame):
+        return {"ok": False, "error": "Error: The code deleted the 'df' variable.",
+                "stdout": output_buffer.getvalue()}
+
+    changed = _changed_columns(original, result)
+    out_frame = result if changed is None else result[changed]
+
+    fmt, payload = _serialize_frame(out_frame)
+    out_shm, size = _write_shm(payload)
+    _close_shm(out_shm)
+    return {
+        "ok": True,
+        "stdout": output_buffer.getvalue(),
+        "shm": out_shm.name, "fmt": fmt, "size": size,
+        "changed": changed,
+        "columns": list(result.columns),
+    }
+
+
+def _worker_main(conn):
+    """
+    Long-lived worker: pandas is imported once, then jobs are served until
+    the pipe closes.
+    """
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        shm = shared_memory.SharedMemory(name=job["shm"])
+        try:
+            reply = _run_job(job, shm)
+        except Exception as e:
+            reply = {"ok": False, "error": f"Python Error: {str(e) or type(e).__name__}", "stdout": "",
+                     "lookup": lookup_failure(e)}
+        finally:
+            _close_shm(shm)
+        conn.send(reply)
+
+
+def lookup_failure(exc):
+    """
+    ("IndexError", None) or ("KeyError", key) when exc comes from a
+    positional or label lookup, else None. Such errors can depend on which
+    rows a frame holds (a dry-run sample lacks most of them).
+    """
+    if isinstance(exc, IndexError):
+        return ("IndexError", None)
+    if isinstance(exc, KeyError) and exc.args:
+        key = exc.args[0]
+        key = key.item() if hasattr(key, "item") else key  # numpy scalars -> plain, picklable values
+        return ("KeyError", key if isinstance(key, (int, float, str)) else None)
+    return None
+
+
+class SandboxResult:
+    def __init__(self, success, df, stdout="", changed_columns=None, error=None, elapsed=0.0, lookup=None):
+        self.success = success
+        self.df = df
+        self.stdout = stdout
+        self.changed_columns = changed_columns  # None = whole frame replaced
+        self.error = error
+        self.elapsed = elapsed
+        self.lookup = lookup  # lookup_failure() of the error, if any
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def rss_bytes(self):
+        if psutil is not None:
+            try:
+                return psutil.Process(self.process.pid).memory_info().rss
+            except psutil.Error:
+                return 0
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1.0)
+        self.conn.close()
+
+
+class SandboxExecutor:
+    def __init__(self, workers=2, timeout=30.0, memory_limit_mb=2048, poll_interval=0.05):
+        """
+        Runs generated code in a pool of warm worker processes, so a runaway
+        loop or a huge merge can't freeze the app.
+
+        :param workers: Number of warm worker processes (concurrent commands)
+        :param timeout: Wall-clock limit per command in seconds
+        :param memory_limit_mb: RSS limit per worker; the worker is killed above it
+        :param poll_interval: How often the watchdog checks time and memory
+        """
+        self.timeout = timeout
+        self.memory_limit = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        self.poll_interval = poll_interval
+        self._ctx = mp.get_context("spawn")
+        self._idle = [_Worker(self._ctx) for _ in range(workers)]
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle:
+                self._cond.wait()
+            return self._idle.pop()
+
+    def _release(self, worker):
+        with self._cond:
+            if not worker.process.is_alive():
+                worker = _Worker(self._ctx)  # Replace a killed/crashed worker
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def run(self, df, code_snippet, timeout=None, sheets=None, engine=None):
+        """
+        Executes code_snippet against a copy of df in a worker.
+        Returns a SandboxResult; the caller's df is never mutated.
+
+        :param sheets: {name: DataFrame} the snippet can read as sheets['name']
+        :param engine: Query engine the snippet targets (None = pandas); built inside the worker
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        fmt, payload = _serialize_frame(df)
+        job = {"fmt": fmt, "code": code_snippet, "engine": engine}
+        if sheets is not None:
+            # Extra sheets travel in the same segment, right after df
+            names = list(sheets)
+            serialized = [_serialize_frame(sheets[name]) for name in names]
+            in_shm, spans = _write_payloads([payload] + [p for _, p in serialized])
+            size = spans[0][1]
+            job["sheets"] = {name: (sheet_fmt, offset, sheet_size)
+                             for name, (sheet_fmt, _), (offset, sheet_size) in zip(names, serialized, spans[1:])}
+            del serialized
+        else:
+            in_shm, size = _write_shm(payload)
+        del payload
+        job.update(shm=in_shm.name, size=size)
+        worker = self._acquire()
+        start = time.monotonic()
+        try:
+            worker.conn.send(job)
+            reply = self._wait(worker, start, timeout)
+        finally:
+            _close_shm(in_shm, unlink=True)
+            self._release(worker)
+        elapsed = time.monotonic() - start
+
+        if not reply.get("ok"):
+            return SandboxResult(False, df, reply.get("stdout", ""), error=reply.get("error"), elapsed=elapsed,
+                                 lookup=reply.get("lookup"))
+
+        out_shm = shared_memory.SharedMemory(name=reply["shm"])
+        try:
+            returned = _read_frame(out_shm, reply["fmt"], reply["size"], copy=True)
+        finally:
+            _close_shm(out_shm, unlink=True)
+
+        if reply["changed"] is None:
+            new_df = returned
+        else:
+            # Unchanged columns are reused from the caller's frame, not copied back
+            new_df = df.copy(deep=False)
+            for col in reply["changed"]:
+                new_df[col] = returned[col]
+            new_df = new_df[reply["columns"]]
+        return SandboxResult(True, new_df, reply["stdout"], reply["changed"], elapsed=elapsed)
+
+    def _wait(self, worker, start, timeout):
+        """
+        Waits for the worker's reply while enforcing the wall-clock and RSS limits.
+        """
+        while True:
+            if worker.conn.poll(self.poll_interval):
+                try:
+                    return worker.conn.recv()
+                except EOFError:
+                    worker.kill()
+                    return {"ok": False, "error": "Error: The worker process crashed."}
+            if time.monotonic() - start > timeout:
+                worker.kill()
+                return {"ok": False, "error": f"Error: Execution timed out after {timeout:.0f}s."}
+            if self.memory_limit and worker.rss_bytes() > self.memory_limit:
+                worker.kill()
+                return {"ok": False, "error": f"Error: Memory limit of {self.memory_limit // (1024 * 1024)} MB exceeded."}
+            if not worker.process.is_alive():
+                return {"ok": False, "error": "Error: The worker process crashed."}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for worker in self._idle:
+                try:
+                    worker.conn.send(None)
+                except (OSError, BrokenPipeError):
+                    pass
+                worker.process.join(1.0)
+            self._idle = []